@@ -0,0 +1,304 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import pandas as pd
+import snowflake.connector
+
+from metrics import CONNECTION_WAIT_SECONDS, instrument_connector, record_dataframe_build
+from self_cost import statement_params
+
+logger = logging.getLogger(__name__)
+
+ACCOUNTS_FILE = os.getenv('FINOPS_ACCOUNTS_FILE')
+# Aggregate FINOPS_* tables merged across accounts; the per-query tables stay per account
+ORG_TABLES = ('FINOPS_WAREHOUSE_METRICS', 'FINOPS_USER_WAREHOUSE_USAGE', 'FINOPS_DATABASE_METRICS',
+              'FINOPS_TABLE_METRICS', 'FINOPS_SERVERLESS_METRICS', 'FINOPS_ROLES_METRICS')
+_CONNECTION_KEYS = ('user', 'password', 'account', 'warehouse', 'database', 'schema', 'role', 'authenticator',
+                    'private_key_file', 'private_key_file_pwd')
+
+
+@dataclass
+class AccountProfile:
+    name: str
+    config: Dict[str, Any]
+    pool_size: int = 4
+    max_concurrency: int = 2
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'AccountProfile':
+        """Profile entry: connection keys inline, or *_env keys naming the variable that holds them"""
+        config = {}
+        for key in _CONNECTION_KEYS:
+            if data.get(f'{key}_env'):
+                config[key] = os.getenv(data[f'{key}_env'])
+            elif data.get(key) is not None:
+                config[key] = data[key]
+        name = data.get('name') or config.get('account')
+        if not name:
+            raise ValueError("Account profile needs a name or an account")
+        return cls(name=name, config=config, pool_size=int(data.get('pool_size', 4)),
+                   max_concurrency=int(data.get('max_concurrency', 2)))
+
+    def describe(self) -> Dict[str, Any]:
+        return {'name': self.name, 'account': self.config.get('account'), 'warehouse': self.config.get('warehouse'),
+                'pool_size': self.pool_size, 'max_concurrency': self.max_concurrency}
+
+
+def env_config() -> Dict[str, Any]:
+    """The single-account SNOWFLAKE_CONFIG the servers build from SNOWFLAKE_* variables"""
+    config = {
+        'user': os.getenv('SNOWFLAKE_USER'),
+        'password': os.getenv('SNOWFLAKE_PASSWORD'),
+        'account': os.getenv('SNOWFLAKE_ACCOUNT'),
+        'warehouse': os.getenv('SNOWFLAKE_WAREHOUSE'),
+        'database': os.getenv('SNOWFLAKE_DATABASE'),
+        'schema': os.getenv('SNOWFLAKE_SCHEMA'),
+        'role': os.getenv('SNOWFLAKE_ROLE')
+    }
+    return {key: value for key, value in config.items() if value is not None}
+
+
+def load_profiles(default_config: Dict[str, Any], path: Optional[str] = ACCOUNTS_FILE) -> List[AccountProfile]:
+    """Profiles from FINOPS_ACCOUNTS_FILE (JSON list) or FINOPS_ACCOUNTS (JSON), else default_config alone"""
+    raw = None
+    if path:
+        with open(path) as handle:
+            raw = json.load(handle)
+    elif os.getenv('FINOPS_ACCOUNTS'):
+        raw = json.loads(os.getenv('FINOPS_ACCOUNTS'))
+    if not raw:
+        return [AccountProfile(name=default_config.get('account') or 'default', config=dict(default_config))]
+    profiles = [AccountProfile.from_dict(entry) for entry in raw]
+    names = [profile.name for profile in profiles]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate account profile names in {path or 'FINOPS_ACCOUNTS'}")
+    return profiles
+
+
+class ConnectionPool:
+    """Up to `size` connections for one account, opened lazily and reused LIFO"""
+
+    def __init__(self, profile: AccountProfile, connect: Callable[..., Any] = snowflake.connector.connect):
+        self.profile = profile
+        self.connect = connect
+        self._idle: "queue.LifoQueue[Any]" = queue.LifoQueue()
+        self._opened = 0
+        self._waiting = 0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self, timeout: float = 300):
+        started = time.perf_counter()
+        conn = None
+        with self._lock:
+            if self._idle.empty() and self._opened < self.profile.pool_size:
+                self._opened += 1
+                opening = True
+            else:
+                opening = False
+                self._waiting += 1
+        try:
+            if opening:
+                try:
+                    conn = self.connect(**self.profile.config)
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                try:
+                    conn = self._idle.get(timeout=timeout)
+                finally:
+                    with self._lock:
+                        self._waiting -= 1
+        finally:
+            CONNECTION_WAIT_SECONDS.observe(time.perf_counter() - started, component='accounts',
+                                            account=self.profile.name)
+        try:
+            yield conn
+        except Exception:
+            # A failed statement may leave the session unusable; replace it on next use
+            with self._lock:
+                self._opened -= 1
+            try:
+                conn.close()
+            except Exception:
+                pass
+            conn = None
+            raise
+        finally:
+            if conn is not None:
+                self._idle.put(conn)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'open': self._opened, 'idle': self._idle.qsize(), 'waiting': self._waiting}
+
+    def close(self):
+        while not self._idle.empty():
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self._opened -= 1
+            conn.close()
+
+
+class AccountSession:
+    """execute_query for one account, bounded by the pool and the account's concurrency limit"""
+
+    def __init__(self, profile: AccountProfile, pool: ConnectionPool = None):
+        self.profile = profile
+        self.pool = pool or ConnectionPool(profile)
+        self._slots = threading.BoundedSemaphore(profile.max_concurrency)
+
+    def execute_query(self, query: str, params: Dict = None) -> pd.DataFrame:
+        with self._slots, self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(query, params or None, _statement_params=statement_params('accounts', query))
+                rows = cursor.fetchall()
+                columns = [desc[0] for desc in cursor.description]
+            finally:
+                cursor.close()
+        build_started = time.perf_counter()
+        df = pd.DataFrame(rows, columns=columns)
+        record_dataframe_build('accounts', time.perf_counter() - build_started)
+        return df
+
+
+def account_summary(frames: Dict[str, pd.DataFrame]) -> Dict[str, Any]:
+    """Pre-aggregated totals of one account, merged into org summaries without re-reading tables"""
+    warehouses = frames.get('FINOPS_WAREHOUSE_METRICS', pd.DataFrame())
+    users = frames.get('FINOPS_USER_WAREHOUSE_USAGE', pd.DataFrame())
+    databases = frames.get('FINOPS_DATABASE_METRICS', pd.DataFrame())
+    serverless = frames.get('FINOPS_SERVERLESS_METRICS', pd.DataFrame())
+    warehouse_credits = warehouses.get('total_credits', pd.Series(dtype=float)).astype(float)
+    serverless_credits = serverless.get('total_credits', pd.Series(dtype=float)).astype(float)
+    return {
+        'total_warehouses': len(warehouses),
+        'total_credits_used': float(warehouse_credits.sum()),
+        'serverless_credits': float(serverless_credits.sum()),
+        'active_users': int(users['user_name'].nunique()) if 'user_name' in users else 0,
+        'databases_count': len(databases),
+        'total_storage_gb': float(databases['total_storage_gb'].astype(float).sum())
+        if 'total_storage_gb' in databases else 0.0,
+        'top_warehouse': warehouses.loc[warehouse_credits.idxmax(), 'warehouse_name']
+        if not warehouses.empty else None,
+        # Per-user credits summed across warehouses, kept so the org view can rank users without a query
+        'user_credits': users.groupby('user_name')['total_credits'].sum().astype(float).to_dict()
+        if 'user_name' in users else {}
+    }
+
+
+@dataclass
+class AccountState:
+    frames: Dict[str, pd.DataFrame] = field(default_factory=dict)
+    summary: Dict[str, Any] = field(default_factory=dict)
+    last_refresh: Optional[datetime] = None
+    duration_seconds: Optional[float] = None
+    error: Optional[str] = None
+
+
+class AccountFleet:
+    """Every configured account, refreshed concurrently into one cache keyed by account"""
+
+    def __init__(self, profiles: List[AccountProfile]):
+        self.profiles = {profile.name: profile for profile in profiles}
+        self.sessions = {name: instrument_connector(AccountSession(profile), 'accounts')
+                         for name, profile in self.profiles.items()}
+        self.state: Dict[str, AccountState] = {name: AccountState() for name in self.profiles}
+        self._executor = ThreadPoolExecutor(max_workers=max(len(profiles), 1), thread_name_prefix='account-refresh')
+        self._lock = threading.Lock()
+
+    def _refresh_account(self, name: str, tables: Iterable[str],
+                         before_read: Optional[Callable[[Any], Any]]) -> AccountState:
+        session = self.sessions[name]
+        started = time.perf_counter()
+        try:
+            if before_read is not None:
+                before_read(session)
+            # Table reads share the account's concurrency limit with everything else on it
+            reads = ThreadPoolExecutor(max_workers=self.profiles[name].max_concurrency)
+            with reads:
+                futures = {table: reads.submit(session.execute_query, f"SELECT * FROM {table}") for table in tables}
+                frames = {}
+                for table, future in futures.items():
+                    df = future.result()
+                    df.columns = [c.lower() for c in df.columns]
+                    frames[table] = df
+            with self._lock:
+                state = self.state[name]
+                state.frames.update(frames)
+                state.summary = account_summary(state.frames)
+                state.last_refresh = datetime.now()
+                state.duration_seconds = time.perf_counter() - started
+                state.error = None
+        except Exception as e:
+            logger.error(f"Refresh of account {name} failed: {e}")
+            with self._lock:
+                self.state[name].error = str(e)
+                self.state[name].duration_seconds = time.perf_counter() - started
+        return self.state[name]
+
+    def refresh(self, accounts: Iterable[str] = None, tables: Iterable[str] = ORG_TABLES,
+                before_read: Optional[Callable[[Any], Any]] = None) -> Dict[str, Any]:
+        """Refresh accounts concurrently; before_read(session) can rebuild tables first"""
+        names = list(accounts or self.profiles)
+        unknown = [name for name in names if name not in self.profiles]
+        if unknown:
+            raise KeyError(f"Unknown accounts: {', '.join(unknown)}")
+        tables = list(tables)
+        futures = {name: self._executor.submit(self._refresh_account, name, tables, before_read) for name in names}
+        return {name: {'error': future.result().error, 'duration_seconds': future.result().duration_seconds}
+                for name, future in futures.items()}
+
+    def merged(self, table: str, accounts: Iterable[str] = None) -> pd.DataFrame:
+        """One table across accounts with an account_name column in front"""
+        with self._lock:
+            frames = [state.frames[table].assign(account_name=name)
+                      for name, state in self.state.items()
+                      if table in state.frames and (accounts is None or name in accounts)]
+        if not frames:
+            return pd.DataFrame()
+        df = pd.concat(frames, ignore_index=True)
+        return df[['account_name'] + [c for c in df.columns if c != 'account_name']]
+
+    def org_summary(self) -> Dict[str, Any]:
+        """Org-wide totals folded from the per-account summaries"""
+        with self._lock:
+            summaries = {name: dict(state.summary) for name, state in self.state.items() if state.summary}
+        user_credits: Dict[str, float] = {}
+        for name, summary in summaries.items():
+            for user, credits in summary.pop('user_credits', {}).items():
+                user_credits[f"{name}/{user}"] = credits
+        totals = {key: sum(summary[key] for summary in summaries.values())
+                  for key in ('total_warehouses', 'total_credits_used', 'serverless_credits', 'active_users',
+                              'databases_count', 'total_storage_gb')}
+        return {
+            **totals,
+            'accounts': len(self.profiles),
+            'accounts_loaded': len(summaries),
+            'top_account': max(summaries, key=lambda n: summaries[n]['total_credits_used']) if summaries else None,
+            'top_users': sorted(({'user': key, 'total_credits': value} for key, value in user_credits.items()),
+                                key=lambda entry: entry['total_credits'], reverse=True)[:10],
+            'by_account': summaries
+        }
+
+    def describe(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{
+                **profile.describe(),
+                'pool': self.sessions[name].pool.stats(),
+                'tables': sorted(self.state[name].frames),
+                'last_refresh': self.state[name].last_refresh.isoformat() if self.state[name].last_refresh else None,
+                'duration_seconds': self.state[name].duration_seconds,
+                'error': self.state[name].error
+            } for name, profile in self.profiles.items()]
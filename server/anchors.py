@@ -0,0 +1,43 @@
+import os
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+# Relative windows end at the start of the current period instead of CURRENT_TIMESTAMP(), so a
+# statement renders the same text until the period turns and repeats of it are answered from
+# Snowflake's result cache. Seconds; 3600 anchors to the hour.
+ANCHOR_SECONDS = max(int(os.getenv('FINOPS_ANCHOR_SECONDS', 3600)), 1)
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S +00:00'
+# Bind names and inlined literals that carry the anchor or a build time, for callers that key on SQL text
+ANCHOR_BINDS = ('anchor',)
+ANCHOR_LITERAL_RE = re.compile(r"'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2} \+00:00'::TIMESTAMP_L?TZ")
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def anchor_time(now: Optional[datetime] = None) -> datetime:
+    """Naive UTC start of the anchor period containing now"""
+    now = now or datetime.utcnow()
+    seconds = int((now - _EPOCH).total_seconds())
+    return _EPOCH + timedelta(seconds=seconds - seconds % ANCHOR_SECONDS)
+
+
+def anchor_params(now: Optional[datetime] = None) -> Dict[str, str]:
+    """Bind for %(anchor)s::TIMESTAMP_TZ, the window end"""
+    return {'anchor': anchor_time(now).strftime(TIMESTAMP_FORMAT)}
+
+
+def anchor_literal(now: Optional[datetime] = None) -> str:
+    """The window end inlined, for statements that cannot take binds (CTAS builders, job steps)"""
+    return f"'{anchor_time(now).strftime(TIMESTAMP_FORMAT)}'::TIMESTAMP_TZ"
+
+
+def timestamp_literal(now: Optional[datetime] = None) -> str:
+    """A client-side build time, typed like CURRENT_TIMESTAMP()"""
+    return f"'{(now or datetime.utcnow()).strftime(TIMESTAMP_FORMAT)}'::TIMESTAMP_LTZ"
+
+
+def render(sql: str, params: Dict[str, Any]) -> str:
+    """Client-side pyformat substitution, as the connector does, for paths that execute bare SQL text"""
+    return sql % {name: "'" + str(value).replace("'", "''") + "'" if isinstance(value, str) else value
+                  for name, value in params.items()}
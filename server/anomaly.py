@@ -0,0 +1,296 @@
+import json
+import logging
+import os
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # runs are only serialized within the process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Each app keeps its baselines in <dir>/<component>.npz, shared by all of its worker processes
+STATE_DIR = os.getenv('FINOPS_ANOMALY_DIR', './anomaly')
+# WAREHOUSE_METERING_HISTORY revises recent hours for up to ~3h, so the newest hours are scored
+# provisionally and only folded into the baselines once they are this far behind the latest one
+RESCORE_HOURS = max(int(os.getenv('FINOPS_ANOMALY_RESCORE_HOURS', 3)), 3)
+
+# Short-memory level/variance and a slower per hour-of-week baseline
+EWMA_ALPHA = 0.1
+SEASONAL_ALPHA = 0.3
+HOURS_PER_WEEK = 168
+# Observations a key needs before it is scored, overall and per hour-of-week slot
+MIN_HISTORY = 24
+MIN_SEASONAL_HISTORY = 3
+# Spikes smaller than this many credits above baseline are never reported
+MIN_EXCESS_CREDITS = 0.5
+SEVERITIES = (('critical', 6.0), ('high', 4.0), ('medium', 3.0))
+MAX_ANOMALIES = 2000
+SCOPES = ('warehouse', 'user')
+
+
+def severity(score: float) -> Optional[str]:
+    for name, threshold in SEVERITIES:
+        if score >= threshold:
+            return name
+    return None
+
+
+class _Baselines:
+    """EWMA and hour-of-week baselines for every key of one scope, as parallel arrays"""
+
+    def __init__(self):
+        self.keys: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.count = np.zeros(0, dtype=np.int64)
+        self.mean = np.zeros(0)
+        self.var = np.zeros(0)
+        self.seasonal_count = np.zeros((0, HOURS_PER_WEEK), dtype=np.int64)
+        self.seasonal_mean = np.zeros((0, HOURS_PER_WEEK))
+        self.seasonal_var = np.zeros((0, HOURS_PER_WEEK))
+        self.last_hour: Optional[pd.Timestamp] = None
+
+    def rows(self, names: np.ndarray) -> np.ndarray:
+        new = [name for name in pd.unique(names) if name not in self.index]
+        if new:
+            for name in new:
+                self.index[name] = len(self.keys)
+                self.keys.append(name)
+            grow = len(new)
+            self.count = np.concatenate((self.count, np.zeros(grow, dtype=np.int64)))
+            self.mean = np.concatenate((self.mean, np.zeros(grow)))
+            self.var = np.concatenate((self.var, np.zeros(grow)))
+            self.seasonal_count = np.vstack((self.seasonal_count, np.zeros((grow, HOURS_PER_WEEK), dtype=np.int64)))
+            self.seasonal_mean = np.vstack((self.seasonal_mean, np.zeros((grow, HOURS_PER_WEEK))))
+            self.seasonal_var = np.vstack((self.seasonal_var, np.zeros((grow, HOURS_PER_WEEK))))
+        return np.array([self.index[name] for name in names], dtype=np.int64)
+
+    def copy(self) -> '_Baselines':
+        baselines = _Baselines()
+        baselines.keys, baselines.index, baselines.last_hour = list(self.keys), dict(self.index), self.last_hour
+        for name in ('count', 'mean', 'var', 'seasonal_count', 'seasonal_mean', 'seasonal_var'):
+            setattr(baselines, name, getattr(self, name).copy())
+        return baselines
+
+    def grid(self, frame: pd.DataFrame) -> pd.DataFrame:
+        """Credits per hour (rows) and name (columns) after last_hour, with idle hours as 0.
+
+        Known names are zero-filled from the first hour, new ones from their first observation;
+        NaN marks a name that does not exist yet at that hour.
+        """
+        if self.last_hour is not None:
+            frame = frame[frame['hour_start'] > self.last_hour]
+        if frame.empty:
+            return pd.DataFrame()
+        pivot = frame.assign(name=frame['name'].astype(str)).pivot_table(
+            index='hour_start', columns='name', values='credits', aggfunc='sum')
+        first = self.last_hour + pd.Timedelta(hours=1) if self.last_hour is not None else pivot.index.min()
+        pivot = pivot.reindex(index=pd.date_range(first, pivot.index.max(), freq='h'),
+                              columns=pivot.columns.union(pd.Index(self.keys, dtype=object)))
+        started = pivot.notna().cummax() | pivot.columns.isin(self.keys)
+        return pivot.fillna(0.0).where(started)
+
+    def score_and_update(self, rows: np.ndarray, slot: int, values: np.ndarray) -> Dict[str, np.ndarray]:
+        """Score one hour's values against the current baselines, then fold them in"""
+        count, mean, std = self.count[rows], self.mean[rows], np.sqrt(self.var[rows])
+        s_count = self.seasonal_count[rows, slot]
+        s_mean, s_std = self.seasonal_mean[rows, slot], np.sqrt(self.seasonal_var[rows, slot])
+
+        # A robust floor on the spread keeps flat baselines from turning any change into a spike
+        ewma_z = (values - mean) / np.maximum(std, np.maximum(0.1 * mean, 0.05))
+        seasonal_z = (values - s_mean) / np.maximum(s_std, np.maximum(0.1 * s_mean, 0.05))
+        has_seasonal = s_count >= MIN_SEASONAL_HISTORY
+        # Both baselines have to agree, which suppresses the regular weekly peaks
+        score = np.where(has_seasonal, np.minimum(ewma_z, seasonal_z), ewma_z)
+        baseline = np.where(has_seasonal, np.maximum(mean, s_mean), mean)
+        scored = (count >= MIN_HISTORY) & (values - baseline >= MIN_EXCESS_CREDITS)
+
+        self.mean[rows], self.var[rows] = self._ewma(EWMA_ALPHA, count, mean, self.var[rows], values)
+        self.count[rows] += 1
+        self.seasonal_mean[rows, slot], self.seasonal_var[rows, slot] = self._ewma(
+            SEASONAL_ALPHA, s_count, s_mean, self.seasonal_var[rows, slot], values)
+        self.seasonal_count[rows, slot] += 1
+        return {'score': np.where(scored, score, 0.0), 'baseline': baseline}
+
+    @staticmethod
+    def _ewma(alpha, count, mean, var, values):
+        diff = values - mean
+        increment = alpha * diff
+        first = count == 0
+        return (np.where(first, values, mean + increment),
+                np.where(first, 0.0, (1 - alpha) * (var + diff * increment)))
+
+    def arrays(self, prefix: str) -> Dict[str, np.ndarray]:
+        return {
+            f'{prefix}_keys': np.array(self.keys, dtype=str),
+            f'{prefix}_count': self.count, f'{prefix}_mean': self.mean, f'{prefix}_var': self.var,
+            f'{prefix}_seasonal_count': self.seasonal_count, f'{prefix}_seasonal_mean': self.seasonal_mean,
+            f'{prefix}_seasonal_var': self.seasonal_var,
+            f'{prefix}_last_hour': np.array([self.last_hour.isoformat() if self.last_hour is not None else ''])
+        }
+
+    @classmethod
+    def from_arrays(cls, data, prefix: str) -> '_Baselines':
+        baselines = cls()
+        baselines.keys = [str(key) for key in data[f'{prefix}_keys']]
+        baselines.index = {key: i for i, key in enumerate(baselines.keys)}
+        for name in ('count', 'mean', 'var', 'seasonal_count', 'seasonal_mean', 'seasonal_var'):
+            setattr(baselines, name, data[f'{prefix}_{name}'])
+        last_hour = str(data[f'{prefix}_last_hour'][0])
+        baselines.last_hour = pd.Timestamp(last_hour) if last_hour else None
+        return baselines
+
+
+class AnomalyDetector:
+    """Streaming credit spike detection over the hourly aggregates of each ingest.
+
+    Baselines only hold settled hours, those RESCORE_HOURS behind the newest one seen; each run
+    re-scores the unsettled tail on a copy of them, so late metering corrections replace the
+    earlier verdict for those hours. A run costs O(new hours + RESCORE_HOURS) and history is never
+    re-read. State lives in a small .npz file per app, read and replaced under a file lock so the
+    app's workers continue from each other's runs instead of overwriting them.
+    """
+
+    def __init__(self, component: str, state_path: Optional[str] = None):
+        self.state_path = state_path or os.path.join(STATE_DIR, f'{component}.npz')
+        self.baselines = {scope: _Baselines() for scope in SCOPES}
+        self.anomalies: Deque[Dict[str, Any]] = deque(maxlen=MAX_ANOMALIES)
+        self.last_run: Optional[Dict[str, Any]] = None
+        self._loaded_mtime: Optional[float] = None
+        self._lock = threading.Lock()
+        self._load()
+
+    @contextmanager
+    def _file_lock(self):
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.state_path}.lock", 'a') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _load(self):
+        """(Re)read the state file if another process replaced it since this one last did"""
+        try:
+            mtime = os.path.getmtime(self.state_path)
+        except OSError:
+            return
+        if mtime == self._loaded_mtime:
+            return
+        try:
+            with np.load(self.state_path) as data:
+                self.baselines = {scope: _Baselines.from_arrays(data, scope) for scope in SCOPES}
+                self.anomalies = deque(json.loads(str(data['anomalies'][0])), maxlen=MAX_ANOMALIES)
+            self._loaded_mtime = mtime
+            logger.info(f"Loaded anomaly baselines from {self.state_path}")
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable anomaly state {self.state_path}: {e}")
+
+    def _save(self):
+        arrays = {}
+        for scope, baselines in self.baselines.items():
+            arrays.update(baselines.arrays(scope))
+        arrays['anomalies'] = np.array([json.dumps(list(self.anomalies))])
+        temporary = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(temporary, 'wb') as handle:
+            np.savez_compressed(handle, **arrays)
+        os.replace(temporary, self.state_path)
+        self._loaded_mtime = os.path.getmtime(self.state_path)
+
+    def observe(self, hourly: Dict[str, pd.DataFrame]) -> List[Dict[str, Any]]:
+        """Score new and unsettled hours; hourly maps scope -> frame of hour_start, name, credits.
+
+        Returns every anomaly of the hours scored, including ones already reported for a re-scored hour.
+        """
+        detected = []
+        with self._lock, self._file_lock():
+            self._load()
+            started = datetime.now()
+            scored_hours = 0
+            scored = set()
+            for scope, frame in hourly.items():
+                baselines = self.baselines[scope]
+                grid = baselines.grid(frame)
+                if grid.empty:
+                    continue
+                settled_until = grid.index[-1] - pd.Timedelta(hours=RESCORE_HOURS)
+                target = baselines
+                for hour, row in zip(grid.index, grid.to_numpy(dtype=np.float64)):
+                    if hour > settled_until and target is baselines:
+                        target = baselines.copy()
+                    present = ~np.isnan(row)
+                    names, values = grid.columns.to_numpy(dtype=str)[present], row[present]
+                    result = target.score_and_update(target.rows(names), hour.dayofweek * 24 + hour.hour, values)
+                    for i in np.flatnonzero(result['score'] >= SEVERITIES[-1][1]):
+                        detected.append({
+                            'scope': scope,
+                            'name': str(names[i]),
+                            'hour_start': hour.isoformat(),
+                            'credits': round(float(values[i]), 4),
+                            'baseline_credits': round(float(result['baseline'][i]), 4),
+                            'score': round(float(result['score'][i]), 2),
+                            'severity': severity(float(result['score'][i])),
+                            'detected_at': datetime.now().isoformat()
+                        })
+                    scored.add((scope, hour.isoformat()))
+                    scored_hours += 1
+                    if target is baselines:
+                        baselines.last_hour = hour
+
+            # A re-scored hour's verdict replaces the earlier one, keeping when an anomaly was first seen
+            first_seen = {(a['scope'], a['name'], a['hour_start']): a['detected_at']
+                          for a in self.anomalies if (a['scope'], a['hour_start']) in scored}
+            for anomaly in detected:
+                anomaly['detected_at'] = first_seen.get(
+                    (anomaly['scope'], anomaly['name'], anomaly['hour_start']), anomaly['detected_at'])
+            self.anomalies = deque((a for a in self.anomalies if (a['scope'], a['hour_start']) not in scored),
+                                   maxlen=MAX_ANOMALIES)
+            self.anomalies.extend(detected)
+            self._save()
+            new = sum((a['scope'], a['name'], a['hour_start']) not in first_seen for a in detected)
+            self.last_run = {'hours_scored': scored_hours, 'anomalies': len(detected), 'new_anomalies': new,
+                             'duration_seconds': (datetime.now() - started).total_seconds(),
+                             'timestamp': datetime.now().isoformat()}
+        if new:
+            logger.warning(f"Detected {new} new credit anomalies")
+        return detected
+
+    def recent(self, scope: str = None, min_severity: str = None, limit: int = 100) -> List[Dict[str, Any]]:
+        ranks = {name: rank for rank, (name, _) in enumerate(SEVERITIES)}
+        cutoff = ranks.get(min_severity, len(SEVERITIES))
+        with self._lock:
+            self._load()
+            matches = [a for a in reversed(self.anomalies)
+                       if (scope is None or a['scope'] == scope) and ranks[a['severity']] <= cutoff]
+        return matches[:limit]
+
+    def describe(self) -> Dict[str, Any]:
+        scopes = {
+            scope: {'keys': len(b.keys), 'last_hour': b.last_hour.isoformat() if b.last_hour is not None else None}
+            for scope, b in self.baselines.items()
+        }
+        return {**scopes, 'last_run': self.last_run, 'anomalies': len(self.anomalies), 'rescore_hours': RESCORE_HOURS}
+
+
+def hourly_aggregates(metering: pd.DataFrame, per_user: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """Warehouse credits from metering and attributed user credits, per hour"""
+    warehouses = metering.assign(
+        hour_start=pd.to_datetime(metering['start_time']),
+        credits=metering['credits_used_compute'] + metering['credits_used_cloud_services'])
+    users = per_user.groupby(['hour_start', 'user_name'], as_index=False)['attributed_credits'].sum()
+    return {
+        'warehouse': warehouses.rename(columns={'warehouse_name': 'name'})[['hour_start', 'name', 'credits']],
+        'user': users.rename(columns={'user_name': 'name', 'attributed_credits': 'credits'})
+    }
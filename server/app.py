@@ -1,7 +1,10 @@
 from flask import Flask, jsonify
 from flask_cors import CORS # This is important for your React app
 
+from serialization import install_fast_json
+
 app = Flask(__name__)
+install_fast_json(app)
 # This allows your React app on localhost:3000 to make requests to this API
 CORS(app, resources={r"/api/*": {"origins": "http://localhost:3000"}})
 
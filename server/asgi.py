@@ -0,0 +1,352 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Dict
+
+from quart import Quart, Response, render_template_string, request
+from quart_cors import cors
+
+from analytics import FinOpsAnalytics
+from anchors import anchor_params
+from async_snowflake import AsyncSnowflakeConnector
+from jobs import JobManager, accepted_payload
+from metrics import PROMETHEUS_CONTENT_TYPE, record_cache_lookup, registry, statement_scope
+from query_filters import FilterError
+from refresh_lock import RefreshInProgress
+from replay import install_replay
+from response_cache import request_variant
+from serialization import dumps
+from table_cache import (DASHBOARD_HTML, QUERIES, SNOWFLAKE_CONFIG, adopt_shared, batch_query_ids, drill_down_rows,
+                         needs_refresh, query_detail, query_details_batch, refresh_all_job_steps, refresh_coordinator,
+                         refresh_summary, response_cache, shared_cache, simulation_payload, snowflake_connection,
+                         status_payload, store_table_data, table_body, table_data, table_payload, table_request,
+                         tables_payload, timeseries_payload)
+
+# Asyncio serving mode for the index2 API (plus index.py's /api/initialize), on the same table cache,
+# request handling and refresh leases as index2.py without importing either Flask app.
+# Run with an ASGI server, e.g.: hypercorn asgi:app --bind 0.0.0.0:5000
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+app = cors(Quart(__name__))
+
+sf_async = install_replay(AsyncSnowflakeConnector(SNOWFLAKE_CONFIG, component='asgi'))
+
+# index2's refresh-all jobs: the same state file, so jobs are visible to both serving modes
+job_manager = JobManager(snowflake_connection, component='index2', coordinator=refresh_coordinator,
+                         lease_resource=lambda name: f"index2.{name}")
+job_manager.register_kind('refresh-all', refresh_all_job_steps)
+
+# One in-flight refresh per table; concurrent TTL misses await the same task
+_inflight: Dict[str, asyncio.Task] = {}
+
+
+def json_response(obj: Any, status: int = 200) -> Response:
+    """Serialized like index2's responses: NaN and Decimal values never reach the stdlib encoder"""
+    return Response(dumps(obj), status=status, mimetype='application/json')
+
+
+async def _refresh(table_name: str) -> Dict[str, Any]:
+    """Refresh under index2's lease for the table, so WSGI and ASGI workers never fetch it concurrently"""
+    requested_at = time.time()
+    try:
+        lease = await asyncio.to_thread(refresh_coordinator.acquire, f"index2.{table_name}")
+    except RefreshInProgress as e:
+        if table_name in table_data:
+            logger.warning(f"Serving cached {table_name}: {e}")
+            return table_data[table_name]
+        return {"error": str(e), "refresh": e.status}
+    except Exception as e:
+        logger.error(f"Error refreshing {table_name}: {e}")
+        return {"error": str(e)}
+
+    completed = False
+    try:
+        # Refreshes other workers finish while this one waits are only visible through the shared cache
+        current = await asyncio.to_thread(refresh_coordinator.backend.current, lease.resource)
+        if shared_cache.enabled and (current.get('completed_at') or 0) >= requested_at:
+            adopt_shared(table_name)
+            completed = True
+            return table_data[table_name]
+
+        logger.info(f"Executing query for {table_name}")
+        with statement_scope(table_name):
+            df = await sf_async.execute_query(QUERIES[table_name].sql, anchor_params())
+        data = store_table_data(table_name, df)
+        completed = True
+        return data
+    except Exception as e:
+        logger.error(f"Error refreshing {table_name}: {e}")
+        return {"error": str(e)}
+    finally:
+        await asyncio.to_thread(refresh_coordinator.release, lease, completed)
+
+
+async def refresh_table_data(table_name: str) -> Dict[str, Any]:
+    """Refresh data for a specific table, sharing the work with concurrent callers"""
+    if table_name not in QUERIES:
+        return {"error": f"Table {table_name} not found"}
+
+    task = _inflight.get(table_name)
+    if task is None or task.done():
+        task = asyncio.ensure_future(_refresh(table_name))
+        _inflight[table_name] = task
+        task.add_done_callback(lambda t: _inflight.pop(table_name, None) if _inflight.get(table_name) is t else None)
+    # shield() keeps the Snowflake query running for other waiters if this client disconnects
+    return await asyncio.shield(task)
+
+
+async def get_table_data(table_name: str, force_refresh: bool = False) -> Dict[str, Any]:
+    """Get table data, refresh if needed"""
+    stale = needs_refresh(table_name, force_refresh)
+    record_cache_lookup('table_data', table_name, hit=not stale)
+    if stale:
+        return await refresh_table_data(table_name)
+    return table_data[table_name]
+
+
+@app.route('/')
+async def index():
+    """Main dashboard page"""
+    return await render_template_string(DASHBOARD_HTML)
+
+
+@app.route('/api/tables')
+async def list_tables():
+    """List all available tables"""
+    return json_response(tables_payload())
+
+
+@app.route('/api/tables/<table_name>')
+async def get_table(table_name: str):
+    """Get data for a specific table, with index2's ?fields/filter/sort/layout and ETag revalidation"""
+    data = await get_table_data(table_name)
+    if "error" in data:
+        return json_response(data)
+
+    try:
+        options = table_request(table_name, request.args)
+    except ValueError as e:
+        return json_response({"error": str(e)}, 400)
+
+    # Bodies are serialized off the loop; revalidations and cache hits are answered without serializing
+    current = request._get_current_object()
+    return await asyncio.to_thread(response_cache.respond, request_variant(current),
+                                   response_cache.version(table_name), lambda: table_body(table_name, options),
+                                   req=current, response_class=Response)
+
+
+@app.route('/api/query-details/<query_id>')
+async def get_query_details(query_id: str):
+    """Detail row for one query, looked up through the cached query_id index"""
+    data = await get_table_data('query_details')
+    if "error" in data:
+        return json_response(data)
+
+    detail = query_detail(query_id)
+    if detail is None:
+        return json_response({"error": "Query not found"}, 404)
+    return json_response(detail)
+
+
+@app.route('/api/query-details:batch', methods=['POST'])
+async def get_query_details_batch():
+    """Detail rows for many queries in one cache pass"""
+    query_ids = batch_query_ids(await request.get_json(silent=True))
+    if not query_ids:
+        return json_response({"error": "query_ids is required"}, 400)
+
+    data = await get_table_data('query_details')
+    if "error" in data:
+        return json_response(data)
+
+    return json_response(query_details_batch(query_ids))
+
+
+@app.route('/api/tables/<table_name>/refresh')
+async def refresh_table(table_name: str):
+    """Force refresh a specific table"""
+    data = await refresh_table_data(table_name)
+    return json_response(data if "error" in data else table_payload(table_name))
+
+
+async def _wants_async() -> bool:
+    if request.args.get('async', '').lower() == 'true':
+        return True
+    body = await request.get_json(silent=True)
+    return bool(body and body.get('async'))
+
+
+@app.route('/api/refresh-all')
+async def refresh_all_tables():
+    """Refresh all tables concurrently, or as a background job with ?async=true"""
+    if await _wants_async():
+        job = await asyncio.to_thread(job_manager.submit, 'refresh-all')
+        return json_response(accepted_payload(job), 202)
+
+    names = list(QUERIES.keys())
+    outcomes = await asyncio.gather(*(refresh_table_data(name) for name in names), return_exceptions=True)
+
+    results = {}
+    for table_name, outcome in zip(names, outcomes):
+        if isinstance(outcome, Exception):
+            results[table_name] = {"status": "error", "error": str(outcome)}
+        else:
+            results[table_name] = dict(outcome, status="error") if "error" in outcome else \
+                dict(table_payload(table_name), status="success")
+
+    return json_response(refresh_summary(results))
+
+
+@app.route('/api/status')
+async def system_status():
+    """Get system status"""
+    connection_status = "disconnected"
+    try:
+        await sf_async.execute_query("SELECT 1")
+        connection_status = "connected"
+    except Exception:
+        connection_status = "error"
+
+    return json_response(status_payload(connection_status))
+
+
+@app.route('/api/warehouses/<warehouse_name>/timeseries')
+async def warehouse_timeseries(warehouse_name: str):
+    """Hourly warehouse credits, downsampled on the server to the chart's pixel width"""
+    # The metering cache appends through blocking statements
+    payload, status = await asyncio.to_thread(timeseries_payload, warehouse_name, request.args.to_dict())
+    return json_response(payload, status)
+
+
+@app.route('/api/warehouses/<warehouse_name>/simulate', methods=['POST'])
+async def simulate_warehouse(warehouse_name: str):
+    """Replay the warehouse's query history under alternative size/suspend/cluster settings (see index2.py)"""
+    body = await request.get_json(silent=True) or {}
+    warehouses = await get_table_data('warehouses')
+    if "error" in warehouses:
+        return json_response(warehouses, 500)
+    payload, status = await asyncio.to_thread(simulation_payload, warehouse_name, body)
+    return json_response(payload, status)
+
+
+@app.route('/api/drill-down/<source_table>/<target_table>')
+async def drill_down(source_table: str, target_table: str):
+    """Enable drill-down from one table to another"""
+    filters = request.args.to_dict()
+    target_data = await get_table_data(target_table)
+
+    if "error" in target_data:
+        return json_response(target_data)
+
+    try:
+        filtered_data = drill_down_rows(target_table, filters)
+    except FilterError as e:
+        return json_response({"error": str(e)}, 400)
+    return json_response({
+        "source_table": source_table,
+        "target_table": target_table,
+        "filters_applied": filters,
+        "data": filtered_data,
+        "row_count": len(filtered_data)
+    })
+
+
+@app.route('/api/jobs')
+async def list_jobs():
+    return json_response({'jobs': await asyncio.to_thread(job_manager.list)})
+
+
+@app.route('/api/jobs/<job_id>')
+async def get_job(job_id: str):
+    if not await asyncio.to_thread(job_manager.known, job_id):
+        return json_response({'error': 'Job not found'}, 404)
+    return json_response(job_manager.describe(job_id))
+
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+async def cancel_job(job_id: str):
+    if not await asyncio.to_thread(job_manager.known, job_id):
+        return json_response({'error': 'Job not found'}, 404)
+    return json_response(await asyncio.to_thread(job_manager.cancel, job_id))
+
+
+@app.route('/api/jobs/<job_id>/resume', methods=['POST'])
+async def resume_job(job_id: str):
+    if not await asyncio.to_thread(job_manager.known, job_id):
+        return json_response({'error': 'Job not found'}, 404)
+    try:
+        return json_response(await asyncio.to_thread(job_manager.resume, job_id), 202)
+    except ValueError as e:
+        return json_response({'error': str(e)}, 409)
+    except Exception as e:
+        return json_response({'error': str(e)}, 500)
+
+
+async def _build_table(table_name: str, statements):
+    """Staged build and swap under the table's lease, re-checking it before every statement after the build"""
+    lease = await asyncio.to_thread(refresh_coordinator.acquire, table_name)
+    completed = False
+    try:
+        for position, statement in enumerate(statements):
+            if position:
+                await asyncio.to_thread(refresh_coordinator.ensure_held, lease)
+            with statement_scope(table_name):
+                await sf_async.execute_query(statement)
+        completed = True
+    finally:
+        await asyncio.to_thread(refresh_coordinator.release, lease, completed)
+
+
+@app.route('/api/initialize', methods=['POST'])
+async def initialize_tables():
+    """Initialize all FinOps tables without holding a worker thread per statement"""
+    try:
+        days_filter = (await request.get_json() or {}).get('days_filter', 30)
+        builder = FinOpsAnalytics(None)
+        builder.set_time_filter(days_filter)
+        for table_name, group in groupby(builder.builder_statements(), key=itemgetter(0)):
+            await _build_table(table_name, [statement for _, statement in group])
+            logger.info(f"Created {table_name} table")
+
+        return json_response({
+            'status': 'success',
+            'message': f'All FinOps tables created with {days_filter} days filter',
+            'timestamp': datetime.now().isoformat()
+        })
+    except RefreshInProgress as e:
+        return json_response({
+            'status': 'busy',
+            'message': str(e),
+            'refresh': e.status,
+            'timestamp': datetime.now().isoformat()
+        }, 409)
+    except Exception as e:
+        return json_response({
+            'status': 'error',
+            'message': str(e),
+            'timestamp': datetime.now().isoformat()
+        }, 500)
+
+
+@app.route('/metrics')
+async def metrics():
+    return Response(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+@app.errorhandler(404)
+async def not_found(error):
+    return json_response({"error": "Endpoint not found"}, 404)
+
+
+@app.errorhandler(500)
+async def internal_error(error):
+    return json_response({"error": "Internal server error"}, 500)
+
+
+@app.after_serving
+async def shutdown():
+    await sf_async.close()
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import time
+from functools import partial
+from typing import Any, Dict, Optional
+
+import pandas as pd
+import snowflake.connector
+
+from metrics import QUERY_ERRORS, QUERY_ROWS, QUERY_SECONDS, record_dataframe_build, statement_label
+from self_cost import statement_params
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncSnowflakeConnector:
+    """Snowflake access for asyncio servers: submit with execute_async, then poll with asyncio.sleep"""
+
+    def __init__(self, config: Dict[str, str], component: str = 'asgi',
+                 poll_interval: float = 0.25, max_poll_interval: float = 5.0):
+        self.config = config
+        self.component = component
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.connection = None
+        self._connect_lock = asyncio.Lock()
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, partial(func, *args, **kwargs))
+
+    async def connect(self):
+        async with self._connect_lock:
+            if self.connection is None:
+                self.connection = await self._run(snowflake.connector.connect, **self.config)
+                logger.info("Successfully connected to Snowflake (async)")
+        return self.connection
+
+    async def submit(self, query: str, params: Any = None) -> str:
+        """Submit a statement without waiting for it; returns the Snowflake query id"""
+        connection = await self.connect()
+        cursor = connection.cursor()
+        await self._run(cursor.execute_async, query, params,
+                        _statement_params=statement_params(self.component, query))
+        return cursor.sfqid
+
+    async def wait(self, query_id: str):
+        """Poll until the query leaves the running states, backing off between checks"""
+        connection = await self.connect()
+        interval = self.poll_interval
+        while True:
+            status = await self._run(connection.get_query_status_throw_if_error, query_id)
+            if not connection.is_still_running(status):
+                return status
+            await asyncio.sleep(interval)
+            interval = min(interval * 1.5, self.max_poll_interval)
+
+    async def fetch(self, query_id: str) -> pd.DataFrame:
+        """Fetch the result set of a finished query as a DataFrame"""
+        connection = await self.connect()
+        cursor = connection.cursor()
+        await self._run(cursor.get_results_from_sfqid, query_id)
+        rows = await self._run(cursor.fetchall)
+        columns = [desc[0] for desc in cursor.description]
+        build_started = time.perf_counter()
+        df = pd.DataFrame(rows, columns=columns)
+        record_dataframe_build(self.component, time.perf_counter() - build_started)
+        cursor.close()
+        return df
+
+    async def cancel(self, query_id: str):
+        connection = await self.connect()
+        cursor = connection.cursor()
+        await self._run(cursor.execute, "SELECT SYSTEM$CANCEL_QUERY(%s)", (query_id,))
+        cursor.close()
+
+    async def execute_query(self, query: str, params: Any = None) -> pd.DataFrame:
+        label = statement_label(query)
+        started = time.perf_counter()
+        query_id: Optional[str] = None
+        try:
+            query_id = await self.submit(query, params)
+            await self.wait(query_id)
+            df = await self.fetch(query_id)
+        except asyncio.CancelledError:
+            if query_id:
+                logger.info(f"Cancelling Snowflake query {query_id}")
+                await asyncio.shield(self.cancel(query_id))
+            raise
+        except Exception as e:
+            QUERY_ERRORS.inc(component=self.component, statement=label)
+            logger.error(f"Query execution failed: {e}")
+            raise
+        finally:
+            QUERY_SECONDS.observe(time.perf_counter() - started, component=self.component, statement=label)
+        QUERY_ROWS.inc(len(df), component=self.component, statement=label)
+        return df
+
+    async def close(self):
+        if self.connection:
+            await self._run(self.connection.close)
+            self.connection = None
@@ -0,0 +1,283 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+from snowflake.connector.pandas_tools import write_pandas
+
+from metering import METERING_OVERLAP
+
+logger = logging.getLogger(__name__)
+
+HOUR_SECONDS = 3600
+
+# Attributed credits at each grain; every row belongs to one metered warehouse-hour
+ATTRIBUTION_TABLES = {
+    'query': 'FINOPS_QUERY_ATTRIBUTION',
+    'user': 'FINOPS_USER_ATTRIBUTION',
+    'role': 'FINOPS_ROLE_ATTRIBUTION',
+}
+
+_CREDIT_COLUMNS = """
+    overlap_seconds FLOAT,
+    attributed_credits_compute FLOAT,
+    attributed_credits_cloud_services FLOAT,
+    attributed_credits FLOAT,
+    last_updated TIMESTAMP_NTZ
+"""
+
+ATTRIBUTION_DDL = {
+    'FINOPS_QUERY_ATTRIBUTION': f"""
+    CREATE TABLE IF NOT EXISTS FINOPS_QUERY_ATTRIBUTION (
+        hour_start TIMESTAMP_NTZ,
+        warehouse_name STRING,
+        query_id STRING,
+        user_name STRING,
+        role_name STRING,{_CREDIT_COLUMNS}
+    ) CLUSTER BY (hour_start, warehouse_name)
+    """,
+    'FINOPS_USER_ATTRIBUTION': f"""
+    CREATE TABLE IF NOT EXISTS FINOPS_USER_ATTRIBUTION (
+        hour_start TIMESTAMP_NTZ,
+        warehouse_name STRING,
+        user_name STRING,
+        query_count NUMBER,{_CREDIT_COLUMNS}
+    )
+    """,
+    'FINOPS_ROLE_ATTRIBUTION': f"""
+    CREATE TABLE IF NOT EXISTS FINOPS_ROLE_ATTRIBUTION (
+        hour_start TIMESTAMP_NTZ,
+        warehouse_name STRING,
+        role_name STRING,
+        query_count NUMBER,{_CREDIT_COLUMNS}
+    )
+    """,
+}
+
+_CREDITS = ['overlap_seconds', 'attributed_credits_compute', 'attributed_credits_cloud_services',
+            'attributed_credits']
+
+
+def _epoch_seconds(values: pd.Series) -> np.ndarray:
+    return pd.to_datetime(values, utc=True).to_numpy(dtype='datetime64[ms]').astype(np.int64) / 1000.0
+
+
+def _utc(value: datetime) -> str:
+    """Bind value for a naive UTC datetime compared against TIMESTAMP_LTZ columns"""
+    return value.strftime('%Y-%m-%d %H:%M:%S +00:00')
+
+
+def attribute_hours(queries: pd.DataFrame, metering: pd.DataFrame) -> pd.DataFrame:
+    """Split each metered warehouse-hour across the queries executing in it, by overlap time.
+
+    queries: query_id, warehouse_name, user_name, role_name, end_time, execution_time (ms).
+    metering: warehouse_name, start_time (hour), credits_used_compute, credits_used_cloud_services.
+    Returns one row per (query, hour) with the query's share of that hour's credits.
+    """
+    end = _epoch_seconds(queries['end_time'])
+    start = end - queries['execution_time'].to_numpy(dtype=np.float64) / 1000.0
+
+    # Expand every query into the hours it overlaps: repeat its index once per hour spanned
+    first_hour = np.floor(start / HOUR_SECONDS).astype(np.int64)
+    last_hour = np.floor(np.nextafter(end, -np.inf) / HOUR_SECONDS).astype(np.int64)
+    spans = np.maximum(last_hour - first_hour + 1, 0)
+    rows = np.repeat(np.arange(len(queries)), spans)
+    offsets = np.arange(len(rows)) - np.repeat(np.cumsum(spans) - spans, spans)
+    hours = first_hour[rows] + offsets
+    overlap = (np.minimum(end[rows], (hours + 1) * HOUR_SECONDS)
+               - np.maximum(start[rows], hours * HOUR_SECONDS))
+
+    # Join onto metered hours through a sorted (warehouse, hour) key
+    names = pd.concat([queries['warehouse_name'], metering['warehouse_name']]).str.upper()
+    codes, _ = pd.factorize(names)
+    query_codes, metering_codes = codes[:len(queries)], codes[len(queries):]
+    metering_hours = (_epoch_seconds(metering['start_time']) // HOUR_SECONDS).astype(np.int64)
+    metering_keys = metering_codes.astype(np.int64) << 32 | metering_hours
+    order = np.argsort(metering_keys)
+    sorted_keys = metering_keys[order]
+    keys = query_codes[rows].astype(np.int64) << 32 | hours
+    position = np.minimum(np.searchsorted(sorted_keys, keys), max(len(sorted_keys) - 1, 0))
+    matched = (overlap > 0) & (len(sorted_keys) > 0)
+    if len(sorted_keys):
+        matched &= sorted_keys[position] == keys
+    rows, hours, overlap, meter = rows[matched], hours[matched], overlap[matched], order[position[matched]]
+
+    totals = np.bincount(meter, weights=overlap, minlength=len(metering))
+    share = overlap / totals[meter]
+    compute = metering['credits_used_compute'].to_numpy(dtype=np.float64)[meter] * share
+    cloud = metering['credits_used_cloud_services'].to_numpy(dtype=np.float64)[meter] * share
+
+    selected = queries.iloc[rows]
+    return pd.DataFrame({
+        'hour_start': pd.to_datetime(hours * HOUR_SECONDS, unit='s'),
+        'warehouse_name': metering['warehouse_name'].to_numpy()[meter],
+        'query_id': selected['query_id'].to_numpy(),
+        'user_name': selected['user_name'].to_numpy(),
+        'role_name': selected['role_name'].to_numpy(),
+        'overlap_seconds': overlap,
+        'attributed_credits_compute': compute,
+        'attributed_credits_cloud_services': cloud,
+        'attributed_credits': compute + cloud
+    })
+
+
+def rollup(per_query: pd.DataFrame, column: str) -> pd.DataFrame:
+    """Per-(hour, warehouse, user|role) totals of a per-query attribution"""
+    grouped = per_query.groupby(['hour_start', 'warehouse_name', column], dropna=False, sort=False)
+    result = grouped[_CREDITS].sum()
+    result.insert(0, 'query_count', grouped['query_id'].nunique())
+    return result.reset_index()
+
+
+class CreditAttributor:
+    """Incremental attribution of WAREHOUSE_METERING_HISTORY credits to queries, users and roles.
+
+    Each run re-attributes the hours after the stored watermark (minus the metering revision
+    window) up to the last closed hour, replacing those hours in the FINOPS_*_ATTRIBUTION tables
+    in one transaction.
+    """
+
+    def __init__(self, execute_query: Callable[..., pd.DataFrame], connect: Callable[[], Any],
+                 days: int = 30, on_attributed: Optional[Callable[[pd.DataFrame, pd.DataFrame], Any]] = None):
+        self.execute_query = execute_query
+        # Opens the connection each publish runs on and closes afterwards, so its transaction is never
+        # joined by statements of the shared session
+        self.connect = connect
+        self.days = days
+        # Called with (metering, per-user attribution) of the hours a run rewrote
+        self.on_attributed = on_attributed
+        self.last_run: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+    def _watermark(self) -> Optional[datetime]:
+        df = self.execute_query("SELECT MAX(hour_start) FROM FINOPS_USER_ATTRIBUTION")
+        value = df.iloc[0, 0] if not df.empty else None
+        return None if value is None or pd.isna(value) else pd.Timestamp(value).to_pydatetime()
+
+    def _metering(self, since: datetime, until: datetime) -> pd.DataFrame:
+        df = self.execute_query("""
+        SELECT
+            warehouse_name,
+            CONVERT_TIMEZONE('UTC', start_time)::TIMESTAMP_NTZ as start_time,
+            credits_used_compute,
+            credits_used_cloud_services
+        FROM SNOWFLAKE.ACCOUNT_USAGE.WAREHOUSE_METERING_HISTORY
+        WHERE start_time >= %(since)s::TIMESTAMP_TZ
+        AND start_time < %(until)s::TIMESTAMP_TZ
+        """, {'since': _utc(since), 'until': _utc(until)})
+        df.columns = [c.lower() for c in df.columns]
+        for column in ('credits_used_compute', 'credits_used_cloud_services'):
+            df[column] = df[column].astype(float)
+        return df
+
+    def _queries(self, since: datetime, until: datetime) -> pd.DataFrame:
+        df = self.execute_query("""
+        SELECT
+            query_id,
+            warehouse_name,
+            user_name,
+            role_name,
+            end_time,
+            execution_time
+        FROM SNOWFLAKE.ACCOUNT_USAGE.QUERY_HISTORY
+        WHERE end_time > %(since)s::TIMESTAMP_TZ
+        AND start_time < %(until)s::TIMESTAMP_TZ
+        AND warehouse_name IS NOT NULL
+        AND execution_time > 0
+        """, {'since': _utc(since), 'until': _utc(until)})
+        df.columns = [c.lower() for c in df.columns]
+        return df
+
+    def _publish(self, frames: Dict[str, pd.DataFrame], since: datetime):
+        """Replace the hours from since in every grain's table in one transaction.
+
+        Rows are first loaded into session-private temporary copies, so readers never see a window
+        with its old rows deleted and the new ones missing, and a failed load leaves the tables untouched.
+        The loads and the transaction share one dedicated connection: temporary tables are only
+        visible to the session that created them.
+        """
+        connection = self.connect()
+        cursor = connection.cursor()
+        try:
+            loaded = {}
+            for grain, df in frames.items():
+                table = ATTRIBUTION_TABLES[grain]
+                if df.empty:
+                    continue
+                loaded[table] = f"{table}__LOAD"
+                cursor.execute(f"CREATE OR REPLACE TEMPORARY TABLE {loaded[table]} LIKE {table}")
+                frame = df.copy()
+                frame.columns = [c.upper() for c in frame.columns]
+                # Logical types keep naive datetime columns as TIMESTAMP_NTZ values instead of raw epoch integers
+                write_pandas(connection, frame, loaded[table], quote_identifiers=False, use_logical_type=True)
+
+            cursor.execute("BEGIN")
+            try:
+                for grain, df in frames.items():
+                    table = ATTRIBUTION_TABLES[grain]
+                    cursor.execute(f"DELETE FROM {table} WHERE hour_start >= %(since)s::TIMESTAMP_NTZ",
+                                   {'since': since.strftime('%Y-%m-%d %H:%M:%S')})
+                    if table in loaded:
+                        columns = ', '.join(c.upper() for c in df.columns)
+                        cursor.execute(f"INSERT INTO {table} ({columns}) SELECT {columns} FROM {loaded[table]}")
+                cursor.execute("COMMIT")
+            except Exception:
+                cursor.execute("ROLLBACK")
+                raise
+        finally:
+            cursor.close()
+            # Temporary tables go with the session
+            connection.close()
+
+    def run(self, full: bool = False) -> Dict[str, Any]:
+        """Attribute every closed hour not yet written (or the whole window when full)"""
+        with self._lock:
+            started = datetime.now()
+            for statement in ATTRIBUTION_DDL.values():
+                self.execute_query(statement)
+
+            until = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+            watermark = None if full else self._watermark()
+            if watermark is None:
+                since = until - timedelta(days=self.days)
+            else:
+                since = min(watermark + timedelta(hours=1) - METERING_OVERLAP, until)
+
+            metering = self._metering(since, until)
+            queries = self._queries(since, until)
+            per_query = attribute_hours(queries, metering)
+            per_query = per_query[per_query['hour_start'] >= since].reset_index(drop=True)
+
+            frames = {
+                'query': per_query,
+                'user': rollup(per_query, 'user_name'),
+                'role': rollup(per_query, 'role_name'),
+            }
+            for frame in frames.values():
+                frame['last_updated'] = started
+            self._publish(frames, since)
+            if self.on_attributed:
+                try:
+                    self.on_attributed(metering, frames['user'])
+                except Exception as e:
+                    logger.error(f"Post-attribution hook failed: {e}")
+
+            metered = float((metering['credits_used_compute'] + metering['credits_used_cloud_services']).sum())
+            attributed = float(per_query['attributed_credits'].sum())
+            self.last_run = {
+                'since': since.isoformat(),
+                'until': until.isoformat(),
+                'metered_hours': len(metering),
+                'queries': len(queries),
+                'attributed_rows': len(per_query),
+                'metered_credits': metered,
+                'attributed_credits': attributed,
+                # Hours the warehouse was billed with nothing executing
+                'unattributed_credits': max(metered - attributed, 0.0),
+                'duration_seconds': (datetime.now() - started).total_seconds(),
+                'timestamp': datetime.now().isoformat()
+            }
+            logger.info(f"Attributed {attributed:.2f} of {metered:.2f} credits over {len(metering)} warehouse-hours")
+            return self.last_run
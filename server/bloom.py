@@ -0,0 +1,130 @@
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Two independent 64-bit hashes; the k probe positions are h1 + i * h2 (Kirsch-Mitzenmacher)
+_HASH_KEYS = ('finops-bloom-k01', 'finops-bloom-k02')
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, hashed and probed with vectorized NumPy"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(int(capacity), 1)
+        self.size = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.hash_count = max(int(round(self.size / capacity * math.log(2))), 1)
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+
+    def _positions(self, values: Iterable[str]) -> np.ndarray:
+        values = np.asarray(list(values), dtype=object)
+        h1, h2 = (pd.util.hash_array(values, hash_key=key, categorize=False) for key in _HASH_KEYS)
+        probes = np.arange(self.hash_count, dtype=np.uint64)
+        # uint64 arithmetic wraps, which is fine for hashing
+        return (h1[:, None] + probes[None, :] * h2[:, None]) % np.uint64(self.size)
+
+    def add_many(self, values: Iterable[str]):
+        positions = self._positions(values).ravel()
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3),
+                         (np.uint8(1) << (positions & np.uint64(7)).astype(np.uint8)))
+
+    def contains_many(self, values: Iterable[str]) -> np.ndarray:
+        """False means definitely absent; True means probably present"""
+        positions = self._positions(values)
+        if positions.size == 0:
+            return np.zeros(0, dtype=bool)
+        bytes_ = self.bits[positions >> np.uint64(3)]
+        present = (bytes_ >> (positions & np.uint64(7)).astype(np.uint8)) & np.uint8(1)
+        return present.all(axis=1)
+
+
+class KnownIdFilter:
+    """Screens ids before they reach Snowflake: a Bloom filter of every known id plus a negative cache.
+
+    The source table can change outside this process (other workers, server.py, Snowflake-maintained
+    tables), so the filter is reloaded when load_version reports a new version, checked at most every
+    check_seconds, and in any case after ttl_seconds.
+    """
+
+    def __init__(self, load_ids: Callable[[], Iterable[str]], error_rate: float = 0.01,
+                 negative_cache_size: int = 100000, load_version: Optional[Callable[[], Any]] = None,
+                 check_seconds: float = 60, ttl_seconds: float = 3600):
+        self.load_ids = load_ids
+        self.load_version = load_version
+        self.error_rate = error_rate
+        self.negative_cache_size = negative_cache_size
+        self.check_seconds = check_seconds
+        self.ttl_seconds = ttl_seconds
+        self.bloom: Optional[BloomFilter] = None
+        self.id_count = 0
+        self.version: Any = None
+        self.loaded_at = 0.0
+        self.checked_at = 0.0
+        self.negative: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Drop the filter after the source table is rebuilt; it is reloaded on next use"""
+        with self._lock:
+            self.bloom = None
+            self.negative.clear()
+
+    def _stale(self, now: float) -> bool:
+        if now - self.loaded_at >= self.ttl_seconds:
+            return True
+        if self.load_version is None or now - self.checked_at < self.check_seconds:
+            return False
+        self.checked_at = now
+        try:
+            return self.load_version() != self.version
+        except Exception as e:
+            logger.warning(f"Could not check the bloom filter source version: {e}")
+            return False
+
+    def _ensure_loaded(self) -> BloomFilter:
+        with self._lock:
+            now = time.monotonic()
+            if self.bloom is not None and self._stale(now):
+                self.bloom = None
+                self.negative.clear()
+            if self.bloom is None:
+                # Read before the ids, so a change in between shows up as a new version next check
+                version = self.load_version() if self.load_version is not None else None
+                ids = list(self.load_ids())
+                bloom = BloomFilter(len(ids), self.error_rate)
+                if ids:
+                    bloom.add_many(ids)
+                self.bloom, self.id_count, self.version = bloom, len(ids), version
+                self.loaded_at = self.checked_at = now
+                logger.info(f"Loaded {len(ids)} ids into bloom filter ({bloom.size} bits, {bloom.hash_count} hashes)")
+            return self.bloom
+
+    def partition(self, ids: List[str]) -> Tuple[List[str], List[str]]:
+        """Split ids into (worth looking up, known to be absent)"""
+        if not ids:
+            return [], []
+        maybe = self._ensure_loaded().contains_many(ids)
+        candidates, absent = [], []
+        with self._lock:
+            for query_id, present in zip(ids, maybe):
+                if present and query_id not in self.negative:
+                    candidates.append(query_id)
+                else:
+                    absent.append(query_id)
+        return candidates, absent
+
+    def record_missing(self, ids: Iterable[str]):
+        """Remember Bloom false positives so they are not looked up again"""
+        with self._lock:
+            for query_id in ids:
+                self.negative[query_id] = None
+                self.negative.move_to_end(query_id)
+            while len(self.negative) > self.negative_cache_size:
+                self.negative.popitem(last=False)
@@ -0,0 +1,60 @@
+from typing import Tuple
+
+import numpy as np
+
+METHODS = ('lttb', 'minmax')
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of threshold points that keep the visual shape"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    x = x.astype(np.float64)
+    y = y.astype(np.float64)
+    # First and last points are always kept; the rest is split into threshold - 2 buckets
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        # Average of the next bucket is the third triangle vertex
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        next_end = max(next_end, next_start + 1)
+        avg_x = x[next_start:next_end].mean()
+        avg_y = y[next_start:next_end].mean()
+
+        area = np.abs((x[previous] - avg_x) * (y[start:end] - y[previous])
+                      - (x[previous] - x[start:end]) * (avg_y - y[previous]))
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+    return selected
+
+
+def minmax(x: np.ndarray, y: np.ndarray, buckets: int) -> np.ndarray:
+    """Indices of the min and max point of each of `buckets` equal-width buckets, in x order"""
+    n = len(x)
+    if buckets * 2 >= n or buckets < 1:
+        return np.arange(n)
+
+    bucket = (np.arange(n) * buckets) // n
+    # Within each bucket, order by y: the first row is the min, the last the max
+    order = np.lexsort((y, bucket))
+    bounds = np.flatnonzero(np.diff(bucket[order])) + 1
+    firsts = order[np.concatenate(([0], bounds))]
+    lasts = order[np.concatenate((bounds - 1, [n - 1]))]
+    return np.unique(np.concatenate((firsts, lasts)))
+
+
+def downsample(x: np.ndarray, y: np.ndarray, width: int, method: str = 'lttb') -> Tuple[np.ndarray, np.ndarray]:
+    """Reduce a series to about `width` points (one per pixel) for charting"""
+    if method not in METHODS:
+        raise ValueError(f"Unknown downsampling method '{method}', expected one of {', '.join(METHODS)}")
+    if method == 'lttb':
+        keep = lttb(x, y, width)
+    else:
+        keep = minmax(x, y, max(width // 2, 1))
+    return x[keep], y[keep]
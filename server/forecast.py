@@ -0,0 +1,156 @@
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SEASON = 7
+MODELS = ('seasonal_naive', 'holt_winters', 'linear_trend')
+# Holt-Winters additive smoothing for level, trend and weekly season
+HW_ALPHA, HW_BETA, HW_GAMMA = 0.3, 0.05, 0.2
+# Days the linear trend is fitted on, and days held out to pick each series' model
+TREND_WINDOW = 28
+BACKTEST_DAYS = 7
+MIN_HISTORY_DAYS = 2 * SEASON + BACKTEST_DAYS
+
+SCOPES = ('warehouse', 'user', 'role')
+
+_DAILY_QUERIES = {
+    'warehouse': """
+    SELECT
+        DATE_TRUNC('day', CONVERT_TIMEZONE('UTC', start_time))::DATE as day,
+        warehouse_name as name,
+        SUM(credits_used) as credits
+    FROM SNOWFLAKE.ACCOUNT_USAGE.WAREHOUSE_METERING_HISTORY
+    WHERE start_time >= %(since)s::TIMESTAMP_TZ
+    AND start_time < %(until)s::TIMESTAMP_TZ
+    GROUP BY 1, 2
+    """,
+    'user': """
+    SELECT DATE_TRUNC('day', hour_start)::DATE as day, user_name as name, SUM(attributed_credits) as credits
+    FROM FINOPS_USER_ATTRIBUTION
+    WHERE hour_start >= %(since)s::TIMESTAMP_NTZ
+    AND hour_start < %(until)s::TIMESTAMP_NTZ
+    GROUP BY 1, 2
+    """,
+    'role': """
+    SELECT DATE_TRUNC('day', hour_start)::DATE as day, role_name as name, SUM(attributed_credits) as credits
+    FROM FINOPS_ROLE_ATTRIBUTION
+    WHERE hour_start >= %(since)s::TIMESTAMP_NTZ
+    AND hour_start < %(until)s::TIMESTAMP_NTZ
+    GROUP BY 1, 2
+    """,
+}
+
+
+def seasonal_naive(history: np.ndarray, horizon: int) -> np.ndarray:
+    """Repeat the last week of every row"""
+    steps = np.arange(horizon) % SEASON
+    return history[:, history.shape[1] - SEASON + steps]
+
+
+def linear_trend(history: np.ndarray, horizon: int) -> np.ndarray:
+    """Least-squares line over the last TREND_WINDOW days of every row, extended forward"""
+    window = history[:, -TREND_WINDOW:]
+    x = np.arange(window.shape[1], dtype=np.float64)
+    x_centered = x - x.mean()
+    y_mean = window.mean(axis=1, keepdims=True)
+    slope = ((window - y_mean) * x_centered).sum(axis=1, keepdims=True) / (x_centered ** 2).sum()
+    future = x[-1] + 1 + np.arange(horizon) - x.mean()
+    return y_mean + slope * future
+
+
+def holt_winters(history: np.ndarray, horizon: int) -> np.ndarray:
+    """Additive Holt-Winters with a weekly season; one pass over time, vectorized over rows"""
+    level = history[:, :SEASON].mean(axis=1)
+    trend = (history[:, SEASON:2 * SEASON].mean(axis=1) - level) / SEASON
+    season = history[:, :SEASON] - level[:, None]
+    for t in range(history.shape[1]):
+        slot = t % SEASON
+        value = history[:, t]
+        previous = level
+        level = HW_ALPHA * (value - season[:, slot]) + (1 - HW_ALPHA) * (level + trend)
+        trend = HW_BETA * (level - previous) + (1 - HW_BETA) * trend
+        season[:, slot] = HW_GAMMA * (value - level) + (1 - HW_GAMMA) * season[:, slot]
+    steps = np.arange(1, horizon + 1)
+    slots = (history.shape[1] + steps - 1) % SEASON
+    return level[:, None] + trend[:, None] * steps + season[:, slots]
+
+
+_FORECASTERS = {'seasonal_naive': seasonal_naive, 'holt_winters': holt_winters, 'linear_trend': linear_trend}
+
+
+def forecast_matrix(history: np.ndarray, horizon: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Forecast every row with the model that did best on the held-out last week.
+
+    Returns (forecast of shape (rows, horizon), chosen model index, backtest MAE).
+    """
+    train, held_out = history[:, :-BACKTEST_DAYS], history[:, -BACKTEST_DAYS:]
+    errors = np.stack([np.abs(np.maximum(_FORECASTERS[name](train, BACKTEST_DAYS), 0) - held_out).mean(axis=1)
+                       for name in MODELS], axis=1)
+    chosen = errors.argmin(axis=1)
+    if horizon == 0:
+        return np.zeros((len(history), 0)), chosen, errors[np.arange(len(history)), chosen]
+    forecasts = np.stack([_FORECASTERS[name](history, horizon) for name in MODELS], axis=1)
+    forecast = np.maximum(forecasts[np.arange(len(history)), chosen], 0)
+    return forecast, chosen, errors[np.arange(len(history)), chosen]
+
+
+def month_end_projection(daily: pd.DataFrame, since: datetime, today: datetime) -> pd.DataFrame:
+    """Projected month total per name from a day/name/credits frame of the days since..today"""
+    if daily.empty:
+        return pd.DataFrame(columns=['name', 'model', 'month_to_date', 'forecast_remaining',
+                                     'projected_month_total', 'last_30_days', 'backtest_mae'])
+    # Missing days are days without spend; today is partial and is forecast instead
+    days = pd.date_range(pd.Timestamp(since.date()), pd.Timestamp(today.date()) - pd.Timedelta(days=1))
+    matrix = (daily.assign(day=pd.to_datetime(daily['day']), credits=daily['credits'].astype(float))
+              .pivot_table(index='name', columns='day', values='credits', aggfunc='sum')
+              .reindex(columns=days, fill_value=0.0).fillna(0.0))
+    history = matrix.to_numpy(dtype=np.float64)
+
+    month_start = pd.Timestamp(today.date()).replace(day=1)
+    month_end = month_start + pd.offsets.MonthEnd(0)
+    horizon = (month_end - pd.Timestamp(today.date())).days + 1
+    forecast, chosen, mae = forecast_matrix(history, horizon)
+
+    month_to_date = history[:, days >= month_start].sum(axis=1)
+    remaining = forecast.sum(axis=1)
+    return pd.DataFrame({
+        'name': matrix.index,
+        'model': np.array(MODELS)[chosen],
+        'month_to_date': month_to_date,
+        'forecast_remaining': remaining,
+        'projected_month_total': month_to_date + remaining,
+        'last_30_days': history[:, -30:].sum(axis=1),
+        'backtest_mae': mae
+    }).sort_values('projected_month_total', ascending=False).reset_index(drop=True)
+
+
+def forecast_scope(execute_query: Callable[..., pd.DataFrame], scope: str, days: int = 90,
+                   today: datetime = None) -> Dict[str, Any]:
+    """Month-end projections for every warehouse, user or role"""
+    if scope not in SCOPES:
+        raise ValueError(f"Unknown scope '{scope}', expected one of {', '.join(SCOPES)}")
+    today = today or datetime.utcnow()
+    until = today.replace(hour=0, minute=0, second=0, microsecond=0)
+    since = until - timedelta(days=max(days, MIN_HISTORY_DAYS))
+    started = datetime.now()
+    # Metering binds carry an explicit UTC offset; the attribution tables are already UTC
+    bind_format = '%Y-%m-%d %H:%M:%S +00:00' if scope == 'warehouse' else '%Y-%m-%d %H:%M:%S'
+    daily = execute_query(_DAILY_QUERIES[scope], {'since': since.strftime(bind_format),
+                                                  'until': until.strftime(bind_format)})
+    daily.columns = [c.lower() for c in daily.columns]
+    projections = month_end_projection(daily, since, today)
+    logger.info(f"Forecast {len(projections)} {scope} series in {(datetime.now() - started).total_seconds():.2f}s")
+    return {
+        'scope': scope,
+        'month': today.strftime('%Y-%m'),
+        'history_days': (until - since).days,
+        'series': len(projections),
+        'projected_total': float(projections['projected_month_total'].sum()),
+        'forecasts': projections
+    }
+
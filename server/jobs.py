@@ -0,0 +1,450 @@
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import groupby
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+from flask import jsonify, request
+
+from metrics import TABLE_BUILD_SECONDS
+from replay import recorder
+from self_cost import session_tag_sql, statement_params
+
+try:
+    import fcntl
+except ImportError:  # saves are only serialized within the process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Each app keeps its jobs in <dir>/<component>.json, shared by all of its worker processes
+JOBS_DIR = os.getenv('FINOPS_JOBS_DIR', './jobs')
+
+# A step is (name, sql, on_result); on_result receives the fetched DataFrame
+# for statements whose rows are needed (index2 SELECTs), or is None for DDL/CALL.
+# Consecutive steps with the same name run under one refresh lease.
+Step = Tuple[str, str, Optional[Callable[[pd.DataFrame], Any]]]
+
+ACTIVE_STATES = ('queued', 'running')
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobManager:
+    """Background statement jobs of one app.
+
+    Every worker shares the app's state file. A job belongs to the worker running it: saves merge
+    under a file lock so a worker only writes its own jobs, a job is marked interrupted only once
+    its owner process is gone, and cancelling another worker's job is passed on through the file.
+    """
+
+    def __init__(self, get_connection: Callable[[], Any], component: str,
+                 state_path: Optional[str] = None, max_workers: int = 2, poll_interval: float = 1.0,
+                 on_step_done: Optional[Callable[[str], Any]] = None, coordinator=None,
+                 lease_resource: Callable[[str], Optional[str]] = lambda name: name):
+        self.get_connection = get_connection
+        self.on_step_done = on_step_done
+        self.component = component
+        self.state_path = state_path or os.path.join(JOBS_DIR, f'{component}.json')
+        # Steps take the same refresh leases as interactive refreshes; None skips the lease
+        self.coordinator = coordinator
+        self.lease_resource = lease_resource
+        self.poll_interval = poll_interval
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+        self.kinds: Dict[str, Callable[[Dict[str, Any]], List[Step]]] = {}
+        self._cancel_events: Dict[str, threading.Event] = {}
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f'{component}-refresh')
+        self._load()
+
+    def register_kind(self, kind: str, build_steps: Callable[[Dict[str, Any]], List[Step]]):
+        """Register how to (re)build the steps of a job kind from its parameters"""
+        self.kinds[kind] = build_steps
+
+    def known(self, job_id: str) -> bool:
+        """Whether a job exists, re-reading the state file for jobs other workers submitted"""
+        if job_id not in self.jobs:
+            self.reload()
+        return job_id in self.jobs
+
+    # Persistence
+
+    @property
+    def owner(self) -> str:
+        # Looked up on use: with preloading the manager is created before the workers fork
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    @staticmethod
+    def _owner_alive(owner: Optional[str]) -> bool:
+        host, _, pid = (owner or '').rpartition(':')
+        if not pid.isdigit():
+            return False
+        if host != socket.gethostname():
+            # Cannot be checked from here; the job stays active until that host resumes or reports it
+            return True
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    @staticmethod
+    def _interrupt(job: Dict[str, Any]):
+        job['status'] = 'interrupted'
+        for step in job['steps']:
+            if step['status'] == 'running':
+                step['status'] = 'interrupted'
+
+    @contextmanager
+    def _file_lock(self):
+        os.makedirs(os.path.dirname(self.state_path) or '.', exist_ok=True)
+        if fcntl is None:
+            yield
+            return
+        with open(f"{self.state_path}.lock", 'a') as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _read(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.state_path):
+            return {}
+        try:
+            with open(self.state_path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not load refresh jobs from {self.state_path}: {e}")
+            return {}
+
+    def _write(self, jobs: Dict[str, Dict[str, Any]]):
+        tmp_path = f"{self.state_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(jobs, f, default=str)
+        os.replace(tmp_path, self.state_path)
+
+    def _load(self):
+        self._save()
+
+    def _save(self):
+        """Merge with the state file: write this worker's jobs, take every other worker's from the file"""
+        owner = self.owner
+        with self._lock, self._file_lock():
+            for job_id, stored in self._read().items():
+                mine = self.jobs.get(job_id)
+                if mine is not None and mine.get('owner') == owner and (
+                        mine['status'] in ACTIVE_STATES or stored.get('owner') == owner):
+                    if stored.get('cancel_requested') and job_id in self._cancel_events:
+                        self._cancel_events[job_id].set()
+                    continue
+                # Jobs that were active when their process died can be resumed via POST /api/jobs/<id>/resume
+                if stored['status'] in ACTIVE_STATES and not self._owner_alive(stored.get('owner')):
+                    self._interrupt(stored)
+                self.jobs[job_id] = stored
+            self._write(self.jobs)
+
+    def reload(self):
+        """Pick up jobs submitted, finished or abandoned by other workers"""
+        self._save()
+
+    # Public API
+
+    def submit(self, kind: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Queue a refresh job and return it immediately"""
+        params = params or {}
+        steps = self.kinds[kind](params)
+        job_id = uuid.uuid4().hex[:12]
+        job = {
+            'job_id': job_id,
+            'kind': kind,
+            'params': params,
+            'owner': self.owner,
+            'status': 'queued',
+            'created_at': datetime.now().isoformat(),
+            'started_at': None,
+            'finished_at': None,
+            'error': None,
+            'steps': [{'name': name, 'status': 'pending', 'query_id': None, 'started_at': None,
+                       'finished_at': None, 'elapsed_sec': None, 'rows': None, 'error': None}
+                      for name, _, _ in steps]
+        }
+        with self._lock:
+            self.jobs[job_id] = job
+            self._save()
+        self._start(job, steps)
+        return self.describe(job_id)
+
+    def resume(self, job_id: str) -> Dict[str, Any]:
+        """Continue an interrupted or failed job, re-attaching to Snowflake queries still known by id"""
+        self.reload()
+        with self._lock:
+            job = self.jobs[job_id]
+            if job['status'] in ACTIVE_STATES:
+                return self.describe(job_id)
+            if job['kind'] not in self.kinds:
+                raise ValueError(f"Job kind '{job['kind']}' is not handled by {self.component}")
+            steps = self.kinds[job['kind']](job['params'])
+            job['owner'] = self.owner
+            job['status'] = 'queued'
+            job['error'] = None
+            job.pop('cancel_requested', None)
+            self._save()
+        self._start(job, steps)
+        return self.describe(job_id)
+
+    def cancel(self, job_id: str) -> Dict[str, Any]:
+        """Stop a job; its owner cancels the running Snowflake statement"""
+        self.reload()
+        with self._lock:
+            job = self.jobs[job_id]
+            if job['status'] not in ACTIVE_STATES:
+                return self.describe(job_id)
+            event = self._cancel_events.get(job_id)
+            if job.get('owner') == self.owner and event is not None:
+                event.set()
+            else:
+                # Another worker runs it and picks the request up on its next poll
+                with self._file_lock():
+                    stored = self._read()
+                    if job_id in stored:
+                        stored[job_id]['cancel_requested'] = True
+                        self._write(stored)
+                job['cancel_requested'] = True
+        return self.describe(job_id)
+
+    def describe(self, job_id: str) -> Dict[str, Any]:
+        with self._lock:
+            job = json.loads(json.dumps(self.jobs[job_id], default=str))
+        now = datetime.now()
+        for step in job['steps']:
+            if step['status'] == 'running' and step['started_at']:
+                step['elapsed_sec'] = round((now - datetime.fromisoformat(step['started_at'])).total_seconds(), 1)
+        done = len([s for s in job['steps'] if s['status'] == 'succeeded'])
+        job['progress'] = {
+            'completed_steps': done,
+            'total_steps': len(job['steps']),
+            'percent': round(done * 100.0 / len(job['steps']), 1) if job['steps'] else 100.0
+        }
+        if job['started_at']:
+            end = datetime.fromisoformat(job['finished_at']) if job['finished_at'] else now
+            job['elapsed_sec'] = round((end - datetime.fromisoformat(job['started_at'])).total_seconds(), 1)
+        return job
+
+    def list(self) -> List[Dict[str, Any]]:
+        self.reload()
+        return sorted((self.describe(job_id) for job_id in list(self.jobs)),
+                      key=lambda j: j['created_at'], reverse=True)
+
+    # Execution
+
+    def _start(self, job: Dict[str, Any], steps: List[Step]):
+        self._cancel_events[job['job_id']] = threading.Event()
+        self._executor.submit(self._run, job, steps)
+
+    def _update(self, step: Dict[str, Any], **changes):
+        with self._lock:
+            step.update(changes)
+            self._save()
+
+    def _cancel_query(self, query_id: str):
+        try:
+            cursor = self.get_connection().cursor()
+            cursor.execute("SELECT SYSTEM$CANCEL_QUERY(%s)", (query_id,))
+            cursor.close()
+            logger.info(f"Cancelled Snowflake query {query_id}")
+        except Exception as e:
+            logger.error(f"Failed to cancel query {query_id}: {e}")
+
+    def _wait(self, connection, query_id: str, cancel_event: threading.Event):
+        interval = self.poll_interval
+        while True:
+            status = connection.get_query_status_throw_if_error(query_id)
+            if not connection.is_still_running(status):
+                return status
+            if not cancel_event.wait(interval):
+                # Cancellations requested through another worker arrive with the state file
+                self._save()
+            if cancel_event.is_set():
+                self._cancel_query(query_id)
+                raise JobCancelled()
+            interval = min(interval * 1.5, 10.0)
+
+    def _replay_step(self, step: Dict[str, Any], sql: str, on_result):
+        """A step in replay mode: SELECTs are served from the recording, DDL and CALLs are not sent"""
+        started = time.perf_counter()
+        self._update(step, status='running', started_at=datetime.now().isoformat(), error=None)
+        rows = None
+        if on_result is not None:
+            df = recorder.replay(sql)
+            on_result(df)
+            rows = len(df)
+        self._update(step, status='succeeded', finished_at=datetime.now().isoformat(),
+                     elapsed_sec=round(time.perf_counter() - started, 1), rows=rows)
+        if self.on_step_done is not None:
+            self.on_step_done(step['name'])
+
+    def _run_step(self, step: Dict[str, Any], sql: str, on_result, cancel_event: threading.Event):
+        if recorder.mode == 'replay':
+            return self._replay_step(step, sql, on_result)
+        connection = self.get_connection()
+        cursor = connection.cursor()
+        started = time.perf_counter()
+        session_tagged = False
+        try:
+            # A step interrupted by a restart keeps its query id; re-attach instead of re-running it
+            query_id = step['query_id'] if step['status'] == 'interrupted' else None
+            if query_id is None:
+                if sql.lstrip().upper().startswith('CALL'):
+                    # Session-level tag so the statements inside the procedure are attributed too
+                    cursor.execute(session_tag_sql(self.component, sql))
+                    session_tagged = True
+                cursor.execute_async(sql, _statement_params=statement_params(self.component, sql))
+                query_id = cursor.sfqid
+            self._update(step, status='running', query_id=query_id, started_at=datetime.now().isoformat(), error=None)
+
+            self._wait(connection, query_id, cancel_event)
+            rows = None
+            if on_result is not None:
+                cursor.get_results_from_sfqid(query_id)
+                df = pd.DataFrame(cursor.fetchall(), columns=[desc[0] for desc in cursor.description])
+                if recorder.mode == 'record':
+                    recorder.record(sql, None, df, (time.perf_counter() - started) * 1000)
+                on_result(df)
+                rows = len(df)
+        finally:
+            if session_tagged:
+                try:
+                    cursor.execute("ALTER SESSION UNSET QUERY_TAG")
+                except Exception as e:
+                    logger.warning(f"Could not unset query tag after {step['name']}: {e}")
+            cursor.close()
+
+        elapsed = time.perf_counter() - started
+        TABLE_BUILD_SECONDS.observe(elapsed, table=step['name'])
+        self._update(step, status='succeeded', finished_at=datetime.now().isoformat(),
+                     elapsed_sec=round(elapsed, 1), rows=rows)
+        if self.on_step_done is not None:
+            self.on_step_done(step['name'])
+
+    @contextmanager
+    def _step_lease(self, name: str):
+        resource = self.lease_resource(name) if self.coordinator is not None else None
+        if resource is None:
+            yield None
+            return
+        with self.coordinator.lease(resource) as lease:
+            yield lease
+
+    def _run(self, job: Dict[str, Any], steps: List[Step]):
+        cancel_event = self._cancel_events[job['job_id']]
+        with self._lock:
+            job['status'] = 'running'
+            job['started_at'] = job['started_at'] or datetime.now().isoformat()
+            self._save()
+
+        try:
+            pending = [(step, sql, on_result) for step, (_, sql, on_result) in zip(job['steps'], steps)
+                       if step['status'] != 'succeeded']
+            for name, group in groupby(pending, key=lambda item: item[0]['name']):
+                if cancel_event.is_set():
+                    raise JobCancelled()
+                with self._step_lease(name) as lease:
+                    for step, sql, on_result in group:
+                        try:
+                            if cancel_event.is_set():
+                                raise JobCancelled()
+                            if lease is not None:
+                                # A lease that lapsed mid-group must not let later statements run over a newer holder
+                                self.coordinator.ensure_held(lease)
+                            self._run_step(step, sql, on_result, cancel_event)
+                        except JobCancelled:
+                            self._update(step, status='cancelled', finished_at=datetime.now().isoformat())
+                            raise
+                        except Exception as e:
+                            self._update(step, status='failed', finished_at=datetime.now().isoformat(), error=str(e))
+                            raise
+            final_status, error = 'succeeded', None
+        except JobCancelled:
+            final_status, error = 'cancelled', None
+        except Exception as e:
+            logger.error(f"Refresh job {job['job_id']} failed: {e}")
+            final_status, error = 'failed', str(e)
+
+        with self._lock:
+            if final_status == 'cancelled':
+                for step in job['steps']:
+                    if step['status'] == 'pending':
+                        step['status'] = 'skipped'
+            job['status'] = final_status
+            job['error'] = error
+            job['finished_at'] = datetime.now().isoformat()
+            self._save()
+        logger.info(f"Refresh job {job['job_id']} {final_status}")
+
+
+def accepted_payload(job: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'status': 'accepted',
+        'job_id': job['job_id'],
+        'job_url': f"/api/jobs/{job['job_id']}",
+        'job': job,
+        'timestamp': datetime.now().isoformat()
+    }
+
+
+def accepted_response(job: Dict[str, Any]):
+    """202 response returned by refresh endpoints when ?async=true"""
+    return jsonify(accepted_payload(job)), 202
+
+
+def wants_async() -> bool:
+    if request.args.get('async', '').lower() == 'true':
+        return True
+    body = request.get_json(silent=True)
+    return bool(body and body.get('async'))
+
+
+def register_job_routes(app, manager: JobManager):
+    """Expose /api/jobs for listing, inspecting, cancelling and resuming refresh jobs"""
+
+    def list_jobs():
+        return jsonify({'jobs': manager.list()})
+
+    def get_job(job_id: str):
+        if not manager.known(job_id):
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(manager.describe(job_id))
+
+    def cancel_job(job_id: str):
+        if not manager.known(job_id):
+            return jsonify({'error': 'Job not found'}), 404
+        return jsonify(manager.cancel(job_id))
+
+    def resume_job(job_id: str):
+        if not manager.known(job_id):
+            return jsonify({'error': 'Job not found'}), 404
+        try:
+            return jsonify(manager.resume(job_id)), 202
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 409
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    app.add_url_rule('/api/jobs', 'list_jobs', list_jobs, methods=['GET'])
+    app.add_url_rule('/api/jobs/<job_id>', 'get_job', get_job, methods=['GET'])
+    app.add_url_rule('/api/jobs/<job_id>/cancel', 'cancel_job', cancel_job, methods=['POST'])
+    app.add_url_rule('/api/jobs/<job_id>/resume', 'resume_job', resume_job, methods=['POST'])
+    return app
@@ -0,0 +1,288 @@
+"""Deploy the FINOPS_* tables as Snowflake-maintained objects instead of rebuilding them from the server.
+
+    python materialize.py --check                      # generate and validate the DDL locally
+    python materialize.py --mode dynamic               # print Dynamic Table DDL
+    python materialize.py --mode tasks --deploy        # create and resume refresh tasks
+
+With FINOPS_MATERIALIZATION=dynamic or tasks the servers stop rebuilding the tables and only read them.
+
+Every definition is a rolling window over ACCOUNT_USAGE views ending at CURRENT_TIMESTAMP. Those are
+shared secure views without change tracking, so neither mode can maintain the tables incrementally:
+each Dynamic Table refresh or task run recomputes the whole window. Lags therefore default to no
+less than FINOPS_FULL_REFRESH_LAG (3 hours, about the views' own latency) and Dynamic Tables to
+REFRESH_MODE = FULL; a shorter --target-lag multiplies the recompute cost accordingly.
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# rebuild: the servers build the tables (default); dynamic / tasks: Snowflake maintains them
+MATERIALIZATION = os.getenv('FINOPS_MATERIALIZATION', 'rebuild').lower()
+MODES = ('dynamic', 'tasks')
+SOURCES = ('index', 'server')
+TARGET_LAG = os.getenv('FINOPS_TARGET_LAG', '')
+# JSON {"FINOPS_X": "15 minutes"} overriding the lag of single tables
+TARGET_LAGS = os.getenv('FINOPS_TARGET_LAGS', '')
+MATERIALIZE_WAREHOUSE = os.getenv('FINOPS_MATERIALIZE_WAREHOUSE', os.getenv('SNOWFLAKE_WAREHOUSE', 'COMPUTE_WH'))
+# Shortest default lag; ACCOUNT_USAGE views trail the account by 45 minutes to 3 hours anyway
+FULL_REFRESH_LAG = os.getenv('FINOPS_FULL_REFRESH_LAG', '3 hours')
+# The rolling windows rule out incremental refresh, so AUTO would settle on FULL as well
+REFRESH_MODE = os.getenv('FINOPS_REFRESH_MODE', 'FULL').upper()
+REFRESH_MODES = ('AUTO', 'INCREMENTAL', 'FULL')
+
+# Snowflake refreshes dynamic tables and runs tasks at most once a minute
+MIN_LAG_SECONDS = 60
+_LAG_UNITS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+_LAG_RE = re.compile(r'^(\d+)\s+(second|minute|hour|day)s?$', re.IGNORECASE)
+# Functions that force a full refresh of a dynamic table
+_NONDETERMINISTIC_RE = re.compile(r'\b(CURRENT_TIMESTAMP|CURRENT_DATE|CURRENT_TIME|SYSDATE|GETDATE|'
+                                  r'LOCALTIMESTAMP|RANDOM|UUID_STRING|SEQ[1248])\b', re.IGNORECASE)
+_CREATE_RE = re.compile(r'CREATE\s+OR\s+REPLACE\s+TABLE\s+(\w+)(?:\s+CLUSTER\s+BY\s*\(([^)]*)\))?\s+AS\s+(.*)',
+                        re.IGNORECASE | re.DOTALL)
+_PROCEDURE_BODY_RE = re.compile(r'CREATE\s+OR\s+REPLACE\s+TABLE\s+(\w+?)__STAGING\s+AS\s+(.*?);\s*\n',
+                                re.IGNORECASE | re.DOTALL)
+_PROCEDURE_NAME_RE = re.compile(r'CREATE\s+OR\s+REPLACE\s+PROCEDURE\s+(\w+)\(', re.IGNORECASE)
+
+
+@dataclass
+class Definition:
+    table: str
+    select: str
+    cluster_by: Optional[str]
+    lag: str
+    # CALL statement of the server.py procedure that builds the table, if any
+    procedure: Optional[str] = None
+
+
+def lag_string(seconds: int) -> str:
+    for unit, size in sorted(_LAG_UNITS.items(), key=lambda item: -item[1]):
+        if seconds % size == 0:
+            count = seconds // size
+            return f"{count} {unit}{'s' if count != 1 else ''}"
+    return f"{seconds} seconds"
+
+
+def lag_seconds(lag: str) -> int:
+    match = _LAG_RE.match(lag.strip())
+    if not match:
+        raise ValueError(f"Invalid TARGET_LAG '{lag}', expected e.g. '15 minutes' or '1 hour'")
+    return int(match.group(1)) * _LAG_UNITS[match.group(2).lower()]
+
+
+def lag_overrides() -> Dict[str, str]:
+    if not TARGET_LAGS:
+        return {}
+    try:
+        return {table.upper(): str(lag) for table, lag in json.loads(TARGET_LAGS).items()}
+    except (ValueError, AttributeError) as e:
+        logger.warning(f"Ignoring invalid FINOPS_TARGET_LAGS: {e}")
+        return {}
+
+
+def definitions(source: str = 'index', days: int = 30, target_lag: str = TARGET_LAG) -> List[Definition]:
+    """The SELECT behind every FINOPS_* table of a source, with its target lag.
+
+    index: the FinOpsAnalytics builders; server: the REFRESH_* stored procedures. Without a
+    target lag each table lags by its scheduler cadence, but no less than FULL_REFRESH_LAG.
+    """
+    from analytics import TABLE_BUILDERS, TABLE_CADENCES, FinOpsAnalytics
+    from pruning import CLUSTER_KEYS
+
+    overrides = lag_overrides()
+
+    def lag_for(table: str) -> str:
+        if overrides.get(table) or target_lag:
+            return overrides.get(table) or target_lag
+        return lag_string(max(TABLE_CADENCES.get(table, 3600), lag_seconds(FULL_REFRESH_LAG)))
+
+    result = []
+    if source == 'index':
+        builder = FinOpsAnalytics(None)
+        builder.set_time_filter(days)
+        # Deployed once and run by Snowflake, so the window has to follow the clock, not a rendered hour;
+        # CURRENT_TIMESTAMP is what makes every refresh a full one
+        builder.anchored = False
+        for table, name in TABLE_BUILDERS.items():
+            match = _CREATE_RE.search(getattr(builder, f"{name}_sql")())
+            result.append(Definition(table, match.group(3).strip(), CLUSTER_KEYS.get(table), lag_for(table)))
+    elif source == 'server':
+        from server import STORED_PROCEDURES
+        for procedure_sql in STORED_PROCEDURES.values():
+            procedure = _PROCEDURE_NAME_RE.search(procedure_sql).group(1)
+            for table, select in _PROCEDURE_BODY_RE.findall(procedure_sql):
+                result.append(Definition(table, select.strip(), CLUSTER_KEYS.get(table), lag_for(table),
+                                         f"CALL {procedure}()"))
+    else:
+        raise ValueError(f"Unknown source '{source}', expected one of {', '.join(SOURCES)}")
+    return result
+
+
+def dynamic_table_ddl(definition: Definition, warehouse: str = MATERIALIZE_WAREHOUSE,
+                      refresh_mode: str = REFRESH_MODE) -> List[str]:
+    cluster = f"\n    CLUSTER BY ({definition.cluster_by})" if definition.cluster_by else ''
+    return [f"""CREATE OR REPLACE DYNAMIC TABLE {definition.table}
+    TARGET_LAG = '{definition.lag}'
+    REFRESH_MODE = {refresh_mode}
+    WAREHOUSE = {warehouse}{cluster}
+AS
+{definition.select}"""]
+
+
+def task_ddl(definition: Definition, warehouse: str = MATERIALIZE_WAREHOUSE) -> List[str]:
+    """A task per table running the staged build and swap, so readers never see a partial table.
+
+    ACCOUNT_USAGE views are shared secure views that cannot carry streams, so each run recomputes
+    the definition's window; the lag becomes the task schedule.
+    """
+    from swaps import staged_statements
+
+    task = f"{definition.table}__REFRESH"
+    if definition.procedure:
+        body = definition.procedure
+    else:
+        cluster = f" CLUSTER BY ({definition.cluster_by})" if definition.cluster_by else ''
+        create = f"CREATE OR REPLACE TABLE {definition.table}{cluster} AS\n{definition.select}"
+        statements = ';\n    '.join(staged_statements(definition.table, create))
+        body = f"EXECUTE IMMEDIATE $$\nBEGIN\n    {statements};\nEND;\n$$"
+    minutes = max(lag_seconds(definition.lag) // 60, 1)
+    return [
+        f"""CREATE OR REPLACE TASK {task}
+    WAREHOUSE = {warehouse}
+    SCHEDULE = '{minutes} MINUTE'
+AS
+{body}""",
+        f"ALTER TASK {task} RESUME",
+    ]
+
+
+def deployment_statements(mode: str, source: str = 'index', days: int = 30, target_lag: str = TARGET_LAG,
+                          warehouse: str = MATERIALIZE_WAREHOUSE, refresh_mode: str = REFRESH_MODE) -> Dict[str, List[str]]:
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode '{mode}', expected one of {', '.join(MODES)}")
+    statements = {}
+    for definition in definitions(source, days, target_lag):
+        if mode == 'dynamic':
+            statements[definition.table] = dynamic_table_ddl(definition, warehouse, refresh_mode)
+        else:
+            statements[definition.table] = task_ddl(definition, warehouse)
+    return statements
+
+
+# Local checks
+
+def _strip_literals(sql: str) -> str:
+    """SQL with string literals, $$ blocks and comments blanked out, so structure can be inspected"""
+    sql = re.sub(r'\$\$.*?\$\$', "''", sql, flags=re.DOTALL)
+    sql = re.sub(r"'(?:[^']|'')*'", "''", sql)
+    return re.sub(r'--[^\n]*', '', sql)
+
+
+def check_select(select: str) -> List[str]:
+    errors = []
+    code = _strip_literals(select)
+    if code.count("'") % 2:
+        errors.append("unterminated string literal")
+    depth = 0
+    for char in code:
+        depth += {'(': 1, ')': -1}.get(char, 0)
+        if depth < 0:
+            break
+    if depth != 0:
+        errors.append("unbalanced parentheses")
+    if ';' in code.rstrip().rstrip(';'):
+        errors.append("more than one statement")
+    if not re.match(r'^\s*(WITH|SELECT)\b', code, re.IGNORECASE):
+        errors.append("definition does not start with SELECT or WITH")
+    if '%(' in code:
+        errors.append("unresolved bind parameter")
+    return errors
+
+
+def check_definition(definition: Definition, mode: str, refresh_mode: str = REFRESH_MODE) -> Dict[str, List[str]]:
+    """Errors that would make the DDL fail, and warnings about how Snowflake will maintain it"""
+    errors, warnings = check_select(definition.select), []
+    try:
+        if lag_seconds(definition.lag) < MIN_LAG_SECONDS:
+            errors.append(f"target lag {definition.lag} is below Snowflake's one minute minimum")
+    except ValueError as e:
+        errors.append(str(e))
+    if mode == 'dynamic':
+        if refresh_mode not in REFRESH_MODES:
+            errors.append(f"refresh mode {refresh_mode} is not one of {', '.join(REFRESH_MODES)}")
+        nondeterministic = sorted({f.upper() for f in _NONDETERMINISTIC_RE.findall(_strip_literals(definition.select))})
+        if nondeterministic and refresh_mode == 'INCREMENTAL':
+            errors.append(f"INCREMENTAL refresh is not possible with {', '.join(nondeterministic)}")
+        elif nondeterministic and refresh_mode == 'AUTO':
+            warnings.append(f"{', '.join(nondeterministic)} makes every refresh a full refresh")
+    elif '$$' in definition.select:
+        errors.append("definition contains $$ and cannot be embedded in a task body")
+    return {'errors': errors, 'warnings': warnings}
+
+
+def check(source: str, days: int = 30, target_lag: str = TARGET_LAG, refresh_mode: str = REFRESH_MODE) -> bool:
+    """Generate every mode's DDL and validate it without a Snowflake connection"""
+    ok = True
+    for mode in MODES:
+        for definition in definitions(source, days, target_lag):
+            result = check_definition(definition, mode, refresh_mode)
+            status = 'FAIL' if result['errors'] else 'ok'
+            print(f"[{status}] {mode:8} {definition.table} (lag {definition.lag})")
+            for message in result['errors']:
+                print(f"    error: {message}")
+            for message in result['warnings']:
+                print(f"    warning: {message}")
+            ok = ok and not result['errors']
+    return ok
+
+
+def deploy(statements: Dict[str, List[str]]):
+    import snowflake.connector
+    from accounts import env_config
+
+    connection = snowflake.connector.connect(**env_config())
+    try:
+        cursor = connection.cursor()
+        for table, table_statements in statements.items():
+            for statement in table_statements:
+                cursor.execute(statement)
+            print(f"Deployed {table}")
+    finally:
+        connection.close()
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=MODES, default=MATERIALIZATION if MATERIALIZATION in MODES else 'dynamic')
+    parser.add_argument('--source', choices=SOURCES, default='index')
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--target-lag', default=TARGET_LAG, help="e.g. '6 hours'; defaults to each table's cadence, "
+                        "at least FINOPS_FULL_REFRESH_LAG since every refresh recomputes the window")
+    parser.add_argument('--warehouse', default=MATERIALIZE_WAREHOUSE)
+    parser.add_argument('--refresh-mode', default=REFRESH_MODE, type=str.upper)
+    parser.add_argument('--check', action='store_true', help='validate the generated DDL locally and exit')
+    parser.add_argument('--deploy', action='store_true', help='run the DDL against SNOWFLAKE_* from the environment')
+    args = parser.parse_args(argv)
+
+    if args.check:
+        return 0 if check(args.source, args.days, args.target_lag, args.refresh_mode) else 1
+    statements = deployment_statements(args.mode, args.source, args.days, args.target_lag, args.warehouse,
+                                       args.refresh_mode)
+    if args.deploy:
+        deploy(statements)
+    else:
+        for table_statements in statements.values():
+            for statement in table_statements:
+                print(statement.rstrip().rstrip(';') + ';\n')
+    return 0
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    sys.exit(main())
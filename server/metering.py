@@ -0,0 +1,96 @@
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# WAREHOUSE_METERING_HISTORY can revise an hour for up to ~3 hours after it
+# closes, so each incremental pull re-reads this window behind the watermark.
+METERING_OVERLAP = timedelta(hours=6)
+METERING_COLUMNS = ('credits_used', 'credits_used_compute', 'credits_used_cloud_services')
+
+
+class MeteringHistoryCache:
+    """Hourly credits per warehouse, appended incrementally from WAREHOUSE_METERING_HISTORY"""
+
+    def __init__(self, execute_query: Callable[..., pd.DataFrame], days: int = 90, ttl_seconds: int = 900):
+        self.execute_query = execute_query
+        self.days = days
+        self.ttl_seconds = ttl_seconds
+        self.rows = pd.DataFrame(columns=['warehouse_name', 'start_time', *METERING_COLUMNS])
+        self.watermark: Optional[datetime] = None
+        self.last_refresh: Optional[datetime] = None
+        self._lock = threading.Lock()
+
+    def _history_query(self) -> str:
+        return """
+        SELECT
+            warehouse_name,
+            start_time,
+            credits_used,
+            credits_used_compute,
+            credits_used_cloud_services
+        FROM SNOWFLAKE.ACCOUNT_USAGE.WAREHOUSE_METERING_HISTORY
+        WHERE start_time >= %(since)s::TIMESTAMP_TZ
+        """
+
+    def refresh(self, force: bool = False) -> int:
+        """Pull hours since the watermark when the TTL expired; returns the number of rows fetched"""
+        with self._lock:
+            if not force and self.last_refresh is not None and \
+                    (datetime.now() - self.last_refresh).total_seconds() < self.ttl_seconds:
+                return 0
+            if self.watermark is None:
+                since = datetime.utcnow() - timedelta(days=self.days)
+            else:
+                since = self.watermark - METERING_OVERLAP
+
+            # start_time is TIMESTAMP_LTZ; an offset-less bind would be read in the session time zone
+            df = self.execute_query(self._history_query(), {'since': since.strftime('%Y-%m-%d %H:%M:%S +00:00')})
+            df.columns = [c.lower() for c in df.columns]
+            if not df.empty:
+                df['start_time'] = pd.to_datetime(df['start_time'], utc=True).dt.tz_localize(None)
+                for column in METERING_COLUMNS:
+                    df[column] = df[column].astype(float)
+                self.rows = (pd.concat([self.rows, df])
+                             .drop_duplicates(['warehouse_name', 'start_time'], keep='last')
+                             .sort_values(['warehouse_name', 'start_time'])
+                             .reset_index(drop=True))
+                self.watermark = self.rows['start_time'].max().to_pydatetime()
+
+            cutoff = datetime.utcnow() - timedelta(days=self.days)
+            self.rows = self.rows[self.rows['start_time'] >= cutoff]
+            self.last_refresh = datetime.now()
+            logger.info(f"Metering cache appended {len(df)} rows, holding {len(self.rows)}")
+            return len(df)
+
+    def series(self, warehouse_name: str, days: int, metric: str = 'credits_used') -> pd.Series:
+        """Hourly series for one warehouse over the last `days`, with idle hours filled as 0"""
+        if metric not in METERING_COLUMNS:
+            raise ValueError(f"Unknown metric '{metric}', expected one of {', '.join(METERING_COLUMNS)}")
+        self.refresh()
+        rows = self.rows
+        end = pd.Timestamp(datetime.utcnow()).floor('h')
+        start = end - pd.Timedelta(days=days)
+        selected = rows[(rows['warehouse_name'].str.upper() == warehouse_name.upper()) & (rows['start_time'] >= start)]
+        hourly = pd.date_range(start, end, freq='h')
+        return selected.set_index('start_time')[metric].reindex(hourly, fill_value=0.0)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'rows': len(self.rows),
+            'watermark': self.watermark.isoformat() if self.watermark else None,
+            'last_refresh': self.last_refresh.isoformat() if self.last_refresh else None
+        }
+
+
+def series_points(series: pd.Series) -> Dict[str, np.ndarray]:
+    """Epoch milliseconds and float values, the shape the downsamplers work on"""
+    return {
+        'x': series.index.to_numpy(dtype='datetime64[ms]').astype(np.int64),
+        'y': series.to_numpy(dtype=np.float64)
+    }
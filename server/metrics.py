@@ -0,0 +1,265 @@
+import logging
+import re
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Tuple
+
+from flask import Response, g, has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+_STATEMENT_RE = re.compile(r'\b((?:FINOPS|REFRESH)_[A-Z0-9_]+)\b', re.IGNORECASE)
+_statement_scope = ContextVar('finops_statement_scope', default=None)
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: str = '') -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class Metric:
+    def __init__(self, name: str, help_text: str, kind: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def value(self, **labels) -> Any:
+        return self._values.get(self._key(labels))
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            for key, state in items:
+                if self.kind != 'histogram':
+                    lines.append(f"{self.name}{_format_labels(key)} {state}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets, state[0]):
+                    cumulative += count
+                    le = 'le="%s"' % bound
+                    lines.append(f"{self.name}_bucket{_format_labels(key, le)} {cumulative}")
+                inf = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_format_labels(key, inf)} {state[2]}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {state[1]}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {state[2]}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+
+    def _register(self, name: str, help_text: str, kind: str, **kwargs) -> Metric:
+        if name not in self.metrics:
+            self.metrics[name] = Metric(name, help_text, kind, **kwargs)
+        return self.metrics[name]
+
+    def counter(self, name: str, help_text: str) -> Metric:
+        return self._register(name, help_text, 'counter')
+
+    def gauge(self, name: str, help_text: str) -> Metric:
+        return self._register(name, help_text, 'gauge')
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Metric:
+        return self._register(name, help_text, 'histogram', buckets=buckets)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+# Snowflake statement metrics
+QUERY_SECONDS = registry.histogram('finops_query_duration_seconds', 'Snowflake statement latency')
+QUERY_ROWS = registry.counter('finops_query_rows_total', 'Rows fetched from Snowflake')
+QUERY_BYTES = registry.counter('finops_query_bytes_total', 'In-memory bytes of fetched result sets')
+QUERY_ERRORS = registry.counter('finops_query_errors_total', 'Failed Snowflake statements')
+DATAFRAME_BUILD_SECONDS = registry.histogram('finops_dataframe_build_seconds', 'Time spent building DataFrames from fetched rows')
+CONNECTION_WAIT_SECONDS = registry.histogram('finops_connection_wait_seconds', 'Time spent waiting for a Snowflake connection')
+TABLE_BUILD_SECONDS = registry.histogram('finops_table_build_seconds', 'Duration of FINOPS_* table builds')
+
+# Cache metrics
+CACHE_REQUESTS = registry.counter('finops_cache_requests_total', 'Table cache lookups by result')
+
+# HTTP metrics
+HTTP_SECONDS = registry.histogram('finops_http_request_duration_seconds', 'Flask request latency')
+HTTP_RESPONSE_BYTES = registry.counter('finops_http_response_bytes_total', 'Response body bytes sent')
+SERIALIZATION_SECONDS = registry.histogram('finops_serialization_seconds', 'JSON serialization time per response')
+
+
+@contextmanager
+def statement_scope(label: str):
+    """Label every statement issued inside the block, e.g. with the index2 table being refreshed"""
+    token = _statement_scope.set(label)
+    try:
+        yield
+    finally:
+        _statement_scope.reset(token)
+
+
+def statement_label(query: str) -> str:
+    """Low-cardinality label for a SQL statement: the active scope, the FINOPS_/REFRESH_ object it touches, else its verb"""
+    scoped = _statement_scope.get()
+    if scoped:
+        return scoped
+    match = _STATEMENT_RE.search(query)
+    if match:
+        return match.group(1).upper()
+    words = query.split(None, 1)
+    return words[0].upper() if words else 'EMPTY'
+
+
+def record_dataframe_build(component: str, seconds: float):
+    DATAFRAME_BUILD_SECONDS.observe(seconds, component=component)
+
+
+def record_cache_lookup(cache: str, table: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, table=table, result='hit' if hit else 'miss')
+
+
+def record_serialization(seconds: float):
+    SERIALIZATION_SECONDS.observe(seconds, endpoint=_endpoint_label())
+
+
+def _endpoint_label() -> str:
+    if has_request_context() and request.url_rule is not None:
+        return request.url_rule.rule
+    return 'unmatched'
+
+
+def _wrap_query(component: str, execute_query):
+    def wrapper(query: str, *args, **kwargs):
+        label = statement_label(query)
+        started = time.perf_counter()
+        try:
+            df = execute_query(query, *args, **kwargs)
+        except Exception:
+            QUERY_ERRORS.inc(component=component, statement=label)
+            raise
+        finally:
+            QUERY_SECONDS.observe(time.perf_counter() - started, component=component, statement=label)
+        QUERY_ROWS.inc(len(df), component=component, statement=label)
+        QUERY_BYTES.inc(int(df.memory_usage(index=False, deep=True).sum()), component=component, statement=label)
+        return df
+
+    wrapper.__wrapped__ = execute_query
+    return wrapper
+
+
+def _wrap_procedure(component: str, execute_procedure):
+    def wrapper(procedure_name: str, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return execute_procedure(procedure_name, *args, **kwargs)
+        except Exception:
+            QUERY_ERRORS.inc(component=component, statement=procedure_name)
+            raise
+        finally:
+            QUERY_SECONDS.observe(time.perf_counter() - started, component=component, statement=procedure_name)
+
+    wrapper.__wrapped__ = execute_procedure
+    return wrapper
+
+
+def _wrap_connect(component: str, connect):
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return connect(*args, **kwargs)
+        finally:
+            CONNECTION_WAIT_SECONDS.observe(time.perf_counter() - started, component=component)
+
+    wrapper.__wrapped__ = connect
+    return wrapper
+
+
+def instrument_connector(target: Any, component: str) -> Any:
+    """Wrap execute_query/execute_procedure/connect on a connector with latency and volume metrics"""
+    target.execute_query = _wrap_query(component, target.execute_query)
+    if hasattr(target, 'execute_procedure'):
+        target.execute_procedure = _wrap_procedure(component, target.execute_procedure)
+    if hasattr(target, 'connect'):
+        target.connect = _wrap_connect(component, target.connect)
+    return target
+
+
+class InstrumentedJSONProvider(DefaultJSONProvider):
+    """JSON provider that records serialization time for every jsonify() response"""
+
+    def response(self, *args, **kwargs):
+        started = time.perf_counter()
+        response = super().response(*args, **kwargs)
+        record_serialization(time.perf_counter() - started)
+        return response
+
+
+def metrics_response() -> Response:
+    return Response(registry.render(), mimetype=None, content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+def instrument_app(app, component: str):
+    """Time every Flask route, count response bytes and expose /metrics"""
+    app.json = InstrumentedJSONProvider(app)
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        endpoint = _endpoint_label()
+        HTTP_SECONDS.observe(time.perf_counter() - started, component=component, endpoint=endpoint,
+                             method=request.method, status=response.status_code)
+        if not response.direct_passthrough and response.content_length is not None:
+            HTTP_RESPONSE_BYTES.inc(response.content_length, component=component, endpoint=endpoint)
+        return response
+
+    app.add_url_rule('/metrics', 'metrics', metrics_response)
+    return app
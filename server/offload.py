@@ -0,0 +1,275 @@
+import io
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pandas as pd
+from flask import jsonify
+
+from metrics import registry
+
+try:
+    import pyarrow as pa
+except ImportError:  # frames are pickled to the workers instead
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+OFFLOAD_WORKERS = int(os.getenv('FINOPS_OFFLOAD_WORKERS', min(4, os.cpu_count() or 1)))
+# Below this many rows the IPC round trip costs more than the work; run on the calling thread
+OFFLOAD_MIN_ROWS = int(os.getenv('FINOPS_OFFLOAD_MIN_ROWS', 50000))
+# Byte results larger than this come back through shared memory instead of the result pipe
+SHARED_RESULT_BYTES = 1024 * 1024
+
+OFFLOAD_POOL_SIZE = registry.gauge('finops_offload_pool_size', 'Worker processes in the offload pool')
+OFFLOAD_QUEUE_DEPTH = registry.gauge('finops_offload_queue_depth', 'Offloaded tasks submitted and not yet finished')
+OFFLOAD_SECONDS = registry.histogram('finops_offload_seconds', 'Wall time of offloaded tasks including handoff')
+
+_SHARED = '__shared_memory__'
+
+
+# Handoff
+
+def _frame_to_shared(df: pd.DataFrame) -> Tuple[str, str, int]:
+    """Write a frame into a new shared memory block as an Arrow IPC stream"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sizer = pa.MockOutputStream()
+    with pa.ipc.new_stream(sizer, table.schema) as writer:
+        writer.write_table(table)
+    size = sizer.size()
+    block = SharedMemory(create=True, size=max(size, 1))
+    try:
+        sink = pa.FixedSizeBufferWriter(pa.py_buffer(block.buf))
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        sink.close()
+        # Arrow holds an export of the mapping until its buffer objects are gone
+        del sink, writer
+    except Exception:
+        block.close()
+        block.unlink()
+        raise
+    name = block.name
+    block.close()
+    return _SHARED, name, size
+
+
+def _frame_from_shared(handle: Tuple[str, str, int]) -> Tuple[pd.DataFrame, SharedMemory]:
+    """Map a block written by _frame_to_shared; numeric columns can stay zero-copy views into it"""
+    _, name, size = handle
+    block = SharedMemory(name=name)
+    buffer = pa.py_buffer(block.buf)[:size]
+    df = pa.ipc.open_stream(buffer).read_all().to_pandas()
+    return df, block
+
+
+def _release(block: SharedMemory):
+    try:
+        block.close()
+    except BufferError:
+        # Something still views the mapping; it is unmapped when the last view goes away
+        logger.debug(f"Shared memory block {block.name} still referenced")
+
+
+def _bytes_to_shared(data: bytes) -> Tuple[str, str, int]:
+    block = SharedMemory(create=True, size=max(len(data), 1))
+    block.buf[:len(data)] = data
+    name = block.name
+    block.close()
+    return _SHARED, name, len(data)
+
+
+def _bytes_from_shared(handle: Tuple[str, str, int]) -> bytes:
+    _, name, size = handle
+    block = SharedMemory(name=name)
+    try:
+        return bytes(block.buf[:size])
+    finally:
+        block.close()
+        block.unlink()
+
+
+def _is_shared(value: Any) -> bool:
+    return isinstance(value, tuple) and len(value) == 3 and value[0] == _SHARED
+
+
+def _run_in_worker(func: Callable, frames: Dict[str, Any], kwargs: Dict[str, Any]) -> Any:
+    """Worker entry point: map the frames, run func, hand large byte results back through shared memory"""
+    loaded, blocks = {}, []
+    for key, value in frames.items():
+        if _is_shared(value):
+            loaded[key], block = _frame_from_shared(value)
+            blocks.append(block)
+        else:
+            loaded[key] = value
+    try:
+        result = func(loaded, **kwargs)
+    finally:
+        # Frames may view the mappings zero-copy, so they go before the blocks are closed
+        del loaded
+        for block in blocks:
+            _release(block)
+    if isinstance(result, bytes) and len(result) > SHARED_RESULT_BYTES:
+        return _bytes_to_shared(result)
+    return result
+
+
+class OffloadPool:
+    """Managed process pool for CPU-heavy DataFrame work that would otherwise hold the GIL.
+
+    Frames travel as Arrow IPC streams in POSIX shared memory, so a table is written once and
+    mapped by the worker instead of being pickled through the pool's pipe.
+    """
+
+    def __init__(self, max_workers: int = OFFLOAD_WORKERS, min_rows: int = OFFLOAD_MIN_ROWS):
+        self.max_workers = max_workers
+        self.min_rows = min_rows
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending = 0
+        self._completed = 0
+        self._inline = 0
+        self._failed = 0
+        self._restarts = 0
+        self._lock = threading.Lock()
+        OFFLOAD_POOL_SIZE.set(0)
+        OFFLOAD_QUEUE_DEPTH.set(0)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a threaded web worker can copy held locks into the child
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+                OFFLOAD_POOL_SIZE.set(self.max_workers)
+                logger.info(f"Started offload pool with {self.max_workers} workers")
+            return self._executor
+
+    def _reset(self, executor: ProcessPoolExecutor):
+        """Drop a pool whose worker died; the next task starts a new one"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self._restarts += 1
+                OFFLOAD_POOL_SIZE.set(0)
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _track(self, delta: int, outcome: Optional[str] = None):
+        with self._lock:
+            self._pending += delta
+            if outcome == 'completed':
+                self._completed += 1
+            elif outcome == 'failed':
+                self._failed += 1
+            OFFLOAD_QUEUE_DEPTH.set(self._pending)
+
+    @staticmethod
+    def _handoff(df: pd.DataFrame) -> Any:
+        if pa is None:
+            return df
+        try:
+            return _frame_to_shared(df)
+        except (pa.ArrowException, TypeError, ValueError) as e:
+            # Columns Arrow cannot type (e.g. mixed objects) are pickled instead
+            logger.debug(f"Pickling frame for offload: {e}")
+            return df
+
+    def run(self, func: Callable[..., Any], frames: Dict[str, pd.DataFrame], **kwargs) -> Any:
+        """func(frames, **kwargs) in a worker process; func must be a module-level function"""
+        rows = sum(len(df) for df in frames.values())
+        if self.max_workers <= 0 or rows < self.min_rows:
+            with self._lock:
+                self._inline += 1
+            return func(frames, **kwargs)
+
+        started = time.perf_counter()
+        handles, shared = {}, []
+        self._track(1)
+        try:
+            for key, df in frames.items():
+                handles[key] = self._handoff(df)
+                if _is_shared(handles[key]):
+                    shared.append(handles[key][1])
+            # A worker that died (OOM kill, segfault) breaks the whole executor; the task is retried
+            # once on a new pool since it may have been another task's crash
+            for attempt in (1, 2):
+                executor = self._pool()
+                try:
+                    result = executor.submit(_run_in_worker, func, handles, kwargs).result()
+                    break
+                except BrokenProcessPool:
+                    logger.error(f"Offload pool broke running {getattr(func, '__name__', 'task')}, restarting it")
+                    self._reset(executor)
+                    if attempt == 2:
+                        raise
+            if _is_shared(result):
+                result = _bytes_from_shared(result)
+            self._track(-1, 'completed')
+            return result
+        except Exception:
+            self._track(-1, 'failed')
+            raise
+        finally:
+            for name in shared:
+                block = SharedMemory(name=name)
+                block.close()
+                block.unlink()
+            OFFLOAD_SECONDS.observe(time.perf_counter() - started, task=getattr(func, '__name__', 'task'))
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'pool_size': self.max_workers,
+                'started': self._executor is not None,
+                'queue_depth': self._pending,
+                'completed': self._completed,
+                'failed': self._failed,
+                'inline': self._inline,
+                'restarts': self._restarts,
+                'min_rows': self.min_rows,
+                'handoff': 'arrow-ipc-shared-memory' if pa is not None else 'pickle'
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+                OFFLOAD_POOL_SIZE.set(0)
+
+
+def register_offload_route(app, pool: OffloadPool):
+    @app.route('/api/offload/status', methods=['GET'])
+    def offload_status():
+        return jsonify(pool.status())
+
+
+# Transforms run in the pool; module-level so spawned workers can import them
+
+def render_csv(frames: Dict[str, pd.DataFrame]) -> bytes:
+    output = io.StringIO()
+    frames['df'].to_csv(output, index=False)
+    return output.getvalue().encode('utf-8')
+
+
+def summary_metrics(frames: Dict[str, pd.DataFrame]) -> Dict[str, Any]:
+    """The /api/summary figures from the warehouse, user, database and serverless frames"""
+    warehouse_df, user_df = frames['warehouses'], frames['users']
+    db_df, serverless_df = frames['databases'], frames['serverless']
+    user_count = len(user_df['user_name'].unique())
+    return {
+        'total_warehouses': len(warehouse_df),
+        'total_credits_used': float(warehouse_df['total_credits'].sum()),
+        'active_users': user_count,
+        'databases_count': len(db_df),
+        'serverless_services_count': len(serverless_df),
+        'average_credits_per_user': float(user_df['total_credits'].sum() / user_count) if user_count > 0 else 0,
+        'top_warehouse': warehouse_df.loc[warehouse_df['total_credits'].idxmax()]['warehouse_name'] if not warehouse_df.empty else None,
+        'highest_cost_user': user_df.loc[user_df['total_credits'].idxmax()]['user_name'] if not user_df.empty else None,
+        'largest_database': db_df.loc[db_df['total_storage_gb'].idxmax()]['database_name'] if not db_df.empty else None
+    }
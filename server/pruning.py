@@ -0,0 +1,95 @@
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, List
+
+import pandas as pd
+
+from anchors import anchor_params
+from self_cost import TAG_PREFIX
+
+logger = logging.getLogger(__name__)
+
+# Physical layout of the large per-query tables: drill-downs filter on time,
+# warehouse and user, so those are the clustering keys.
+CLUSTER_KEYS = {
+    'FINOPS_QUERY_HISTORY': 'start_time, warehouse_name, user_name',
+    'FINOPS_QUERY_DETAILS': 'start_time, warehouse_name, user_name',
+}
+
+# Search optimization makes query_id point lookups prune to a partition or two,
+# but it is billed separately, so it is opt-in.
+SEARCH_OPTIMIZATION = os.getenv('FINOPS_SEARCH_OPTIMIZATION', 'false').lower() == 'true'
+SEARCH_OPTIMIZED_TABLES = ('FINOPS_QUERY_HISTORY', 'FINOPS_QUERY_DETAILS')
+
+
+def layout_statements(table_name: str, target: str = None) -> List[str]:
+    """Statements to run after a builder recreates table_name (or its staging copy, target)"""
+    if SEARCH_OPTIMIZATION and table_name in SEARCH_OPTIMIZED_TABLES:
+        return [f"ALTER TABLE {target or table_name} ADD SEARCH OPTIMIZATION ON EQUALITY(query_id)"]
+    return []
+
+
+def _reads_query(tables: List[str], params: Dict[str, Any]) -> str:
+    names = []
+    for table in tables:
+        params[f"t{len(names)}"] = table
+        names.append(f"%(t{len(names)})s")
+    return f"""
+    SELECT
+        TRY_PARSE_JSON(query_tag):table::STRING as table_name,
+        COUNT(*) as read_count,
+        SUM(partitions_scanned) as partitions_scanned,
+        SUM(partitions_total) as partitions_total,
+        AVG(CASE WHEN partitions_total > 0 THEN partitions_scanned / partitions_total END) as avg_scan_ratio,
+        SUM(bytes_scanned) / (1024*1024*1024) as gb_scanned,
+        AVG(total_elapsed_time) as avg_elapsed_ms
+    FROM SNOWFLAKE.ACCOUNT_USAGE.QUERY_HISTORY
+    WHERE query_tag LIKE '{TAG_PREFIX}%%'
+    AND query_type = 'SELECT'
+    AND start_time >= DATEADD('day', -%(days)s, %(anchor)s::TIMESTAMP_TZ)
+    AND TRY_PARSE_JSON(query_tag):table::STRING IN ({', '.join(names)})
+    GROUP BY 1
+    """
+
+
+def pruning_report(execute_query: Callable[..., pd.DataFrame], days: int = 7) -> Dict[str, Dict[str, Any]]:
+    """Clustering health plus partition pruning achieved by this tool's own reads, per clustered table"""
+    tables = list(CLUSTER_KEYS)
+    params = {'days': int(days), **anchor_params()}
+    reads = execute_query(_reads_query(tables, params), params)
+    reads.columns = [c.lower() for c in reads.columns]
+
+    report = {}
+    for table in tables:
+        entry: Dict[str, Any] = {'cluster_by': CLUSTER_KEYS[table],
+                                 'search_optimization': SEARCH_OPTIMIZATION and table in SEARCH_OPTIMIZED_TABLES}
+        try:
+            info = execute_query(f"SELECT SYSTEM$CLUSTERING_INFORMATION('{table}') as info")
+            clustering = json.loads(info.iloc[0, 0])
+            entry['clustering'] = {
+                'total_partition_count': clustering.get('total_partition_count'),
+                'average_overlaps': clustering.get('average_overlaps'),
+                'average_depth': clustering.get('average_depth'),
+            }
+        except Exception as e:
+            logger.error(f"Clustering information unavailable for {table}: {e}")
+            entry['clustering'] = None
+
+        matched = reads[reads['table_name'] == table] if not reads.empty else reads
+        if not matched.empty:
+            row = matched.iloc[0]
+            scanned, total = float(row['partitions_scanned'] or 0), float(row['partitions_total'] or 0)
+            entry['reads'] = {
+                'read_count': int(row['read_count']),
+                'partitions_scanned': scanned,
+                'partitions_total': total,
+                'pruning_efficiency': round(1 - scanned / total, 4) if total else None,
+                'avg_scan_ratio': float(row['avg_scan_ratio']) if row['avg_scan_ratio'] is not None else None,
+                'gb_scanned': float(row['gb_scanned'] or 0),
+                'avg_elapsed_ms': float(row['avg_elapsed_ms'] or 0),
+            }
+        else:
+            entry['reads'] = None
+        report[table] = entry
+    return report
@@ -0,0 +1,235 @@
+import re
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from flask import request
+
+from table_schemas import BOOLEAN, NUMBER, STRING, TIMESTAMP
+
+# ?filter= is a ';' separated list of conditions on typed columns:
+#   total_credits>10            comparison: = != > >= < <=
+#   warehouse_name=in:A,B       membership (!=in: for NOT IN)
+#   start_time=between:X,Y      inclusive range
+# ?sort= is a comma separated list of columns, '-' prefix for descending.
+_CONDITION = re.compile(r'^\s*(\w+)\s*(>=|<=|!=|=|>|<)(.*)$')
+_SQL_OPS = {'=': '=', '!=': '<>', '>': '>', '>=': '>=', '<': '<', '<=': '<='}
+_FILTERABLE = (NUMBER, STRING, TIMESTAMP, BOOLEAN)
+
+
+class FilterError(ValueError):
+    """A ?filter= or ?sort= expression that does not fit the table"""
+
+
+@dataclass
+class Condition:
+    column: str
+    op: str  # one of _SQL_OPS, 'in', 'not_in', 'between'
+    values: List[Any]
+
+
+def _coerce(column: str, column_type: str, raw: str) -> Any:
+    raw = raw.strip()
+    try:
+        if column_type == NUMBER:
+            number = float(raw)
+            return int(number) if number.is_integer() and '.' not in raw else number
+        if column_type == TIMESTAMP:
+            return pd.Timestamp(raw)
+        if column_type == BOOLEAN:
+            if raw.lower() not in ('true', 'false'):
+                raise ValueError(raw)
+            return raw.lower() == 'true'
+    except ValueError:
+        raise FilterError(f"Invalid {column_type} value '{raw}' for {column}")
+    return raw
+
+
+def parse_filter(expression: Optional[str], columns: Dict[str, str]) -> List[Condition]:
+    """Parse ?filter= against a column -> type mapping"""
+    if not expression:
+        return []
+    lookup = {name.lower(): name for name in columns}
+    conditions = []
+    for part in expression.split(';'):
+        if not part.strip():
+            continue
+        match = _CONDITION.match(part)
+        if match is None:
+            raise FilterError(f"Cannot parse filter '{part}'")
+        name, op, raw = match.groups()
+        if name.lower() not in lookup:
+            raise FilterError(f"Unknown filter column '{name}'")
+        column = lookup[name.lower()]
+        column_type = columns[column]
+        if column_type not in _FILTERABLE:
+            raise FilterError(f"Column {column} cannot be filtered")
+
+        if raw.startswith('in:') and op in ('=', '!='):
+            values = [_coerce(column, column_type, v) for v in raw[3:].split(',') if v.strip()]
+            if not values:
+                raise FilterError(f"Empty IN list for {column}")
+            conditions.append(Condition(column, 'in' if op == '=' else 'not_in', values))
+        elif raw.startswith('between:') and op == '=':
+            bounds = raw[len('between:'):].split(',')
+            if len(bounds) != 2:
+                raise FilterError(f"between needs exactly two values for {column}")
+            conditions.append(Condition(column, 'between', [_coerce(column, column_type, v) for v in bounds]))
+        else:
+            if column_type == BOOLEAN and op not in ('=', '!='):
+                raise FilterError(f"Column {column} only supports = and !=")
+            conditions.append(Condition(column, op, [_coerce(column, column_type, raw)]))
+    return conditions
+
+
+def parse_sort(expression: Optional[str], columns: Dict[str, str]) -> List[Tuple[str, bool]]:
+    """Parse ?sort= into (column, ascending) pairs"""
+    if not expression:
+        return []
+    lookup = {name.lower(): name for name in columns}
+    order = []
+    for part in expression.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        ascending = not part.startswith('-')
+        name = part.lstrip('+-').lower()
+        if name not in lookup:
+            raise FilterError(f"Unknown sort column '{name}'")
+        order.append((lookup[name], ascending))
+    return order
+
+
+def equality_conditions(filters: Optional[Dict[str, Any]], columns: Dict[str, str] = None) -> List[Condition]:
+    """key=value filters as conditions; with columns, keys are checked and string values typed"""
+    conditions = []
+    for column, value in (filters or {}).items():
+        if columns is not None:
+            lookup = {name.lower(): name for name in columns}
+            if column.lower() not in lookup:
+                raise FilterError(f"Unknown filter column '{column}'")
+            column = lookup[column.lower()]
+            if isinstance(value, str):
+                value = _coerce(column, columns[column], value)
+        conditions.append(Condition(column, '=', [value]))
+    return conditions
+
+
+def request_conditions(columns: Dict[str, str]) -> Tuple[List[Condition], List[Tuple[str, bool]]]:
+    """?filter= and ?sort= of the current request"""
+    return (parse_filter(request.args.get('filter'), columns),
+            parse_sort(request.args.get('sort'), columns))
+
+
+# SQL
+
+def _bind_value(value: Any) -> Any:
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value
+
+
+def where_sql(conditions: List[Condition], params: Dict[str, Any]) -> str:
+    """AND of the conditions with values as pyformat bind parameters added to params"""
+    clauses = []
+    for condition in conditions:
+        names = []
+        for value in condition.values:
+            name = f"f{len(params)}"
+            params[name] = _bind_value(value)
+            names.append(f"%({name})s")
+        if condition.op in ('in', 'not_in'):
+            keyword = 'IN' if condition.op == 'in' else 'NOT IN'
+            clauses.append(f"{condition.column} {keyword} ({', '.join(names)})")
+        elif condition.op == 'between':
+            clauses.append(f"{condition.column} BETWEEN {names[0]} AND {names[1]}")
+        else:
+            clauses.append(f"{condition.column} {_SQL_OPS[condition.op]} {names[0]}")
+    return ' AND '.join(clauses)
+
+
+def order_by_sql(order: List[Tuple[str, bool]]) -> str:
+    return ', '.join(f"{column} {'ASC' if ascending else 'DESC'}" for column, ascending in order)
+
+
+# Local DataFrames
+
+def frame_schema(df: pd.DataFrame) -> Dict[str, str]:
+    """Column -> filter type for a cached frame, looking through object columns of Decimals/datetimes"""
+    schema = {}
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_bool_dtype(series.dtype):
+            schema[column] = BOOLEAN
+        elif pd.api.types.is_numeric_dtype(series.dtype):
+            schema[column] = NUMBER
+        elif pd.api.types.is_datetime64_any_dtype(series.dtype):
+            schema[column] = TIMESTAMP
+        else:
+            non_null = series.dropna()
+            sample = non_null.iloc[0] if not non_null.empty else None
+            if isinstance(sample, bool):
+                schema[column] = BOOLEAN
+            elif isinstance(sample, (int, float, Decimal)):
+                schema[column] = NUMBER
+            elif isinstance(sample, (pd.Timestamp, np.datetime64)) or hasattr(sample, 'isoformat'):
+                schema[column] = TIMESTAMP
+            else:
+                schema[column] = STRING
+    return schema
+
+
+def _typed_series(series: pd.Series, column_type: str) -> pd.Series:
+    if column_type == NUMBER:
+        return pd.to_numeric(series, errors='coerce')
+    if column_type == TIMESTAMP:
+        return pd.to_datetime(series, errors='coerce', utc=True)
+    return series
+
+
+def _typed_value(value: Any, column_type: str) -> Any:
+    if column_type == TIMESTAMP:
+        return value.tz_localize('UTC') if value.tzinfo is None else value.tz_convert('UTC')
+    return value
+
+
+def frame_mask(df: pd.DataFrame, conditions: List[Condition], schema: Dict[str, str]) -> np.ndarray:
+    """Boolean row mask equivalent to where_sql; NULLs never match, as in SQL"""
+    mask = np.ones(len(df), dtype=bool)
+    for condition in conditions:
+        column_type = schema[condition.column]
+        series = _typed_series(df[condition.column], column_type)
+        values = [_typed_value(v, column_type) for v in condition.values]
+        if condition.op == 'in':
+            matched = series.isin(values)
+        elif condition.op == 'not_in':
+            matched = ~series.isin(values)
+        elif condition.op == 'between':
+            matched = (series >= values[0]) & (series <= values[1])
+        elif condition.op == '=':
+            matched = series == values[0]
+        elif condition.op == '!=':
+            matched = series != values[0]
+        elif condition.op == '>':
+            matched = series > values[0]
+        elif condition.op == '>=':
+            matched = series >= values[0]
+        elif condition.op == '<':
+            matched = series < values[0]
+        else:
+            matched = series <= values[0]
+        mask &= (matched & series.notna()).to_numpy(dtype=bool)
+    return mask
+
+
+def apply_to_frame(df: pd.DataFrame, conditions: List[Condition], order: List[Tuple[str, bool]],
+                   schema: Dict[str, str]) -> pd.DataFrame:
+    """Filter and sort a cached frame without touching Snowflake"""
+    if conditions:
+        df = df[frame_mask(df, conditions, schema)]
+    if order:
+        df = df.sort_values([column for column, _ in order], ascending=[asc for _, asc in order],
+                            kind='mergesort', na_position='last')
+    return df
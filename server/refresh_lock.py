@@ -0,0 +1,385 @@
+import json
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Optional
+
+import pandas as pd
+from flask import jsonify
+
+try:
+    import fcntl
+except ImportError:  # leases still work between threads of one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+REFRESH_LOCK_BACKEND = os.getenv('FINOPS_REFRESH_LOCK_BACKEND', 'file')
+REFRESH_LOCK_DIR = os.getenv('FINOPS_REFRESH_LOCK_DIR', os.path.join(tempfile.gettempdir(), 'finops-locks'))
+# A lease lapses this long after its holder stops renewing it, e.g. when the worker was killed
+LEASE_SECONDS = int(os.getenv('FINOPS_REFRESH_LEASE_SECONDS', 300))
+# How long a caller waits for another worker's refresh before giving up
+WAIT_SECONDS = int(os.getenv('FINOPS_REFRESH_WAIT_SECONDS', 900))
+POLL_SECONDS = 1.0
+
+
+@dataclass
+class Lease:
+    resource: str
+    holder: str
+    # Increases with every grant, so a holder whose lease lapsed can tell it was superseded
+    token: int
+    acquired_at: float
+    expires_at: float
+
+
+class RefreshInProgress(Exception):
+    """Another holder kept the lease for longer than the caller was willing to wait"""
+
+    def __init__(self, status: Dict[str, Any]):
+        super().__init__(f"{status['resource']} is being refreshed by {status.get('holder')}")
+        self.status = status
+
+
+class LeaseLost(Exception):
+    """The lease lapsed and was granted to another holder while work was still running"""
+
+
+class FileLeaseBackend:
+    """Lease records as JSON files, updated under fcntl locks; coordinates the workers of one host"""
+
+    name = 'file'
+
+    def __init__(self, directory: str = REFRESH_LOCK_DIR):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _record(self, resource: str):
+        """The resource's record, locked for a read-modify-write"""
+        path = os.path.join(self.directory, f'{resource}.lease')
+        with self._lock, open(path, 'a+') as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                handle.seek(0)
+                content = handle.read()
+                record = json.loads(content) if content else {'resource': resource, 'token': 0}
+                original = dict(record)
+                yield record
+                if record != original:
+                    handle.seek(0)
+                    handle.truncate()
+                    json.dump(record, handle)
+                    handle.flush()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def try_acquire(self, resource: str, holder: str, ttl: float) -> Optional[Lease]:
+        now = time.time()
+        with self._record(resource) as record:
+            if record.get('holder') and record.get('holder') != holder and record.get('expires_at', 0) > now:
+                return None
+            record.update(holder=holder, token=record['token'] + 1, acquired_at=now, expires_at=now + ttl)
+            return Lease(resource, holder, record['token'], now, now + ttl)
+
+    def renew(self, lease: Lease, ttl: float) -> bool:
+        with self._record(lease.resource) as record:
+            if record.get('token') != lease.token or record.get('holder') != lease.holder:
+                return False
+            record['expires_at'] = lease.expires_at = time.time() + ttl
+            return True
+
+    def release(self, lease: Lease, completed: bool):
+        with self._record(lease.resource) as record:
+            if record.get('token') != lease.token:
+                return
+            now = time.time()
+            record.update(holder=None, expires_at=now)
+            if completed:
+                record['completed_at'] = now
+
+    def current(self, resource: str) -> Dict[str, Any]:
+        with self._record(resource) as record:
+            return dict(record)
+
+
+class SnowflakeLeaseBackend:
+    """Lease rows in a FINOPS_REFRESH_LOCKS table; coordinates workers on any number of hosts.
+
+    Snowflake serializes DML on a table, so the conditional MERGE grants a lease to one caller.
+    """
+
+    name = 'snowflake'
+
+    DDL = """
+    CREATE TABLE IF NOT EXISTS FINOPS_REFRESH_LOCKS (
+        resource STRING,
+        holder STRING,
+        token NUMBER,
+        acquired_at FLOAT,
+        expires_at FLOAT,
+        completed_at FLOAT
+    )
+    """
+
+    def __init__(self, execute_query: Callable[..., pd.DataFrame]):
+        self.execute_query = execute_query
+        self._ready = False
+
+    def _ensure_table(self):
+        if not self._ready:
+            self.execute_query(self.DDL)
+            self._ready = True
+
+    def try_acquire(self, resource: str, holder: str, ttl: float) -> Optional[Lease]:
+        self._ensure_table()
+        now = time.time()
+        params = {'resource': resource, 'holder': holder, 'now': now, 'expires': now + ttl}
+        self.execute_query("""
+        MERGE INTO FINOPS_REFRESH_LOCKS t
+        USING (SELECT %(resource)s as resource) s ON t.resource = s.resource
+        WHEN MATCHED AND (t.holder IS NULL OR t.holder = %(holder)s OR t.expires_at <= %(now)s) THEN UPDATE SET
+            holder = %(holder)s, token = t.token + 1, acquired_at = %(now)s, expires_at = %(expires)s
+        WHEN NOT MATCHED THEN INSERT (resource, holder, token, acquired_at, expires_at)
+            VALUES (%(resource)s, %(holder)s, 1, %(now)s, %(expires)s)
+        """, params)
+        record = self.current(resource)
+        if record.get('holder') != holder or record.get('acquired_at') != now:
+            return None
+        return Lease(resource, holder, record['token'], now, now + ttl)
+
+    def _update(self, lease: Lease, assignments: str, params: Dict[str, Any]) -> bool:
+        df = self.execute_query(f"""
+        UPDATE FINOPS_REFRESH_LOCKS SET {assignments}
+        WHERE resource = %(resource)s AND token = %(token)s AND holder = %(holder)s
+        """, {'resource': lease.resource, 'token': lease.token, 'holder': lease.holder, **params})
+        return not df.empty and int(df.iloc[0, 0]) > 0
+
+    def renew(self, lease: Lease, ttl: float) -> bool:
+        expires = time.time() + ttl
+        if not self._update(lease, 'expires_at = %(expires)s', {'expires': expires}):
+            return False
+        lease.expires_at = expires
+        return True
+
+    def release(self, lease: Lease, completed: bool):
+        now = time.time()
+        assignments = 'holder = NULL, expires_at = %(now)s' + (', completed_at = %(now)s' if completed else '')
+        self._update(lease, assignments, {'now': now})
+
+    def current(self, resource: str) -> Dict[str, Any]:
+        self._ensure_table()
+        df = self.execute_query("""
+        SELECT resource, holder, token, acquired_at, expires_at, completed_at
+        FROM FINOPS_REFRESH_LOCKS WHERE resource = %(resource)s
+        """, {'resource': resource})
+        if df.empty:
+            return {'resource': resource, 'token': 0}
+        df.columns = [c.lower() for c in df.columns]
+        row = df.iloc[0]
+        return {key: (None if pd.isna(value) else value.item() if hasattr(value, 'item') else value)
+                for key, value in row.items()}
+
+
+class RefreshCoordinator:
+    """One refresher per resource across workers, through renewable leases.
+
+    Callers that find a resource leased wait for the holder (they are counted as waiters) and,
+    when the holder completed after they asked, reuse its result instead of refreshing again.
+    """
+
+    def __init__(self, backend, holder: str = None, lease_seconds: float = LEASE_SECONDS,
+                 wait_seconds: float = WAIT_SECONDS):
+        self.backend = backend
+        self._holder = holder
+        self.lease_seconds = lease_seconds
+        self.wait_seconds = wait_seconds
+        self._pid = os.getpid()
+        self._held: Dict[str, Lease] = {}
+        # Threads of this worker share the holder id, so they queue here before asking the backend
+        self._local: Dict[str, threading.Lock] = {}
+        self._waiters: Dict[str, int] = {}
+        self._history: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._heartbeat: Optional[threading.Thread] = None
+
+    @property
+    def holder(self) -> str:
+        # Looked up on use: with preloading the coordinator is created before the workers fork
+        return self._holder or f"{socket.gethostname()}:{os.getpid()}"
+
+    def _after_fork(self):
+        """A forked worker inherits the parent's leases, local locks and heartbeat handle but not
+        the heartbeat thread; start from a clean state in the new process"""
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._held, self._local, self._waiters, self._history = {}, {}, {}, {}
+        self._lock = threading.Lock()
+        self._heartbeat = None
+
+    def _renew_held(self):
+        while True:
+            time.sleep(self.lease_seconds / 3)
+            with self._lock:
+                held = list(self._held.values())
+            for lease in held:
+                try:
+                    if not self.backend.renew(lease, self.lease_seconds):
+                        logger.error(f"Lease on {lease.resource} (token {lease.token}) was lost")
+                except Exception as e:
+                    logger.warning(f"Could not renew lease on {lease.resource}: {e}")
+
+    def _start_heartbeat(self):
+        with self._lock:
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._renew_held, name='refresh-lease-heartbeat',
+                                                   daemon=True)
+                self._heartbeat.start()
+
+    def _waiting(self, resource: str, delta: int):
+        with self._lock:
+            self._waiters[resource] = self._waiters.get(resource, 0) + delta
+
+    def acquire(self, resource: str, wait: bool = True) -> Lease:
+        """Lease a resource, waiting up to wait_seconds for the current holder"""
+        self._after_fork()
+        deadline = time.monotonic() + (self.wait_seconds if wait else 0)
+        with self._lock:
+            local = self._local.setdefault(resource, threading.Lock())
+        self._waiting(resource, 1)
+        try:
+            if not local.acquire(timeout=max(deadline - time.monotonic(), 0)):
+                raise RefreshInProgress(self.status(resource))
+            try:
+                while True:
+                    lease = self.backend.try_acquire(resource, self.holder, self.lease_seconds)
+                    if lease is not None:
+                        break
+                    if time.monotonic() >= deadline:
+                        raise RefreshInProgress(self.status(resource))
+                    time.sleep(POLL_SECONDS)
+            except BaseException:
+                local.release()
+                raise
+        finally:
+            self._waiting(resource, -1)
+        with self._lock:
+            self._held[resource] = lease
+        self._start_heartbeat()
+        return lease
+
+    def release(self, lease: Lease, completed: bool):
+        with self._lock:
+            self._held.pop(lease.resource, None)
+        try:
+            self.backend.release(lease, completed)
+        except Exception as e:
+            # The lease lapses on its own after lease_seconds
+            logger.warning(f"Could not release lease on {lease.resource}: {e}")
+        finally:
+            self._local[lease.resource].release()
+
+    def ensure_held(self, lease: Lease):
+        """Fence: raise LeaseLost if a newer token was granted since this lease"""
+        if self.backend.current(lease.resource).get('token') != lease.token:
+            raise LeaseLost(f"Lease on {lease.resource} (token {lease.token}) was superseded")
+
+    @contextmanager
+    def lease(self, resource: str, wait: bool = True):
+        lease = self.acquire(resource, wait)
+        completed = False
+        try:
+            yield lease
+            completed = True
+        finally:
+            self.release(lease, completed)
+
+    def run(self, resource: str, func: Callable[[Lease], Any], wait: bool = True,
+            coalesce: bool = True) -> Dict[str, Any]:
+        """func(lease) under the resource's lease.
+
+        With coalesce, a refresh another worker completed while this caller was waiting is
+        reused and func is not called.
+        """
+        requested_at = time.time()
+        started = time.perf_counter()
+        with self.lease(resource, wait) as lease:
+            completed_at = self.backend.current(resource).get('completed_at')
+            if coalesce and completed_at is not None and completed_at >= requested_at:
+                outcome = {'status': 'coalesced', 'result': None}
+            else:
+                try:
+                    outcome = {'status': 'completed', 'result': func(lease)}
+                except Exception as e:
+                    self._record(resource, lease, 'failed', started, error=str(e))
+                    raise
+        self._record(resource, lease, outcome['status'], started)
+        return {**outcome, 'token': lease.token}
+
+    def _record(self, resource: str, lease: Lease, status: str, started: float, error: str = None):
+        with self._lock:
+            self._history[resource] = {
+                'status': status,
+                'token': lease.token,
+                'duration_seconds': round(time.perf_counter() - started, 3),
+                'finished_at': time.time(),
+                'error': error
+            }
+
+    def status(self, resource: str) -> Dict[str, Any]:
+        record = self.backend.current(resource)
+        now = time.time()
+        held = bool(record.get('holder')) and (record.get('expires_at') or 0) > now
+        with self._lock:
+            waiters = self._waiters.get(resource, 0)
+            last = self._history.get(resource)
+        return {
+            'resource': resource,
+            'state': 'refreshing' if held else 'idle',
+            'holder': record.get('holder') if held else None,
+            'held_by_this_worker': held and record.get('holder') == self.holder,
+            'token': record.get('token'),
+            'held_for_seconds': round(now - record['acquired_at'], 1) if held else None,
+            'expires_in_seconds': round(record['expires_at'] - now, 1) if held else None,
+            'last_completed_at': record.get('completed_at'),
+            'waiters_in_this_worker': waiters,
+            'last_run_in_this_worker': last
+        }
+
+    def describe(self) -> Dict[str, Any]:
+        with self._lock:
+            resources = sorted(set(self._history) | set(self._held) | set(self._waiters))
+        return {
+            'backend': self.backend.name,
+            'holder': self.holder,
+            'lease_seconds': self.lease_seconds,
+            'wait_seconds': self.wait_seconds,
+            'held': [asdict(lease) for lease in list(self._held.values())],
+            'resources': {resource: self.status(resource) for resource in resources}
+        }
+
+
+def coordinator_from_env(execute_query: Callable[..., pd.DataFrame] = None) -> RefreshCoordinator:
+    """File leases by default; FINOPS_REFRESH_LOCK_BACKEND=snowflake for workers on several hosts"""
+    if REFRESH_LOCK_BACKEND == 'snowflake':
+        if execute_query is None:
+            raise ValueError("The snowflake refresh lock backend needs a query function")
+        return RefreshCoordinator(SnowflakeLeaseBackend(execute_query))
+    if REFRESH_LOCK_BACKEND != 'file':
+        raise ValueError(f"Unknown refresh lock backend '{REFRESH_LOCK_BACKEND}'")
+    return RefreshCoordinator(FileLeaseBackend())
+
+
+def register_refresh_lock_route(app, coordinator: RefreshCoordinator):
+    @app.route('/api/refresh-locks', methods=['GET'])
+    def refresh_locks():
+        return jsonify(coordinator.describe())
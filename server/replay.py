@@ -0,0 +1,222 @@
+import asyncio
+import hashlib
+import inspect
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List
+
+import pandas as pd
+
+from anchors import ANCHOR_BINDS, ANCHOR_LITERAL_RE
+
+logger = logging.getLogger(__name__)
+
+# Replay configuration
+#   FINOPS_REPLAY_MODE         off | record | replay
+#   FINOPS_REPLAY_DIR          directory holding <hash>.parquet files and manifest.jsonl
+#   FINOPS_REPLAY_LATENCY_MS   fixed latency added to every replayed query
+#   FINOPS_REPLAY_LATENCY_SCALE  multiplier applied to the recorded Snowflake latency (0 = full speed)
+REPLAY_CONFIG = {
+    'mode': os.getenv('FINOPS_REPLAY_MODE', 'off').lower(),
+    'directory': os.getenv('FINOPS_REPLAY_DIR', './replay'),
+    'latency_ms': float(os.getenv('FINOPS_REPLAY_LATENCY_MS', '0')),
+    'latency_scale': float(os.getenv('FINOPS_REPLAY_LATENCY_SCALE', '0')),
+}
+
+MANIFEST_FILE = 'manifest.jsonl'
+
+_COMMENT_RE = re.compile(r'--[^\n]*')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+class ReplayMiss(Exception):
+    """Raised in replay mode when no recording exists for a query"""
+
+
+class ReplayUnsupported(Exception):
+    """Raised in replay mode by calls that have no recordable result, such as stored procedures"""
+
+
+def normalize_sql(query: str) -> str:
+    """Strip comments, collapse whitespace and drop trailing semicolons"""
+    query = _COMMENT_RE.sub(' ', query)
+    query = _WHITESPACE_RE.sub(' ', query).strip()
+    return query.rstrip(';').strip()
+
+
+def _without_anchors(query: str, params: Any):
+    """Time anchors and build times replaced by placeholders, so a recording outlives its anchor hour"""
+    query = ANCHOR_LITERAL_RE.sub("'<anchor>'", query)
+    if isinstance(params, dict):
+        params = {name: '<anchor>' if name in ANCHOR_BINDS else value for name, value in params.items()}
+    return query, params
+
+
+def query_key(query: str, params: Any = None) -> str:
+    """Stable hash of the normalized SQL text and its bind parameters, ignoring time anchors"""
+    query, params = _without_anchors(query, params)
+    payload = normalize_sql(query)
+    if params:
+        payload += '\n' + json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class QueryRecorder:
+    def __init__(self, mode: str = 'off', directory: str = './replay',
+                 latency_ms: float = 0, latency_scale: float = 0):
+        if mode not in ('off', 'record', 'replay'):
+            raise ValueError(f"Unknown replay mode: {mode}")
+        self.mode = mode
+        self.directory = directory
+        self.latency_ms = latency_ms
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._recorded_latency = {}
+        if mode != 'off':
+            os.makedirs(directory, exist_ok=True)
+        if mode == 'replay':
+            for entry in self.load_manifest():
+                self._recorded_latency[entry['key']] = entry.get('elapsed_ms', 0)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.parquet")
+
+    def load_manifest(self) -> List[Dict[str, Any]]:
+        """Read the recording manifest, one entry per recorded call in call order"""
+        path = os.path.join(self.directory, MANIFEST_FILE)
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def record(self, query: str, params: Any, df: pd.DataFrame, elapsed_ms: float):
+        """Persist a result set and append the call to the manifest"""
+        key = query_key(query, params)
+        with self._lock:
+            if not os.path.exists(self._path(key)):
+                df.to_parquet(self._path(key), index=False)
+            entry = {
+                'key': key,
+                'sql': normalize_sql(query),
+                'params': params,
+                'rows': len(df),
+                'elapsed_ms': round(elapsed_ms, 3),
+                'recorded_at': datetime.now().isoformat()
+            }
+            with open(os.path.join(self.directory, MANIFEST_FILE), 'a') as f:
+                f.write(json.dumps(entry, default=str) + '\n')
+
+    def replay(self, query: str, params: Any = None) -> pd.DataFrame:
+        """Serve a recorded result set, sleeping for the configured latency"""
+        key = query_key(query, params)
+        path = self._path(key)
+        if not os.path.exists(path):
+            raise ReplayMiss(f"No recording for query {key[:12]}: {normalize_sql(query)[:80]}")
+
+        delay_ms = self.latency_ms + self.latency_scale * self._recorded_latency.get(key, 0)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000.0)
+        return pd.read_parquet(path)
+
+    def wrap(self, execute_query: Callable[..., pd.DataFrame]) -> Callable[..., pd.DataFrame]:
+        """Wrap an execute_query(query, params=None) callable with record/replay behaviour"""
+        if self.mode == 'off':
+            return execute_query
+
+        def wrapper(query: str, *args, **kwargs) -> pd.DataFrame:
+            params = args[0] if args else kwargs.get('params')
+            if self.mode == 'replay':
+                return self.replay(query, params)
+
+            started = time.perf_counter()
+            df = execute_query(query, *args, **kwargs)
+            self.record(query, params, df, (time.perf_counter() - started) * 1000)
+            return df
+
+        wrapper.__wrapped__ = execute_query
+        return wrapper
+
+    def wrap_async(self, execute_query: Callable[..., Any]) -> Callable[..., Any]:
+        """wrap() for a coroutine execute_query(query, params=None), as on the asyncio connector"""
+        if self.mode == 'off':
+            return execute_query
+
+        async def wrapper(query: str, *args, **kwargs) -> pd.DataFrame:
+            params = args[0] if args else kwargs.get('params')
+            if self.mode == 'replay':
+                return await asyncio.to_thread(self.replay, query, params)
+
+            started = time.perf_counter()
+            df = await execute_query(query, *args, **kwargs)
+            self.record(query, params, df, (time.perf_counter() - started) * 1000)
+            return df
+
+        wrapper.__wrapped__ = execute_query
+        return wrapper
+
+    def wrap_batches(self, iter_query_batches: Callable[..., Iterator[pd.DataFrame]]
+                     ) -> Callable[..., Iterator[pd.DataFrame]]:
+        """Wrap an iter_query_batches(query, params=None, batch_size=...) generator.
+
+        A recording holds the whole result and is only written once the batches are exhausted;
+        replay re-slices it into batch_size frames.
+        """
+        if self.mode == 'off':
+            return iter_query_batches
+
+        def wrapper(query: str, params: Any = None, batch_size: int = 100000) -> Iterator[pd.DataFrame]:
+            if self.mode == 'replay':
+                df = self.replay(query, params)
+                for start in range(0, len(df), batch_size):
+                    yield df.iloc[start:start + batch_size].reset_index(drop=True)
+                return
+
+            started = time.perf_counter()
+            batches = []
+            for batch in iter_query_batches(query, params, batch_size):
+                batches.append(batch)
+                yield batch
+            df = pd.concat(batches, ignore_index=True) if batches else pd.DataFrame()
+            self.record(query, params, df, (time.perf_counter() - started) * 1000)
+
+        wrapper.__wrapped__ = iter_query_batches
+        return wrapper
+
+    def wrap_procedure(self, execute_procedure: Callable[..., Any]) -> Callable[..., Any]:
+        """Procedures only have side effects in Snowflake, so replay refuses them instead of calling out"""
+        if self.mode != 'replay':
+            return execute_procedure
+
+        def wrapper(procedure_name: str, *args, **kwargs):
+            raise ReplayUnsupported(f"Procedure {procedure_name} cannot run in replay mode")
+
+        wrapper.__wrapped__ = execute_procedure
+        return wrapper
+
+    def install(self, target: Any) -> Any:
+        """Replace target's statement methods (execute_query, and iter_query_batches and
+        execute_procedure where it has them) with recording/replaying wrappers"""
+        if self.mode != 'off':
+            if inspect.iscoroutinefunction(target.execute_query):
+                target.execute_query = self.wrap_async(target.execute_query)
+            else:
+                target.execute_query = self.wrap(target.execute_query)
+            if hasattr(target, 'iter_query_batches'):
+                target.iter_query_batches = self.wrap_batches(target.iter_query_batches)
+            if hasattr(target, 'execute_procedure'):
+                target.execute_procedure = self.wrap_procedure(target.execute_procedure)
+            logger.info(f"Query {self.mode} enabled for {type(target).__name__} in {self.directory}")
+        return target
+
+
+recorder = QueryRecorder(**REPLAY_CONFIG)
+
+
+def install_replay(target: Any) -> Any:
+    """Install the environment-configured recorder on a connector or analytics object"""
+    return recorder.install(target)
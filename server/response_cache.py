@@ -0,0 +1,161 @@
+import gzip
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from flask import Response, request
+
+from metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Upper bound on how long a version stays valid when tables may be rebuilt
+# outside this process (stored procedures, other workers, Snowflake tasks).
+RESPONSE_CACHE_TTL = int(os.getenv('FINOPS_RESPONSE_CACHE_TTL', '300'))
+RESPONSE_CACHE_ENTRIES = int(os.getenv('FINOPS_RESPONSE_CACHE_ENTRIES', '256'))
+
+# Preferred first when the client accepts several
+_ENCODERS = OrderedDict()
+if zstandard is not None:
+    _ENCODERS['zstd'] = lambda body: zstandard.ZstdCompressor(level=6).compress(body)
+if brotli is not None:
+    _ENCODERS['br'] = lambda body: brotli.compress(body, quality=5)
+_ENCODERS['gzip'] = lambda body: gzip.compress(body, compresslevel=6)
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+
+
+class CachedBody:
+    def __init__(self, body: bytes, content_type: str):
+        self.body = body
+        self.content_type = content_type
+        self.encoded: Dict[str, bytes] = {'identity': body}
+
+    def encode(self, encoding: str) -> bytes:
+        if encoding not in self.encoded:
+            self.encoded[encoding] = _ENCODERS[encoding](self.body)
+        return self.encoded[encoding]
+
+
+def negotiate_encoding(accept_encoding: str, size: int) -> str:
+    """Pick the best content-coding the client accepts"""
+    if size < MIN_COMPRESS_BYTES or not accept_encoding:
+        return 'identity'
+    accepted = set()
+    for part in accept_encoding.split(','):
+        token, _, params = part.strip().partition(';')
+        if params.strip().replace(' ', '') in ('q=0', 'q=0.0'):
+            continue
+        accepted.add(token.strip().lower())
+    for encoding in _ENCODERS:
+        if encoding in accepted or '*' in accepted:
+            return encoding
+    return 'identity'
+
+
+class ResponseCache:
+    def __init__(self, ttl: int = RESPONSE_CACHE_TTL, max_entries: int = RESPONSE_CACHE_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.versions: Dict[str, Any] = {}
+        self.entries: "OrderedDict[Tuple[str, str], CachedBody]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def bump(self, namespace: str, version: Optional[str] = None):
+        """Mark a table as rebuilt so its cached bodies and ETags are retired.
+
+        Callers that know an identity of the new data every worker agrees on (e.g. the refresh time
+        carried by the shared cache) pass it as version; otherwise a local counter is advanced and
+        only the TTL bucket keeps workers from handing out each other's ETags.
+        """
+        with self._lock:
+            if version is None:
+                current = self.versions.get(namespace, 0)
+                version = current + 1 if isinstance(current, int) else 1
+            self.versions[namespace] = version
+
+    def version(self, *namespaces: str) -> str:
+        """Current version of one or more tables, rolled over every ttl seconds.
+
+        Nothing process-specific goes in, so every worker and a restarted worker hand out the same
+        ETag for the same table version and TTL bucket, and revalidations behind a load balancer
+        get their 304. A worker that has not seen a rebuild catches up when the bucket rolls over.
+        """
+        parts = [f"{ns}:{self.versions.get(ns, 0)}" for ns in sorted(namespaces)]
+        if self.ttl > 0:
+            parts.append(f"t{int(time.time() // self.ttl)}")
+        return '|'.join(parts)
+
+    def _etag(self, key: Tuple[str, str], encoding: str) -> str:
+        digest = hashlib.sha1(f"{key[0]}|{key[1]}".encode('utf-8')).hexdigest()[:24]
+        return f"{digest}-{encoding}"
+
+    def respond(self, variant: str, version: str, build_body: Callable[[], bytes],
+                content_type: str = 'application/json', req=None, response_class=Response) -> Response:
+        """Serve a body serialized once per (variant, version), with ETag/304 and compression.
+
+        req and response_class default to Flask's; asgi.py passes Quart's request and Response.
+        """
+        req = request if req is None else req
+        key = (variant, version)
+        accept_encoding = req.headers.get('Accept-Encoding', '')
+
+        with self._lock:
+            cached = self.entries.get(key)
+            if cached is not None:
+                self.entries.move_to_end(key)
+
+        endpoint = req.url_rule.rule if req.url_rule is not None else req.path
+        record_cache_lookup('response', endpoint, hit=cached is not None)
+
+        # ETags derive from the version, not the body, so a revalidation is answered before any work
+        for candidate in {negotiate_encoding(accept_encoding, MIN_COMPRESS_BYTES), 'identity'}:
+            etag = self._etag(key, candidate)
+            if req.if_none_match.contains(etag):
+                return self._not_modified(etag, response_class)
+
+        if cached is None:
+            cached = CachedBody(build_body(), content_type)
+            with self._lock:
+                self.entries[key] = cached
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        encoding = negotiate_encoding(accept_encoding, len(cached.body))
+        etag = self._etag(key, encoding)
+
+        response = response_class(cached.encode(encoding), content_type=cached.content_type)
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.set_etag(etag)
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    def _not_modified(self, etag: str, response_class=Response) -> Response:
+        response = response_class(b'', status=304)
+        response.set_etag(etag)
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+
+def request_variant(req=None) -> str:
+    """Cache key for the current (or the given) request: path plus sorted query arguments"""
+    req = request if req is None else req
+    args = sorted((k, v) for k, v in req.args.items(multi=True))
+    return req.path + '?' + '&'.join(f"{k}={v}" for k, v in args)
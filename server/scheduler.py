@@ -0,0 +1,245 @@
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional
+
+import pandas as pd
+from flask import jsonify, request
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.getenv('FINOPS_SCHEDULER', '').lower() in ('1', 'true', 'yes', 'on')
+# JSON {"table": seconds} overriding the default cadences
+SCHEDULE_OVERRIDES = os.getenv('FINOPS_SCHEDULE', '')
+TICK_SECONDS = 15
+# Each run is moved by up to this fraction of its cadence so workers and tables do not align
+JITTER_FRACTION = 0.1
+# Dashboard views count half as much after this long
+VIEW_HALF_LIFE_SECONDS = 3600
+MAX_HISTORY = 500
+
+MINUTE, HOUR, DAY = 60, 3600, 86400
+
+# ACCOUNT_USAGE views that receive new rows over time, and the column that advances with them.
+# Dimension views (USERS, WAREHOUSES, GRANTS_TO_ROLES, ...) do not decide whether a run is needed.
+SOURCE_WATERMARKS = {
+    'QUERY_HISTORY': 'end_time',
+    'WAREHOUSE_METERING_HISTORY': 'end_time',
+    'WAREHOUSE_LOAD_HISTORY': 'end_time',
+    'DATABASE_STORAGE_USAGE_HISTORY': 'usage_date',
+    'ACCESS_HISTORY': 'query_start_time',
+    'COPY_HISTORY': 'last_load_time',
+    'TASK_HISTORY': 'completed_time',
+    'TABLES': 'last_altered',
+}
+
+_SOURCE_RE = re.compile(r'ACCOUNT_USAGE\.([A-Z_]+)', re.IGNORECASE)
+
+
+def sql_sources(sql: str) -> List[str]:
+    """Watermarked ACCOUNT_USAGE views a statement reads"""
+    views = dict.fromkeys(name.upper() for name in _SOURCE_RE.findall(sql))
+    return [view for view in views if view in SOURCE_WATERMARKS]
+
+
+def cadence_overrides() -> Dict[str, int]:
+    if not SCHEDULE_OVERRIDES:
+        return {}
+    try:
+        return {name: int(seconds) for name, seconds in json.loads(SCHEDULE_OVERRIDES).items()}
+    except (ValueError, TypeError, AttributeError) as e:
+        logger.warning(f"Ignoring invalid FINOPS_SCHEDULE: {e}")
+        return {}
+
+
+def _utc_naive(value: Any) -> pd.Timestamp:
+    stamp = pd.Timestamp(value)
+    return stamp.tz_convert('UTC').tz_localize(None) if stamp.tzinfo is not None else stamp
+
+
+class _Entry:
+    def __init__(self, name: str, every: int, run: Callable[[], Any], sources: List[str], priority: int):
+        self.name = name
+        self.every = every
+        self.run = run
+        self.sources = sources
+        self.priority = priority
+        self.next_run = time.time() + random.uniform(0, every * JITTER_FRACTION)
+        self.last_run: Optional[Dict[str, Any]] = None
+        self.watermarks: Dict[str, Any] = {}
+        self.views = 0.0
+        self.viewed_at = time.time()
+        self.running = False
+        self.completed = False
+
+    def view_score(self, now: float) -> float:
+        return self.views * 0.5 ** ((now - self.viewed_at) / VIEW_HALF_LIFE_SECONDS)
+
+    def reschedule(self, now: float):
+        self.next_run = now + self.every * (1 + random.uniform(-JITTER_FRACTION, JITTER_FRACTION))
+
+
+class TableScheduler:
+    """Background refresh of each table on its own cadence.
+
+    Due tables run one at a time, most viewed first. A table whose ACCOUNT_USAGE sources have no
+    rows newer than at its last run is skipped until its next slot. Every worker may run a
+    scheduler; the refresh leases make concurrent schedulers share a single refresh per table.
+    """
+
+    def __init__(self, execute_query: Callable[..., pd.DataFrame], component: str, tick_seconds: float = TICK_SECONDS):
+        self.execute_query = execute_query
+        self.component = component
+        self.tick_seconds = tick_seconds
+        self.entries: Dict[str, _Entry] = {}
+        self.history: Deque[Dict[str, Any]] = deque(maxlen=MAX_HISTORY)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, name: str, every: int, run: Callable[[], Any], sources: Iterable[str] = (), priority: int = 0):
+        every = cadence_overrides().get(name, every)
+        with self._lock:
+            self.entries[name] = _Entry(name, every, run, list(sources), priority)
+
+    def record_view(self, *names: str):
+        """Count a dashboard read; due tables run in order of priority, then recent views"""
+        now = time.time()
+        with self._lock:
+            for name in names:
+                entry = self.entries.get(name)
+                if entry is not None:
+                    entry.views = entry.view_score(now) + 1
+                    entry.viewed_at = now
+
+    def run_now(self, name: str):
+        with self._lock:
+            self.entries[name].next_run = time.time()
+        self._wake.set()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._loop, name=f'{self.component}-scheduler', daemon=True)
+            self._thread.start()
+        logger.info(f"Started {self.component} refresh scheduler for {len(self.entries)} tables")
+
+    def _loop(self):
+        while True:
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"Scheduler tick failed: {e}")
+            self._wake.wait(self.tick_seconds)
+            self._wake.clear()
+
+    def _due(self, now: float) -> List[_Entry]:
+        with self._lock:
+            due = [entry for entry in self.entries.values() if entry.next_run <= now and not entry.running]
+        return sorted(due, key=lambda entry: (-entry.priority, -entry.view_score(now), entry.next_run))
+
+    def _source_watermarks(self, entry: _Entry) -> Dict[str, Any]:
+        """Newest row of each source, looking back only from the previous watermark"""
+        since = min(entry.watermarks.values(), default=None) or datetime.utcnow() - timedelta(days=7)
+        parts = [f"SELECT '{view}' as source, MAX({SOURCE_WATERMARKS[view]})::TIMESTAMP_TZ as watermark "
+                 f"FROM SNOWFLAKE.ACCOUNT_USAGE.{view} WHERE {SOURCE_WATERMARKS[view]} >= %(since)s::TIMESTAMP_TZ"
+                 for view in entry.sources]
+        df = self.execute_query(' UNION ALL '.join(parts),
+                                {'since': pd.Timestamp(since).strftime('%Y-%m-%d %H:%M:%S +00:00')})
+        df.columns = [c.lower() for c in df.columns]
+        return {source: _utc_naive(watermark) for source, watermark in zip(df['source'], df['watermark'])
+                if watermark is not None and not pd.isna(watermark)}
+
+    def tick(self):
+        now = time.time()
+        for entry in self._due(now):
+            self._run(entry)
+
+    def _run(self, entry: _Entry):
+        started = time.time()
+        record = {'table': entry.name, 'started_at': datetime.fromtimestamp(started).isoformat()}
+        entry.running = True
+        try:
+            watermarks = self._source_watermarks(entry) if entry.sources else {}
+            advanced = [source for source, watermark in watermarks.items()
+                        if source not in entry.watermarks or watermark > entry.watermarks[source]]
+            if entry.sources and entry.completed and not advanced:
+                record['status'] = 'skipped'
+                record['reason'] = 'no new rows in ' + ', '.join(entry.sources)
+            else:
+                entry.run()
+                entry.watermarks.update(watermarks)
+                entry.completed = True
+                record['status'] = 'completed'
+            record['watermarks'] = {source: value.isoformat() for source, value in watermarks.items()}
+        except Exception as e:
+            logger.error(f"Scheduled refresh of {entry.name} failed: {e}")
+            record['status'] = 'failed'
+            record['error'] = str(e)
+        finally:
+            entry.running = False
+            record['duration_seconds'] = round(time.time() - started, 3)
+            with self._lock:
+                entry.reschedule(time.time())
+                if record['status'] != 'skipped':
+                    entry.last_run = record
+                self.history.append(record)
+
+    def schedule(self) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entries = sorted(self.entries.values(), key=lambda entry: entry.next_run)
+            return [{
+                'table': entry.name,
+                'every_seconds': entry.every,
+                'next_run': datetime.fromtimestamp(entry.next_run).isoformat(),
+                'due_in_seconds': max(round(entry.next_run - now), 0),
+                'priority': entry.priority,
+                'view_score': round(entry.view_score(now), 2),
+                'sources': entry.sources,
+                'running': entry.running,
+                'last_run': entry.last_run
+            } for entry in entries]
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            'enabled': self._thread is not None,
+            'component': self.component,
+            'tick_seconds': self.tick_seconds,
+            'jitter_fraction': JITTER_FRACTION,
+            'tables': self.schedule()
+        }
+
+
+def register_scheduler_routes(app, scheduler: TableScheduler):
+    """Expose /api/scheduler for the schedule, run history and manual triggers"""
+
+    def get_schedule():
+        return jsonify(scheduler.describe())
+
+    def get_history():
+        table = request.args.get('table')
+        try:
+            limit = min(max(int(request.args.get('limit', 100)), 1), MAX_HISTORY)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        runs = [run for run in reversed(scheduler.history) if table is None or run['table'] == table]
+        return jsonify({'runs': runs[:limit]})
+
+    def trigger(table_name: str):
+        if table_name not in scheduler.entries:
+            return jsonify({'error': f"Table {table_name} is not scheduled"}), 404
+        scheduler.run_now(table_name)
+        return jsonify({'status': 'queued', 'table': table_name}), 202
+
+    app.add_url_rule('/api/scheduler', 'get_schedule', get_schedule, methods=['GET'])
+    app.add_url_rule('/api/scheduler/history', 'get_scheduler_history', get_history, methods=['GET'])
+    app.add_url_rule('/api/scheduler/<table_name>/run', 'trigger_scheduled_run', trigger, methods=['POST'])
+    return app
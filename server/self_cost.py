@@ -0,0 +1,207 @@
+import json
+import logging
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+
+import pandas as pd
+from flask import g, has_request_context, jsonify, request
+
+from metrics import registry, statement_label
+
+logger = logging.getLogger(__name__)
+
+TAG_APP = 'finops'
+TAG_PREFIX = '{"app":"%s"' % TAG_APP
+
+# ACCOUNT_USAGE.QUERY_HISTORY lags by up to 45 minutes and QUERY_ATTRIBUTION_HISTORY by up to
+# about 8 hours, so every incremental pull re-reads this window behind the watermark and replaces
+# rows by query_id; statements pulled before their compute credits were attributed get them then.
+LATENCY_OVERLAP = timedelta(hours=9)
+
+RESULT_CACHE_HIT_RATIO = registry.gauge('finops_result_cache_hit_ratio',
+                                        "Share of the tool's own SELECTs answered from Snowflake's result cache")
+
+
+def build_query_tag(component: str, query: str) -> str:
+    """Structured QUERY_TAG for a statement issued by the FinOps tool itself"""
+    tag = {
+        'app': TAG_APP,
+        'component': component,
+        'table': statement_label(query),
+        'endpoint': 'background',
+        'request_id': None
+    }
+    if has_request_context():
+        tag['endpoint'] = request.url_rule.rule if request.url_rule is not None else request.path
+        tag['request_id'] = g.get('request_id')
+    return json.dumps(tag, separators=(',', ':'))
+
+
+def statement_params(component: str, query: str) -> Dict[str, str]:
+    """Per-statement parameters for cursor.execute(..., _statement_params=...)"""
+    return {'QUERY_TAG': build_query_tag(component, query)}
+
+
+def session_tag_sql(component: str, query: str) -> str:
+    """ALTER SESSION statement tagging everything until UNSET, including statements inside procedures"""
+    return "ALTER SESSION SET QUERY_TAG = '{}'".format(build_query_tag(component, query).replace("'", "''"))
+
+
+def result_cache_hits(rows: pd.DataFrame) -> pd.Series:
+    """Approximate result-cache reuse per statement.
+
+    QUERY_HISTORY has no reuse flag. A reused result executes nothing and scans nothing, and
+    repeats the text of an earlier statement, so a hit is a SELECT with zero execution time and
+    zero bytes scanned whose query_hash was already seen. Repeated metadata-only SELECTs (such as
+    a bare COUNT(*)) look the same and are counted too, so the rate is an upper bound.
+    """
+    ordered = rows.sort_values('start_time')
+    repeated = ordered['query_hash'].notna() & ordered.duplicated('query_hash')
+    no_work = (ordered['query_type'] == 'SELECT') & (ordered['execution_time'].fillna(0) == 0) \
+        & (ordered['bytes_scanned'].fillna(0) == 0)
+    return (repeated & no_work).reindex(rows.index)
+
+
+class SelfCostReport:
+    def __init__(self, days: int = 30):
+        self.days = days
+        self.rows = pd.DataFrame()
+        self.watermark = None
+        self.last_refresh = None
+        self._lock = threading.Lock()
+
+    def _history_query(self, since: datetime) -> str:
+        return f"""
+        SELECT
+            qh.query_id,
+            qh.query_tag,
+            qh.warehouse_name,
+            qh.start_time,
+            qh.end_time,
+            qh.total_elapsed_time,
+            qh.execution_time,
+            qh.query_type,
+            qh.query_hash,
+            qh.bytes_scanned,
+            COALESCE(qh.credits_used_cloud_services, 0) as credits_used_cloud_services,
+            COALESCE(qa.credits_attributed_compute, 0) as credits_attributed_compute
+        FROM SNOWFLAKE.ACCOUNT_USAGE.QUERY_HISTORY qh
+        LEFT JOIN SNOWFLAKE.ACCOUNT_USAGE.QUERY_ATTRIBUTION_HISTORY qa ON qh.query_id = qa.query_id
+        WHERE qh.query_tag LIKE '{TAG_PREFIX}%'
+        AND qh.end_time >= '{since.strftime('%Y-%m-%d %H:%M:%S +00:00')}'::TIMESTAMP_TZ
+        """
+
+    def refresh(self, execute_query: Callable[[str], pd.DataFrame]) -> int:
+        """Pull tagged statements finished since the last watermark; returns the number of new rows"""
+        with self._lock:
+            if self.watermark is None:
+                since = datetime.utcnow() - timedelta(days=self.days)
+            else:
+                since = self.watermark - LATENCY_OVERLAP
+
+            df = execute_query(self._history_query(since))
+            df.columns = [c.lower() for c in df.columns]
+            before = len(self.rows)
+            if not df.empty:
+                tags = df['query_tag'].map(lambda t: json.loads(t) if t else {})
+                for field in ('component', 'table', 'endpoint', 'request_id'):
+                    df[field] = tags.map(lambda t, f=field: t.get(f))
+                df['total_credits'] = df['credits_used_cloud_services'].astype(float) + df['credits_attributed_compute'].astype(float)
+                df['is_select'] = df['query_type'] == 'SELECT'
+                df = df.drop(columns=['query_tag'])
+                self.rows = pd.concat([self.rows, df]).drop_duplicates('query_id', keep='last').reset_index(drop=True)
+                self.rows['result_cache_hit'] = result_cache_hits(self.rows)
+                # Naive UTC, whatever the session time zone the LTZ columns came back in
+                self.watermark = pd.to_datetime(self.rows['end_time'], utc=True).max().tz_localize(None).to_pydatetime()
+
+            cutoff = datetime.utcnow() - timedelta(days=self.days)
+            if not self.rows.empty:
+                self.rows = self.rows[pd.to_datetime(self.rows['start_time'], utc=True).dt.tz_localize(None) >= cutoff]
+            self.last_refresh = datetime.now()
+            return max(len(self.rows) - before, 0)
+
+    def summarize(self, group_by: str = 'table') -> list:
+        """Credits, bytes scanned and elapsed time per component, table or endpoint"""
+        if group_by not in ('component', 'table', 'endpoint'):
+            raise ValueError(f"Cannot group self-cost by {group_by}")
+        if self.rows.empty:
+            return []
+
+        summary = self.rows.groupby(['component', group_by] if group_by != 'component' else ['component']).agg(
+            query_count=('query_id', 'count'),
+            total_credits=('total_credits', 'sum'),
+            gb_scanned=('bytes_scanned', lambda b: float(b.sum()) / (1024 ** 3)),
+            total_elapsed_sec=('total_elapsed_time', lambda t: float(t.sum()) / 1000.0),
+            select_count=('is_select', 'sum'),
+            result_cache_hits=('result_cache_hit', 'sum')
+        ).reset_index().sort_values('total_credits', ascending=False)
+        summary['result_cache_hit_rate'] = (summary['result_cache_hits'] / summary['select_count'].where(summary['select_count'] > 0)).fillna(0.0)
+        return summary.to_dict('records')
+
+    def result_cache(self) -> dict:
+        """Approximate result-cache hit rate of the tracked SELECTs (see result_cache_hits), overall and per component"""
+        if self.rows.empty:
+            return {'select_count': 0, 'hits': 0, 'hit_rate': 0.0, 'components': {}}
+        selects = self.rows[self.rows['is_select']]
+        components = {}
+        for component, group in selects.groupby('component'):
+            hits = int(group['result_cache_hit'].sum())
+            components[component] = {'select_count': len(group), 'hits': hits, 'hit_rate': hits / len(group)}
+            RESULT_CACHE_HIT_RATIO.set(hits / len(group), component=component)
+        hits = int(selects['result_cache_hit'].sum())
+        return {
+            'select_count': len(selects),
+            'hits': hits,
+            'hit_rate': hits / len(selects) if len(selects) else 0.0,
+            'components': components
+        }
+
+
+def install_request_ids(app):
+    """Give every request an id (honouring X-Request-ID) so its statements can be traced in QUERY_HISTORY"""
+
+    @app.before_request
+    def _assign_request_id():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16]
+
+    @app.after_request
+    def _echo_request_id(response):
+        if 'request_id' in g:
+            response.headers['X-Request-ID'] = g.request_id
+        return response
+
+    return app
+
+
+def register_self_cost_route(app, report: SelfCostReport, get_executor: Callable[[], Optional[Callable]]):
+    """Expose GET /api/self-cost?group_by=table|endpoint|component&refresh=true"""
+
+    def self_cost():
+        try:
+            group_by = request.args.get('group_by', 'table')
+            new_rows = 0
+            if request.args.get('refresh', 'true') != 'false':
+                execute_query = get_executor()
+                if execute_query is None:
+                    return jsonify({'error': 'Snowflake connection is not initialized'}), 503
+                new_rows = report.refresh(execute_query)
+
+            return jsonify({
+                'group_by': group_by,
+                'new_statements': new_rows,
+                'tracked_statements': len(report.rows),
+                'watermark': report.watermark.isoformat() if report.watermark else None,
+                'data': report.summarize(group_by),
+                'result_cache': report.result_cache(),
+                'timestamp': datetime.now().isoformat()
+            })
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            logger.error(f"Error building self-cost report: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+
+    app.add_url_rule('/api/self-cost', 'self_cost', self_cost, methods=['GET'])
+    return app
@@ -0,0 +1,137 @@
+import datetime as dt
+import json
+import math
+import time
+from decimal import Decimal
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+from flask import Response, request
+
+from metrics import InstrumentedJSONProvider, record_serialization
+
+try:
+    import orjson
+except ImportError:  # stdlib json fallback; same output, slower
+    orjson = None
+
+LAYOUTS = ('records', 'columns')
+
+
+def _default(obj: Any) -> Any:
+    """Encode the types Snowflake/pandas hand us that JSON encoders don't know"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if obj is pd.NaT:
+        return None
+    if isinstance(obj, (pd.Timestamp, dt.datetime, dt.date, dt.time)):
+        return obj.isoformat()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.hex()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _clean_floats(obj: Any) -> Any:
+    """NaN/inf -> null for the stdlib encoder (orjson already does this)"""
+    if isinstance(obj, float):
+        return None if math.isnan(obj) or math.isinf(obj) else obj
+    if isinstance(obj, dict):
+        return {k: _clean_floats(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_clean_floats(v) for v in obj]
+    return obj
+
+
+def dumps(obj: Any) -> bytes:
+    """Serialize to UTF-8 JSON bytes"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(_clean_floats(obj), default=_default, separators=(',', ':')).encode('utf-8')
+
+
+def _column_values(series: pd.Series) -> List[Any]:
+    """Convert one column to JSON-native Python values in a single vectorized pass"""
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        if getattr(series.dt, 'tz', None) is not None:
+            series = series.dt.tz_convert('UTC').dt.tz_localize(None)
+        values = np.datetime_as_string(series.to_numpy(dtype='datetime64[us]'), unit='us')
+        values = values.astype(object)
+        values[series.isna().to_numpy()] = None
+        return values.tolist()
+    if series.dtype == object:
+        non_null = series.dropna()
+        if not non_null.empty and isinstance(non_null.iloc[0], Decimal):
+            series = series.astype(float)
+    if orjson is None and pd.api.types.is_float_dtype(series.dtype):
+        values = series.to_numpy(dtype=object)
+        values[series.isna().to_numpy()] = None
+        return values.tolist()
+    return series.tolist()
+
+
+def frame_columns(df: pd.DataFrame) -> Dict[str, List[Any]]:
+    """Column name -> list of JSON-native values"""
+    return {column: _column_values(df[column]) for column in df.columns}
+
+
+def frame_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Drop-in replacement for df.to_dict('records') that is safe to serialize"""
+    columns = frame_columns(df)
+    names = list(columns.keys())
+    return [dict(zip(names, row)) for row in zip(*columns.values())]
+
+
+def frame_payload(df: pd.DataFrame, layout: str = 'records') -> Any:
+    """records: [{col: value}, ...]; columns: {"columns": [...], "data": [[...], ...]}"""
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown layout '{layout}', expected one of {', '.join(LAYOUTS)}")
+    if layout == 'records':
+        return frame_records(df)
+    columns = frame_columns(df)
+    return {'columns': list(columns.keys()), 'data': list(zip(*columns.values()))}
+
+
+def requested_layout() -> str:
+    return request.args.get('layout', 'records')
+
+
+def json_response(obj: Any, status: int = 200) -> Response:
+    return Response(dumps(obj), status=status, mimetype='application/json')
+
+
+def frame_bytes(df: pd.DataFrame, layout: str = None) -> bytes:
+    """Serialized JSON body for a DataFrame in the layout requested via ?layout="""
+    started = time.perf_counter()
+    body = dumps(frame_payload(df, layout or requested_layout()))
+    record_serialization(time.perf_counter() - started)
+    return body
+
+
+def frame_response(df: pd.DataFrame, layout: str = None) -> Response:
+    """JSON response for a DataFrame in the layout requested via ?layout="""
+    return Response(frame_bytes(df, layout), mimetype='application/json')
+
+
+class FastJSONProvider(InstrumentedJSONProvider):
+    """orjson-backed provider used by jsonify(); keeps DataFrame column order instead of sorting keys"""
+
+    sort_keys = False
+
+    def dumps(self, obj: Any, **kwargs) -> str:
+        return dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs) -> Any:
+        if orjson is not None:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+
+def install_fast_json(app):
+    """Route every jsonify() in the app through the fast serializer"""
+    app.json = FastJSONProvider(app)
+    return app
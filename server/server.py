@@ -6,11 +6,29 @@ import os
 from datetime import datetime, timedelta
 import json
 import logging
-from typing import Dict, List, Any
+from typing import Dict, Iterator, List, Any
 import io
+import time
+
+from replay import install_replay
+from anchors import anchor_literal
+from metrics import instrument_app, instrument_connector, record_dataframe_build
+from self_cost import SelfCostReport, install_request_ids, register_self_cost_route, session_tag_sql, statement_params
+from jobs import JobManager, accepted_response, register_job_routes, wants_async
+from serialization import frame_bytes, frame_records, install_fast_json
+from response_cache import ResponseCache, request_variant
+from simulator import CREDITS_PER_HOUR, normalize_size
+from sweepline import epoch_seconds, profile_batches
+from refresh_lock import RefreshInProgress, coordinator_from_env, register_refresh_lock_route
+from swaps import register_swap_routes
+from materialize import MATERIALIZATION
+from offload import OffloadPool, register_offload_route, render_csv
 
 app = Flask(__name__)
 CORS(app)
+instrument_app(app, 'server')
+install_request_ids(app)
+install_fast_json(app)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -45,33 +63,60 @@ class SnowflakeConnection:
         
         try:
             cursor = self.connection.cursor()
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
+            cursor.execute(query, params or None, _statement_params=statement_params('server', query))
             
             # Fetch results and column names
             results = cursor.fetchall()
             columns = [desc[0] for desc in cursor.description]
             
             # Create DataFrame
+            build_started = time.perf_counter()
             df = pd.DataFrame(results, columns=columns)
+            record_dataframe_build('server', time.perf_counter() - build_started)
             cursor.close()
             return df
         except Exception as e:
             logger.error(f"Query execution failed: {str(e)}")
             raise
     
+    def iter_query_batches(self, query: str, params: Dict = None, batch_size: int = 100000) -> Iterator[pd.DataFrame]:
+        """Yield the result as DataFrames of at most batch_size rows, fetched with fetchmany"""
+        if not self.connection:
+            self.connect()
+        
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(query, params or None, _statement_params=statement_params('server', query))
+            columns = [desc[0] for desc in cursor.description]
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                build_started = time.perf_counter()
+                df = pd.DataFrame(rows, columns=columns)
+                record_dataframe_build('server', time.perf_counter() - build_started)
+                yield df
+        except Exception as e:
+            logger.error(f"Query execution failed: {str(e)}")
+            raise
+        finally:
+            cursor.close()
+    
     def execute_procedure(self, procedure_name: str, params: List = None):
         if not self.connection:
             self.connect()
         
         try:
             cursor = self.connection.cursor()
-            if params:
-                cursor.callproc(procedure_name, params)
-            else:
-                cursor.callproc(procedure_name)
+            # Session-level tag so the statements inside the procedure are attributed too
+            cursor.execute(session_tag_sql('server', procedure_name))
+            try:
+                if params:
+                    cursor.callproc(procedure_name, params)
+                else:
+                    cursor.callproc(procedure_name)
+            finally:
+                cursor.execute("ALTER SESSION UNSET QUERY_TAG")
             cursor.close()
             logger.info(f"Successfully executed procedure: {procedure_name}")
         except Exception as e:
@@ -79,7 +124,10 @@ class SnowflakeConnection:
             raise
 
 # Initialize Snowflake connection
-sf_conn = SnowflakeConnection()
+sf_conn = instrument_connector(install_replay(SnowflakeConnection()), 'server')
+
+self_cost_report = SelfCostReport()
+register_self_cost_route(app, self_cost_report, lambda: sf_conn.execute_query)
 
 # Stored Procedures Creation
 STORED_PROCEDURES = {
@@ -90,8 +138,8 @@ STORED_PROCEDURES = {
     AS
     $$
     BEGIN
-        -- Create or replace warehouse metrics table
-        CREATE OR REPLACE TABLE FINOPS_WAREHOUSE_METRICS AS
+        -- Build into the staging table so readers keep the live one until the swap
+        CREATE OR REPLACE TABLE FINOPS_WAREHOUSE_METRICS__STAGING AS
         WITH warehouse_base AS (
             SELECT 
                 warehouse_name,
@@ -172,6 +220,12 @@ STORED_PROCEDURES = {
         LEFT JOIN bad_practices bp ON wb.warehouse_name = bp.warehouse_name
         LEFT JOIN cost_efficiency ce ON wb.warehouse_name = ce.warehouse_name;
         
+        -- Publish atomically; the replaced version stays as FINOPS_WAREHOUSE_METRICS__PREVIOUS for rollback
+        CREATE TABLE IF NOT EXISTS FINOPS_WAREHOUSE_METRICS LIKE FINOPS_WAREHOUSE_METRICS__STAGING;
+        ALTER TABLE FINOPS_WAREHOUSE_METRICS SWAP WITH FINOPS_WAREHOUSE_METRICS__STAGING;
+        DROP TABLE IF EXISTS FINOPS_WAREHOUSE_METRICS__PREVIOUS;
+        ALTER TABLE FINOPS_WAREHOUSE_METRICS__STAGING RENAME TO FINOPS_WAREHOUSE_METRICS__PREVIOUS;
+        
         RETURN 'Warehouse metrics refreshed successfully';
     END;
     $$;
@@ -184,7 +238,7 @@ STORED_PROCEDURES = {
     AS
     $$
     BEGIN
-        CREATE OR REPLACE TABLE FINOPS_DATABASE_METRICS AS
+        CREATE OR REPLACE TABLE FINOPS_DATABASE_METRICS__STAGING AS
         WITH database_storage AS (
             SELECT 
                 database_name,
@@ -218,6 +272,12 @@ STORED_PROCEDURES = {
         FROM database_storage ds
         LEFT JOIN query_patterns qp ON ds.database_name = qp.database_name;
         
+        -- Publish atomically; the replaced version stays as FINOPS_DATABASE_METRICS__PREVIOUS for rollback
+        CREATE TABLE IF NOT EXISTS FINOPS_DATABASE_METRICS LIKE FINOPS_DATABASE_METRICS__STAGING;
+        ALTER TABLE FINOPS_DATABASE_METRICS SWAP WITH FINOPS_DATABASE_METRICS__STAGING;
+        DROP TABLE IF EXISTS FINOPS_DATABASE_METRICS__PREVIOUS;
+        ALTER TABLE FINOPS_DATABASE_METRICS__STAGING RENAME TO FINOPS_DATABASE_METRICS__PREVIOUS;
+        
         RETURN 'Database metrics refreshed successfully';
     END;
     $$;
@@ -230,7 +290,7 @@ STORED_PROCEDURES = {
     AS
     $$
     BEGIN
-        CREATE OR REPLACE TABLE FINOPS_USER_METRICS AS
+        CREATE OR REPLACE TABLE FINOPS_USER_METRICS__STAGING AS
         WITH user_base AS (
             SELECT 
                 user_name,
@@ -274,6 +334,12 @@ STORED_PROCEDURES = {
         FROM user_base ub
         JOIN warehouse_totals wt ON ub.warehouse_name = wt.warehouse_name;
         
+        -- Publish atomically; the replaced version stays as FINOPS_USER_METRICS__PREVIOUS for rollback
+        CREATE TABLE IF NOT EXISTS FINOPS_USER_METRICS LIKE FINOPS_USER_METRICS__STAGING;
+        ALTER TABLE FINOPS_USER_METRICS SWAP WITH FINOPS_USER_METRICS__STAGING;
+        DROP TABLE IF EXISTS FINOPS_USER_METRICS__PREVIOUS;
+        ALTER TABLE FINOPS_USER_METRICS__STAGING RENAME TO FINOPS_USER_METRICS__PREVIOUS;
+        
         RETURN 'User metrics refreshed successfully';
     END;
     $$;
@@ -290,22 +356,80 @@ def create_stored_procedures():
         logger.error(f"Failed to create stored procedures: {str(e)}")
         raise
 
+REFRESH_PROCEDURES = [
+    'REFRESH_WAREHOUSE_METRICS',
+    'REFRESH_DATABASE_METRICS', 
+    'REFRESH_USER_METRICS'
+]
+
+# Table rebuilt by each refresh procedure, used to retire cached responses
+PROCEDURE_TABLES = {
+    'REFRESH_WAREHOUSE_METRICS': 'FINOPS_WAREHOUSE_METRICS',
+    'REFRESH_DATABASE_METRICS': 'FINOPS_DATABASE_METRICS',
+    'REFRESH_USER_METRICS': 'FINOPS_USER_METRICS'
+}
+
+# Serialized responses keyed by request and table version; tables may also be
+# refreshed by Snowflake tasks, so versions roll over after the TTL as well
+response_cache = ResponseCache()
+
+def cached_frame_response(tables: List[str], build_df):
+    """Serve a DataFrame endpoint from the response cache, querying Snowflake only on a miss"""
+    return response_cache.respond(request_variant(), response_cache.version(*tables),
+                                  lambda: frame_bytes(build_df()))
+
+# CSV exports are rendered in worker processes once they are large enough to hold up the GIL
+offload_pool = OffloadPool()
+register_offload_route(app, offload_pool)
+
+def export_to_csv_response(df: pd.DataFrame, filename: str):
+    """Send a DataFrame as a CSV attachment"""
+    return send_file(
+        io.BytesIO(offload_pool.run(render_csv, {'df': df})),
+        mimetype='text/csv',
+        as_attachment=True,
+        download_name=f'{filename}_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
+    )
+
+# One refresher per FINOPS_* table across workers; index.py builders lease the same table names
+refresh_coordinator = coordinator_from_env(sf_conn.execute_query)
+register_refresh_lock_route(app, refresh_coordinator)
+
+# The refresh procedures keep the replaced version of each table for rollback and diffing; only
+# while the servers rebuild the tables themselves
+if MATERIALIZATION == 'rebuild':
+    register_swap_routes(app, lambda: sf_conn.execute_query, PROCEDURE_TABLES.values(), refresh_coordinator,
+                         response_cache.bump)
+
 def refresh_all_metrics():
     """Refresh all metric tables using stored procedures"""
-    procedures = [
-        'REFRESH_WAREHOUSE_METRICS',
-        'REFRESH_DATABASE_METRICS', 
-        'REFRESH_USER_METRICS'
-    ]
-    
-    for proc in procedures:
+    if MATERIALIZATION != 'rebuild':
+        logger.info(f"Metric tables are maintained by Snowflake ({MATERIALIZATION}), not refreshing")
+        return
+    for proc in REFRESH_PROCEDURES:
         try:
-            sf_conn.execute_procedure(proc)
-            logger.info(f"Refreshed metrics using: {proc}")
+            outcome = refresh_coordinator.run(PROCEDURE_TABLES[proc], lambda lease: sf_conn.execute_procedure(proc))
+            response_cache.bump(PROCEDURE_TABLES[proc])
+            if outcome['status'] == 'coalesced':
+                logger.info(f"{PROCEDURE_TABLES[proc]} was refreshed by another worker while waiting, skipped {proc}")
+            else:
+                logger.info(f"Refreshed metrics using: {proc}")
         except Exception as e:
             logger.error(f"Failed to refresh {proc}: {str(e)}")
             raise
 
+def refresh_job_steps(params: Dict) -> List:
+    """CALL statements for an asynchronous /api/refresh-metrics job"""
+    if MATERIALIZATION != 'rebuild':
+        return []
+    return [(proc, f"CALL {proc}()", None) for proc in REFRESH_PROCEDURES]
+
+job_manager = JobManager(lambda: sf_conn.connection or sf_conn.connect(), component='server',
+                         on_step_done=lambda proc: response_cache.bump(PROCEDURE_TABLES[proc]),
+                         coordinator=refresh_coordinator, lease_resource=PROCEDURE_TABLES.get)
+job_manager.register_kind('refresh-metrics', refresh_job_steps)
+register_job_routes(app, job_manager)
+
 # API Routes
 
 @app.route('/api/health', methods=['GET'])
@@ -321,12 +445,22 @@ def health_check():
 def refresh_metrics():
     """Refresh all metrics tables"""
     try:
+        if wants_async():
+            return accepted_response(job_manager.submit('refresh-metrics'))
+        
         refresh_all_metrics()
         return jsonify({
             'status': 'success',
             'message': 'All metrics refreshed successfully',
             'timestamp': datetime.now().isoformat()
         })
+    except RefreshInProgress as e:
+        return jsonify({
+            'status': 'busy',
+            'message': str(e),
+            'refresh': e.status,
+            'timestamp': datetime.now().isoformat()
+        }), 409
     except Exception as e:
         return jsonify({
             'status': 'error',
@@ -342,25 +476,11 @@ def get_warehouse_metrics():
         SELECT * FROM FINOPS_WAREHOUSE_METRICS
         ORDER BY total_credits DESC
         """
-        df = sf_conn.execute_query(query)
-        
-        # Convert to JSON format expected by frontend
-        data = df.to_dict('records')
         
-        # Save to CSV if requested
-        if request.args.get('export') == 'csv':
-            csv_buffer = io.StringIO()
-            df.to_csv(csv_buffer, index=False)
-            csv_buffer.seek(0)
-            
-            return send_file(
-                io.BytesIO(csv_buffer.getvalue().encode()),
-                mimetype='text/csv',
-                as_attachment=True,
-                download_name=f'warehouse_metrics_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-            )
+        if request.args.get('export') != 'csv':
+            return cached_frame_response(['FINOPS_WAREHOUSE_METRICS'], lambda: sf_conn.execute_query(query))
         
-        return jsonify(data)
+        return export_to_csv_response(sf_conn.execute_query(query), 'warehouse_metrics')
     except Exception as e:
         logger.error(f"Error fetching warehouse metrics: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -373,22 +493,11 @@ def get_database_metrics():
         SELECT * FROM FINOPS_DATABASE_METRICS
         ORDER BY total_storage_gb DESC
         """
-        df = sf_conn.execute_query(query)
-        data = df.to_dict('records')
         
-        if request.args.get('export') == 'csv':
-            csv_buffer = io.StringIO()
-            df.to_csv(csv_buffer, index=False)
-            csv_buffer.seek(0)
-            
-            return send_file(
-                io.BytesIO(csv_buffer.getvalue().encode()),
-                mimetype='text/csv',
-                as_attachment=True,
-                download_name=f'database_metrics_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-            )
+        if request.args.get('export') != 'csv':
+            return cached_frame_response(['FINOPS_DATABASE_METRICS'], lambda: sf_conn.execute_query(query))
         
-        return jsonify(data)
+        return export_to_csv_response(sf_conn.execute_query(query), 'database_metrics')
     except Exception as e:
         logger.error(f"Error fetching database metrics: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -420,22 +529,10 @@ def get_user_metrics():
         
         query += " ORDER BY total_credits DESC"
         
-        df = sf_conn.execute_query(query)
-        data = df.to_dict('records')
-        
-        if request.args.get('export') == 'csv':
-            csv_buffer = io.StringIO()
-            df.to_csv(csv_buffer, index=False)
-            csv_buffer.seek(0)
-            
-            return send_file(
-                io.BytesIO(csv_buffer.getvalue().encode()),
-                mimetype='text/csv',
-                as_attachment=True,
-                download_name=f'user_metrics_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-            )
+        if request.args.get('export') != 'csv':
+            return cached_frame_response(['FINOPS_USER_METRICS'], lambda: sf_conn.execute_query(query))
         
-        return jsonify(data)
+        return export_to_csv_response(sf_conn.execute_query(query), 'user_metrics')
     except Exception as e:
         logger.error(f"Error fetching user metrics: {str(e)}")
         return jsonify({'error': str(e)}), 500
@@ -449,7 +546,7 @@ def get_query_history():
         metric_type = request.args.get('metric_type')
         limit = request.args.get('limit', 100)
         
-        query = """
+        query = f"""
         SELECT 
             query_id,
             user_name,
@@ -462,7 +559,7 @@ def get_query_history():
             error_code,
             execution_status
         FROM SNOWFLAKE.ACCOUNT_USAGE.QUERY_HISTORY
-        WHERE start_time >= DATEADD('day', -30, CURRENT_TIMESTAMP())
+        WHERE start_time >= DATEADD('day', -30, {anchor_literal()})
         """
         
         conditions = []
@@ -487,26 +584,86 @@ def get_query_history():
         
         query += f" ORDER BY start_time DESC LIMIT {limit}"
         
-        df = sf_conn.execute_query(query)
-        data = df.to_dict('records')
+        if request.args.get('export') != 'csv':
+            return cached_frame_response(['QUERY_HISTORY'], lambda: sf_conn.execute_query(query))
         
-        if request.args.get('export') == 'csv':
-            csv_buffer = io.StringIO()
-            df.to_csv(csv_buffer, index=False)
-            csv_buffer.seek(0)
-            
-            return send_file(
-                io.BytesIO(csv_buffer.getvalue().encode()),
-                mimetype='text/csv',
-                as_attachment=True,
-                download_name=f'query_history_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv'
-            )
-        
-        return jsonify(data)
+        return export_to_csv_response(sf_conn.execute_query(query), 'query_history')
     except Exception as e:
         logger.error(f"Error fetching query history: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/warehouse-utilization', methods=['GET'])
+def get_warehouse_utilization():
+    """True busy/idle time, per-minute concurrency and idle-but-billed credits per warehouse.
+
+    Query intervals are streamed in start-time order and swept chunk by chunk, so long
+    windows stay within a bounded amount of memory.
+    """
+    try:
+        days = min(max(int(request.args.get('days', 7)), 1), 90)
+        warehouse = request.args.get('warehouse')
+        include_hourly = request.args.get('hourly', 'false').lower() == 'true'
+        include_minutes = request.args.get('minutes', 'false').lower() == 'true'
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        window_end = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+        window_start = window_end - timedelta(days=days)
+        params = {'start': window_start.strftime('%Y-%m-%d %H:%M:%S +00:00'),
+                  'end': window_end.strftime('%Y-%m-%d %H:%M:%S +00:00'),
+                  'warehouse': warehouse.upper() if warehouse else None}
+        warehouse_clause = "AND UPPER(warehouse_name) = %(warehouse)s" if warehouse else ""
+
+        batches = sf_conn.iter_query_batches(f"""
+        SELECT warehouse_name, start_time, end_time
+        FROM SNOWFLAKE.ACCOUNT_USAGE.QUERY_HISTORY
+        WHERE end_time > %(start)s::TIMESTAMP_TZ
+            AND start_time < %(end)s::TIMESTAMP_TZ
+            AND warehouse_name IS NOT NULL
+            AND execution_time > 0
+            {warehouse_clause}
+        ORDER BY warehouse_name, start_time
+        """, params)
+        profiles = profile_batches(batches, epoch_seconds([window_start])[0], epoch_seconds([window_end])[0])
+
+        metering = sf_conn.execute_query(f"""
+        SELECT warehouse_name, CONVERT_TIMEZONE('UTC', start_time)::TIMESTAMP_NTZ AS start_time, credits_used_compute
+        FROM SNOWFLAKE.ACCOUNT_USAGE.WAREHOUSE_METERING_HISTORY
+        WHERE start_time >= %(start)s::TIMESTAMP_TZ
+            AND start_time < %(end)s::TIMESTAMP_TZ
+            {warehouse_clause}
+        """, params)
+        metering.columns = [c.lower() for c in metering.columns]
+        metering['start_time'] = pd.to_datetime(metering['start_time'])
+
+        sizes = sf_conn.execute_query("SHOW WAREHOUSES")
+        sizes.columns = [c.lower() for c in sizes.columns]
+        sizes = dict(zip(sizes['name'].str.upper(), sizes['size'])) if 'size' in sizes else {}
+
+        result = []
+        for name, profile in profiles.items():
+            credits = metering[metering['warehouse_name'] == name].set_index('start_time')['credits_used_compute']
+            try:
+                rate = CREDITS_PER_HOUR[normalize_size(sizes.get(str(name).upper()))]
+            except ValueError:
+                rate = None
+            hourly = profile.hourly(credits.astype(float), rate)
+            entry = {'warehouse_name': name, 'credits_per_hour': rate, **profile.summary(hourly)}
+            if include_hourly:
+                entry['hourly'] = frame_records(hourly.reset_index(names='hour'))
+            if include_minutes:
+                # 1-minute concurrency histogram: mean and peak running queries per bucket
+                entry['minutes'] = {'resolution_seconds': profile.resolution,
+                                    'avg_concurrency': profile.area / profile.resolution, 'peak_concurrency': profile.peak}
+            result.append(entry)
+
+        result.sort(key=lambda entry: entry.get('idle_billed_credits', 0), reverse=True)
+        return jsonify({'days': days, 'warehouses': result})
+    except Exception as e:
+        logger.error(f"Error profiling warehouse utilization: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 # @app.route('/api/query/```
 
 
@@ -516,4 +673,11 @@ def get_query_history():
 # snowflake-connector-python==3.4.0
 # pandas==2.1.1
 # python-dotenv==1.0.0
-# gunicorn==21.2.0
\ No newline at end of file
+# gunicorn==21.2.0
+# pyarrow==14.0.1
+# quart==0.19.4
+# quart-cors==0.7.0
+# hypercorn==0.15.0
+# orjson==3.9.10
+# brotli==1.1.0
+# zstandard==0.22.0
\ No newline at end of file
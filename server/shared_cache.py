@@ -0,0 +1,213 @@
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, NamedTuple, Optional
+
+import pandas as pd
+
+from metrics import registry
+
+try:
+    import fcntl
+except ImportError:  # no cross-process locking; each worker refreshes on its own
+    fcntl = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # the shared cache is disabled and workers keep private copies
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# tmpfs by default so the Arrow files never touch disk; an empty value disables the shared cache
+SHARED_CACHE_DIR = os.getenv('FINOPS_SHARED_CACHE_DIR', os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'finops-cache'))
+# Versions kept per table; the previous one stays for workers that have not switched yet
+KEEP_VERSIONS = 2
+MANIFEST = 'manifest.json'
+
+SHARED_CACHE_VERSION = registry.gauge('finops_shared_cache_version', 'Shared table cache version mapped by this worker')
+SHARED_CACHE_BYTES = registry.gauge('finops_shared_cache_bytes', 'Size of the current Arrow IPC file per table')
+
+_VERSION_FILE = re.compile(r'^(?P<table>.+)\.v(?P<version>\d+)\.arrow$')
+
+
+class SharedTable(NamedTuple):
+    version: int
+    frame: pd.DataFrame
+    meta: Dict[str, Any]
+
+
+def _without_decimals(df: pd.DataFrame) -> pd.DataFrame:
+    """Snowflake NUMBER(p, s) columns as float64.
+
+    Decimal objects round-trip through Arrow decimal128 back into object columns, which every worker
+    materializes as its own Python objects instead of viewing the mapped buffer.
+    """
+    columns = {}
+    for column in df.columns:
+        if df[column].dtype == object:
+            non_null = df[column].dropna()
+            if not non_null.empty and isinstance(non_null.iloc[0], Decimal):
+                columns[column] = df[column].astype('float64')
+    return df.assign(**columns) if columns else df
+
+
+class SharedTableCache:
+    """Versioned Arrow IPC files shared by every worker process on the host.
+
+    A refresh writes <table>.v<N>.arrow and then swaps the manifest with os.replace, so readers see
+    either the old or the new version, never a partial one. Workers memory-map the current file and
+    build their frame on top of the mapping, so table memory does not grow with the worker count.
+    """
+
+    def __init__(self, directory: str = SHARED_CACHE_DIR, keep_versions: int = KEEP_VERSIONS):
+        self.directory = directory
+        self.keep_versions = max(keep_versions, 1)
+        self.enabled = False
+        self._mapped: Dict[str, SharedTable] = {}
+        self._manifest: Dict[str, Any] = {}
+        self._manifest_stat = None
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        if pa is None or not directory:
+            return
+        try:
+            os.makedirs(directory, exist_ok=True)
+            self.enabled = os.access(directory, os.W_OK)
+        except OSError as e:
+            logger.warning(f"Shared table cache disabled, cannot use {directory}: {e}")
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    @contextmanager
+    def _file_lock(self, name: str):
+        """Exclusive across threads of this process and, where fcntl exists, across processes"""
+        with self._lock:
+            local = self._locks.setdefault(name, threading.Lock())
+        with local:
+            if fcntl is None or not self.enabled:
+                yield
+                return
+            with open(self._path(f'.{name}.lock'), 'a') as handle:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def manifest(self) -> Dict[str, Any]:
+        """Current manifest; re-read only when the file was replaced since the last call"""
+        path = self._path(MANIFEST)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return {}
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            if key != self._manifest_stat:
+                try:
+                    with open(path) as handle:
+                        self._manifest = json.load(handle)
+                    self._manifest_stat = key
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Unreadable shared cache manifest: {e}")
+            return self._manifest
+
+    def _write_manifest(self, manifest: Dict[str, Any]):
+        temporary = self._path(f'{MANIFEST}.{os.getpid()}.tmp')
+        with open(temporary, 'w') as handle:
+            json.dump(manifest, handle)
+        os.replace(temporary, self._path(MANIFEST))
+
+    def publish(self, table_name: str, df: pd.DataFrame, meta: Dict[str, Any]) -> SharedTable:
+        """Write a new version of a table and make it current for every worker"""
+        table = pa.Table.from_pandas(_without_decimals(df), preserve_index=False)
+        temporary = self._path(f'.{table_name}.{os.getpid()}.{threading.get_ident()}.tmp')
+        try:
+            with pa.OSFile(temporary, 'wb') as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            with self._file_lock(MANIFEST):
+                # Re-read under the lock: another worker may have published since our last look
+                self._manifest_stat = None
+                manifest = dict(self.manifest())
+                version = manifest.get(table_name, {}).get('version', 0) + 1
+                filename = f'{table_name}.v{version}.arrow'
+                os.replace(temporary, self._path(filename))
+                manifest[table_name] = {
+                    'version': version,
+                    'file': filename,
+                    'rows': table.num_rows,
+                    'bytes': os.path.getsize(self._path(filename)),
+                    'published_at': datetime.now().isoformat(),
+                    'publisher_pid': os.getpid(),
+                    'meta': meta
+                }
+                self._write_manifest(manifest)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        self._collect(table_name, version)
+        logger.info(f"Published {table_name} v{version} to the shared cache ({table.num_rows} rows)")
+        return self.get(table_name)
+
+    def _collect(self, table_name: str, current: int):
+        """Remove versions older than the ones kept; workers still mapping them keep their pages"""
+        for filename in os.listdir(self.directory):
+            match = _VERSION_FILE.match(filename)
+            if match and match['table'] == table_name and int(match['version']) <= current - self.keep_versions:
+                try:
+                    os.remove(self._path(filename))
+                except FileNotFoundError:
+                    pass
+
+    def get(self, table_name: str) -> Optional[SharedTable]:
+        """The current version of a table, mapped once per version and reused until the next switch"""
+        if not self.enabled:
+            return None
+        entry = self.manifest().get(table_name)
+        mapped = self._mapped.get(table_name)
+        if entry is None:
+            return mapped
+        if mapped is not None and mapped.version == entry['version']:
+            return mapped
+        try:
+            source = pa.memory_map(self._path(entry['file']), 'r')
+            table = pa.ipc.open_file(source).read_all()
+        except FileNotFoundError:
+            # Collected between reading the manifest and opening it; a newer version is current
+            logger.debug(f"Shared cache file {entry['file']} already replaced")
+            return mapped
+        # Buffers point into the mapping; split_blocks avoids the copy pandas makes to consolidate
+        shared = SharedTable(entry['version'], table.to_pandas(split_blocks=True), entry.get('meta', {}))
+        with self._lock:
+            self._mapped[table_name] = shared
+        SHARED_CACHE_VERSION.set(shared.version, table=table_name)
+        SHARED_CACHE_BYTES.set(entry.get('bytes', 0), table=table_name)
+        return shared
+
+    def describe(self) -> Dict[str, Any]:
+        manifest = self.manifest() if self.enabled else {}
+        return {
+            'enabled': self.enabled,
+            'directory': self.directory,
+            'tables': {
+                name: {
+                    'version': entry['version'],
+                    'mapped_version': self._mapped[name].version if name in self._mapped else None,
+                    'rows': entry['rows'],
+                    'bytes': entry['bytes'],
+                    'published_at': entry['published_at'],
+                    'publisher_pid': entry['publisher_pid']
+                }
+                for name, entry in manifest.items()
+            }
+        }
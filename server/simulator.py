@@ -0,0 +1,216 @@
+from dataclasses import asdict, dataclass, replace
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from sweepline import concurrency_segments, merge_intervals
+
+# Credits per hour for one cluster of each standard warehouse size
+CREDITS_PER_HOUR = {
+    'XSMALL': 1, 'SMALL': 2, 'MEDIUM': 4, 'LARGE': 8, 'XLARGE': 16,
+    '2XLARGE': 32, '3XLARGE': 64, '4XLARGE': 128, '5XLARGE': 256, '6XLARGE': 512,
+}
+SIZE_ORDER = list(CREDITS_PER_HOUR)
+_SIZE_ALIASES = {'XXLARGE': '2XLARGE', 'XXXLARGE': '3XLARGE'}
+
+# Concurrent queries one cluster runs before new ones queue (MAX_CONCURRENCY_LEVEL default)
+SLOTS_PER_CLUSTER = 8
+# Every resume bills at least a minute
+MIN_BILLED_SECONDS = 60
+# AUTO_SUSPEND 0 (or NULL) means the warehouse is never suspended
+NEVER_SUSPEND = 0
+
+# Execution model: the share of a query that scales with warehouse size depends on how
+# much it scans; spilling queries also lose their spill penalty once memory doubles.
+LARGE_SCAN_BYTES = 1024 ** 3
+PARALLEL_FRACTION_LARGE_SCAN = 0.85
+PARALLEL_FRACTION_SMALL_SCAN = 0.4
+LOCAL_SPILL_PENALTY = 1.3
+REMOTE_SPILL_PENALTY = 2.0
+
+
+def normalize_size(size: Any) -> str:
+    """'X-Small' / 'xsmall' / 'XXLARGE' -> canonical CREDITS_PER_HOUR key"""
+    key = str(size or '').upper().replace('-', '').replace('_', '').replace(' ', '')
+    key = _SIZE_ALIASES.get(key, key)
+    if key not in CREDITS_PER_HOUR:
+        raise ValueError(f"Unknown warehouse size '{size}'")
+    return key
+
+
+@dataclass(frozen=True)
+class WarehouseConfig:
+    warehouse_size: str
+    auto_suspend: int
+    min_cluster_count: int = 1
+    max_cluster_count: int = 1
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> 'WarehouseConfig':
+        """Build from a row of index2's warehouses table (upper-case column names)"""
+        row = {str(k).upper(): v for k, v in row.items()}
+        auto_suspend = row.get('AUTO_SUSPEND')
+        return cls(
+            warehouse_size=normalize_size(row.get('WAREHOUSE_SIZE') or 'XSMALL'),
+            auto_suspend=NEVER_SUSPEND if pd.isna(auto_suspend) else int(auto_suspend),
+            min_cluster_count=int(row.get('MIN_CLUSTER_COUNT') or 1),
+            max_cluster_count=int(row.get('MAX_CLUSTER_COUNT') or 1)
+        )
+
+    def with_changes(self, changes: Dict[str, Any]) -> 'WarehouseConfig':
+        updated = replace(self, **{k: v for k, v in changes.items() if k in self.__dataclass_fields__ and v is not None})
+        updated = replace(updated,
+                          warehouse_size=normalize_size(updated.warehouse_size),
+                          auto_suspend=max(int(updated.auto_suspend), 0),
+                          min_cluster_count=max(int(updated.min_cluster_count), 1))
+        return replace(updated, max_cluster_count=max(int(updated.max_cluster_count), updated.min_cluster_count))
+
+    @property
+    def credits_per_hour(self) -> int:
+        return CREDITS_PER_HOUR[self.warehouse_size]
+
+
+@dataclass
+class Workload:
+    """One warehouse's queries as aligned arrays; times are seconds from the window start"""
+    arrival: np.ndarray
+    execution: np.ndarray
+    bytes_scanned: np.ndarray
+    spilled_local: np.ndarray
+    spilled_remote: np.ndarray
+    observed_queue: np.ndarray
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> 'Workload':
+        """From QUERY_HISTORY rows with end_time, execution_time, queued_overload_time (ms), bytes and spill"""
+        df = df.rename(columns=str.lower)
+        end = pd.to_datetime(df['end_time'], utc=True).to_numpy(dtype='datetime64[ms]').astype(np.int64) / 1000.0
+        execution = df['execution_time'].to_numpy(dtype=np.float64) / 1000.0
+        queued = df['queued_overload_time'].fillna(0).to_numpy(dtype=np.float64) / 1000.0
+        # A query was ready to run when it started queueing for capacity
+        arrival = end - execution - queued
+        origin = arrival.min() if len(arrival) else 0.0
+        return cls(
+            arrival=arrival - origin,
+            execution=execution,
+            bytes_scanned=df['bytes_scanned'].fillna(0).to_numpy(dtype=np.float64),
+            spilled_local=df['bytes_spilled_to_local_storage'].fillna(0).to_numpy(dtype=np.float64) > 0,
+            spilled_remote=df['bytes_spilled_to_remote_storage'].fillna(0).to_numpy(dtype=np.float64) > 0,
+            observed_queue=queued
+        )
+
+    def __len__(self):
+        return len(self.arrival)
+
+
+def scaled_execution(workload: Workload, current: WarehouseConfig, target: WarehouseConfig) -> np.ndarray:
+    """Execution seconds of every query at the target size"""
+    ratio = target.credits_per_hour / current.credits_per_hour
+    if ratio == 1:
+        return workload.execution
+    parallel = np.where(workload.bytes_scanned > LARGE_SCAN_BYTES,
+                        PARALLEL_FRACTION_LARGE_SCAN, PARALLEL_FRACTION_SMALL_SCAN)
+    execution = workload.execution * (parallel / ratio + (1 - parallel))
+
+    spill = np.ones(len(workload))
+    if ratio >= 2:
+        spill[workload.spilled_local] = LOCAL_SPILL_PENALTY
+        spill[workload.spilled_remote] = LOCAL_SPILL_PENALTY if ratio < 4 else REMOTE_SPILL_PENALTY
+        return execution / spill
+    if ratio < 1:
+        spill[workload.spilled_local | workload.spilled_remote] = LOCAL_SPILL_PENALTY
+        return execution * spill
+    return execution
+
+
+def simulate(workload: Workload, current: WarehouseConfig, target: WarehouseConfig) -> Dict[str, Any]:
+    """Credits and queueing for the workload on the target configuration"""
+    if len(workload) == 0:
+        return {'credits': 0.0, 'queue_seconds': 0.0, 'avg_execution_sec': 0.0, 'resumes': 0,
+                'cluster_hours': 0.0}
+    execution = scaled_execution(workload, current, target)
+    starts, ends = workload.arrival, workload.arrival + execution
+
+    _, levels, durations = concurrency_segments(starts, ends)
+    capacity = target.max_cluster_count * SLOTS_PER_CLUSTER
+    # Fluid approximation: demand beyond capacity waits, accruing queue query-seconds
+    queue_seconds = float(np.sum(np.maximum(levels - capacity, 0) * durations))
+
+    clusters = np.clip(np.ceil(levels / SLOTS_PER_CLUSTER), target.min_cluster_count, target.max_cluster_count)
+    extra_cluster_seconds = float(np.sum(np.where(levels > 0, clusters - target.min_cluster_count, 0) * durations))
+
+    if target.auto_suspend == NEVER_SUSPEND:
+        # One session from the first query to the last, idle gaps included
+        session_starts, session_ends = starts.min(keepdims=True), ends.max(keepdims=True)
+        awake = np.maximum(session_ends - session_starts, MIN_BILLED_SECONDS)
+    else:
+        # Runs closer together than auto_suspend share one resume; each session bills its idle tail
+        session_starts, session_ends = merge_intervals(starts, ends, gap=target.auto_suspend)
+        awake = np.maximum(session_ends + target.auto_suspend - session_starts, MIN_BILLED_SECONDS)
+    cluster_seconds = float(awake.sum()) * target.min_cluster_count + extra_cluster_seconds
+
+    return {
+        'credits': cluster_seconds / 3600.0 * target.credits_per_hour,
+        'queue_seconds': queue_seconds,
+        'avg_execution_sec': float(execution.mean()),
+        'resumes': int(len(session_starts)),
+        'cluster_hours': cluster_seconds / 3600.0
+    }
+
+
+def default_scenarios(current: WarehouseConfig) -> List[Dict[str, Any]]:
+    """One size down/up, a shorter and a longer auto-suspend, and one more cluster"""
+    index = SIZE_ORDER.index(current.warehouse_size)
+    scenarios = []
+    if index > 0:
+        scenarios.append({'name': 'size_down', 'warehouse_size': SIZE_ORDER[index - 1]})
+    if index < len(SIZE_ORDER) - 1:
+        scenarios.append({'name': 'size_up', 'warehouse_size': SIZE_ORDER[index + 1]})
+    scenarios.append({'name': 'auto_suspend_60', 'auto_suspend': 60})
+    scenarios.append({'name': 'auto_suspend_600', 'auto_suspend': 600})
+    scenarios.append({'name': 'extra_cluster', 'max_cluster_count': current.max_cluster_count + 1})
+    return scenarios
+
+
+def run_scenarios(workload: Workload, current: WarehouseConfig, scenarios: List[Dict[str, Any]],
+                  actual_credits: Optional[float] = None) -> Dict[str, Any]:
+    """Simulate every scenario and report deltas against the simulated current configuration.
+
+    When metered compute credits for the same window are known, all estimates are scaled by
+    actual / simulated-baseline so the model's bias cancels out of the absolute numbers too.
+    """
+    baseline = simulate(workload, current, current)
+    calibration = 1.0
+    if actual_credits and baseline['credits'] > 0:
+        calibration = actual_credits / baseline['credits']
+
+    def present(name: str, config: WarehouseConfig, result: Dict[str, Any]) -> Dict[str, Any]:
+        credits = result['credits'] * calibration
+        base_credits = baseline['credits'] * calibration
+        return {
+            'name': name,
+            'config': asdict(config),
+            'estimated_credits': round(credits, 4),
+            'credits_delta': round(credits - base_credits, 4),
+            'credits_delta_pct': round((credits - base_credits) * 100.0 / base_credits, 2) if base_credits else None,
+            'queue_seconds': round(result['queue_seconds'], 1),
+            'queue_delta_seconds': round(result['queue_seconds'] - baseline['queue_seconds'], 1),
+            'avg_execution_sec': round(result['avg_execution_sec'], 3),
+            'resumes': result['resumes']
+        }
+
+    results = []
+    for index, scenario in enumerate(scenarios):
+        config = current.with_changes(scenario)
+        results.append(present(scenario.get('name') or f'scenario_{index + 1}', config,
+                               simulate(workload, current, config)))
+
+    return {
+        'query_count': len(workload),
+        'observed_queue_seconds': round(float(workload.observed_queue.sum()), 1),
+        'calibration_factor': round(calibration, 4),
+        'baseline': present('current', current, baseline),
+        'scenarios': results
+    }
+
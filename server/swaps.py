@@ -0,0 +1,158 @@
+import logging
+import re
+from typing import Any, Callable, Dict, Iterable, List
+
+import pandas as pd
+from flask import jsonify, request
+
+from pruning import layout_statements
+from serialization import frame_records
+
+logger = logging.getLogger(__name__)
+
+# A rebuild writes <table>__STAGING and swaps it live; the replaced version is kept as <table>__PREVIOUS
+STAGING_SUFFIX = '__STAGING'
+PREVIOUS_SUFFIX = '__PREVIOUS'
+# Differ on every build, so they are left out when comparing versions
+VOLATILE_COLUMNS = ('LAST_UPDATED',)
+MAX_DIFF_SAMPLE = 200
+
+
+def staging_table(table_name: str) -> str:
+    return f"{table_name}{STAGING_SUFFIX}"
+
+
+def previous_table(table_name: str) -> str:
+    return f"{table_name}{PREVIOUS_SUFFIX}"
+
+
+def swap_statements(table_name: str) -> List[str]:
+    """Publish the staging table atomically and keep the version it replaces"""
+    staging, previous = staging_table(table_name), previous_table(table_name)
+    return [
+        # SWAP needs both sides; on the first build the live table is an empty placeholder
+        f"CREATE TABLE IF NOT EXISTS {table_name} LIKE {staging}",
+        f"ALTER TABLE {table_name} SWAP WITH {staging}",
+        f"DROP TABLE IF EXISTS {previous}",
+        f"ALTER TABLE {staging} RENAME TO {previous}",
+    ]
+
+
+def staged_statements(table_name: str, create_sql: str) -> List[str]:
+    """A CREATE OR REPLACE builder retargeted at the staging table, its layout, then the swap"""
+    staging = staging_table(table_name)
+    pattern = re.compile(rf'(CREATE\s+OR\s+REPLACE\s+TABLE\s+){re.escape(table_name)}\b', re.IGNORECASE)
+    staged, count = pattern.subn(rf'\g<1>{staging}', create_sql, count=1)
+    if not count:
+        raise ValueError(f"Builder for {table_name} does not create {table_name}")
+    return [staged] + layout_statements(table_name, staging) + swap_statements(table_name)
+
+
+def run_fenced(coordinator, lease, statements: Iterable[str], execute_query: Callable[..., Any]):
+    """A table's staged statements in order, re-checking the lease before each one after the build.
+
+    A lease that lapsed during a long build must not swap over a newer holder's table.
+    """
+    for position, statement in enumerate(statements):
+        if position:
+            coordinator.ensure_held(lease)
+        execute_query(statement)
+
+
+def rollback_statement(table_name: str) -> str:
+    """Swap the previous version back in; running it again restores the rolled-back version"""
+    return f"ALTER TABLE {table_name} SWAP WITH {previous_table(table_name)}"
+
+
+def _quoted(columns: Iterable[str]) -> str:
+    return ', '.join('"' + column.replace('"', '""') + '"' for column in columns)
+
+
+def table_versions(execute_query: Callable[..., pd.DataFrame], table_name: str) -> Dict[str, Dict[str, Any]]:
+    """created_on, rows and bytes of the live, staging and previous tables that exist"""
+    df = execute_query(f"SHOW TABLES LIKE '{table_name}%'")
+    df.columns = [c.lower() for c in df.columns]
+    names = {table_name: 'live', staging_table(table_name): 'staging', previous_table(table_name): 'previous'}
+    return {
+        names[row['name']]: {'table': row['name'], 'created_on': str(row['created_on']),
+                             'rows': int(row['rows']), 'bytes': int(row['bytes'])}
+        for _, row in df.iterrows() if row['name'] in names
+    }
+
+
+def table_diff(execute_query: Callable[..., pd.DataFrame], table_name: str, limit: int = 20) -> Dict[str, Any]:
+    """Schema changes, row counts and sample rows added or removed between previous and live"""
+    versions = table_versions(execute_query, table_name)
+    if 'live' not in versions or 'previous' not in versions:
+        raise LookupError(f"{table_name} has no previous version to compare with")
+    previous = previous_table(table_name)
+    live_columns = list(execute_query(f"SELECT * FROM {table_name} LIMIT 0").columns)
+    previous_columns = list(execute_query(f"SELECT * FROM {previous} LIMIT 0").columns)
+    common = [c for c in live_columns if c in previous_columns and c.upper() not in VOLATILE_COLUMNS]
+    columns = _quoted(common)
+    added = f"SELECT {columns} FROM {table_name} EXCEPT SELECT {columns} FROM {previous}"
+    removed = f"SELECT {columns} FROM {previous} EXCEPT SELECT {columns} FROM {table_name}"
+
+    counts = execute_query(f"""
+    SELECT
+        (SELECT COUNT(*) FROM ({added})) as added_rows,
+        (SELECT COUNT(*) FROM ({removed})) as removed_rows
+    """)
+    counts.columns = [c.lower() for c in counts.columns]
+    limit = min(max(int(limit), 0), MAX_DIFF_SAMPLE)
+    return {
+        'table': table_name,
+        'versions': versions,
+        'columns_added': [c for c in live_columns if c not in previous_columns],
+        'columns_removed': [c for c in previous_columns if c not in live_columns],
+        'compared_columns': common,
+        # Distinct rows over the compared columns
+        'added_rows': int(counts['added_rows'].iloc[0]),
+        'removed_rows': int(counts['removed_rows'].iloc[0]),
+        'added_sample': execute_query(f"{added} LIMIT {limit}") if limit else pd.DataFrame(columns=common),
+        'removed_sample': execute_query(f"{removed} LIMIT {limit}") if limit else pd.DataFrame(columns=common),
+    }
+
+
+def register_swap_routes(app, get_execute_query: Callable[[], Callable[..., pd.DataFrame]], tables: Iterable[str],
+                         coordinator, on_swapped: Callable[[str], Any]):
+    """Expose rollback and diff of the previous version for each swapped table"""
+    known = {table.upper() for table in tables}
+
+    def rollback(table_name: str):
+        table_name = table_name.upper()
+        if table_name not in known:
+            return jsonify({'error': f"Unknown table '{table_name}'"}), 404
+        try:
+            execute_query = get_execute_query()
+            if 'previous' not in table_versions(execute_query, table_name):
+                return jsonify({'error': f"{table_name} has no previous version"}), 409
+            # Under the table's lease so a rollback cannot interleave with a rebuild's swap
+            coordinator.run(table_name, lambda lease: execute_query(rollback_statement(table_name)), coalesce=False)
+            on_swapped(table_name)
+            logger.warning(f"Rolled back {table_name} to its previous version")
+            return jsonify({'status': 'rolled_back', 'table': table_name,
+                            'versions': table_versions(execute_query, table_name)})
+        except Exception as e:
+            logger.error(f"Rollback of {table_name} failed: {e}")
+            return jsonify({'error': str(e)}), 500
+
+    def diff(table_name: str):
+        table_name = table_name.upper()
+        if table_name not in known:
+            return jsonify({'error': f"Unknown table '{table_name}'"}), 404
+        try:
+            result = table_diff(get_execute_query(), table_name, int(request.args.get('limit', 20)))
+        except LookupError as e:
+            return jsonify({'error': str(e)}), 404
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+        result['added_sample'] = frame_records(result['added_sample'])
+        result['removed_sample'] = frame_records(result['removed_sample'])
+        return jsonify(result)
+
+    app.add_url_rule('/api/swaps/<table_name>/rollback', 'rollback_table', rollback, methods=['POST'])
+    app.add_url_rule('/api/swaps/<table_name>/diff', 'diff_table', diff, methods=['GET'])
+    return app
@@ -0,0 +1,190 @@
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# Histogram resolution: one bucket per minute
+RESOLUTION_SECONDS = 60
+
+
+def concurrency_segments(starts: np.ndarray, ends: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sweep line over [start, end) intervals.
+
+    Returns the event times and, for each segment between consecutive events, the number of
+    running intervals and the segment length.
+    """
+    times = np.concatenate((starts, ends))
+    deltas = np.concatenate((np.ones(len(starts), dtype=np.int64), -np.ones(len(ends), dtype=np.int64)))
+    # Ends sort before starts at the same instant so back-to-back intervals do not overlap
+    order = np.lexsort((deltas, times))
+    times, levels = times[order], np.cumsum(deltas[order])
+    return times, levels[:-1], np.diff(times)
+
+
+def merge_intervals(starts: np.ndarray, ends: np.ndarray, gap: float = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """Union of intervals; runs separated by no more than `gap` seconds are merged too"""
+    if len(starts) == 0:
+        return starts, ends
+    order = np.argsort(starts, kind='mergesort')
+    starts, ends = starts[order], np.maximum.accumulate(ends[order])
+    new_run = np.empty(len(starts), dtype=bool)
+    new_run[0] = True
+    new_run[1:] = starts[1:] > ends[:-1] + gap
+    first = np.flatnonzero(new_run)
+    last = np.concatenate((first[1:] - 1, [len(starts) - 1]))
+    return starts[first], ends[last]
+
+
+class UtilizationProfile:
+    """Busy/idle time and per-minute concurrency of one warehouse, fed in start-sorted chunks.
+
+    Each chunk is swept up to its last start time; intervals still running there are carried
+    into the next chunk, so memory stays bounded by the chunk size plus peak concurrency.
+    """
+
+    def __init__(self, window_start: float, window_end: float, resolution: int = RESOLUTION_SECONDS):
+        self.resolution = resolution
+        self.window_start = float(window_start) - float(window_start) % resolution
+        self.window_end = float(window_end)
+        buckets = int(np.ceil((self.window_end - self.window_start) / resolution))
+        self.area = np.zeros(buckets)
+        self.busy = np.zeros(buckets)
+        self.peak = np.zeros(buckets, dtype=np.int64)
+        self.level_seconds = np.zeros(1)
+        self.interval_count = 0
+        self.busy_periods = 0
+        self._cursor = self.window_start
+        self._running = 0
+        self._carry = (np.empty(0), np.empty(0))
+
+    def add(self, starts: np.ndarray, ends: np.ndarray):
+        """Add intervals (epoch seconds) whose starts are sorted and not before earlier chunks"""
+        starts = np.maximum(np.asarray(starts, dtype=np.float64), self._cursor)
+        ends = np.minimum(np.asarray(ends, dtype=np.float64), self.window_end)
+        keep = ends > starts
+        starts, ends = starts[keep], ends[keep]
+        if len(starts) == 0:
+            return
+        self.interval_count += len(starts)
+        self._sweep(np.concatenate((self._carry[0], starts)), np.concatenate((self._carry[1], ends)),
+                    float(starts[-1]))
+
+    def finish(self) -> 'UtilizationProfile':
+        self._sweep(*self._carry, self.window_end)
+        return self
+
+    def _sweep(self, starts: np.ndarray, ends: np.ndarray, until: float):
+        running = ends > until
+        self._carry = (np.maximum(starts[running], until), ends[running])
+        ends = np.minimum(ends, until)
+        keep = ends > starts
+        if keep.any():
+            self._accumulate(*concurrency_segments(starts[keep], ends[keep]))
+        # A busy period continues into the next chunk only if something started before until is still
+        # running; an interval starting exactly at until opens a new period unless one is already open
+        self._running = int(np.count_nonzero(starts[running] < until))
+        self._cursor = until
+
+    def _accumulate(self, times: np.ndarray, levels: np.ndarray, durations: np.ndarray):
+        # Cumulative query-seconds and busy seconds at every event, interpolated at bucket edges
+        area = np.concatenate(([0.0], np.cumsum(levels * durations)))
+        busy = np.concatenate(([0.0], np.cumsum((levels > 0) * durations)))
+        first = int((times[0] - self.window_start) // self.resolution)
+        last = min(int(np.ceil((times[-1] - self.window_start) / self.resolution)), len(self.area))
+        edges = self.window_start + np.arange(first, last + 1) * self.resolution
+        self.area[first:last] += np.diff(np.interp(edges, times, area))
+        self.busy[first:last] += np.diff(np.interp(edges, times, busy))
+
+        # Peak per bucket: the level at its left edge or any level entered inside it
+        index = np.searchsorted(times, edges[:-1], side='right') - 1
+        inside = (index >= 0) & (index < len(levels))
+        np.maximum.at(self.peak, np.arange(first, last)[inside], levels[index[inside]])
+        moving = durations > 0
+        buckets = np.minimum(((times[:-1][moving] - self.window_start) // self.resolution).astype(np.int64),
+                             len(self.peak) - 1)
+        np.maximum.at(self.peak, buckets, levels[moving])
+
+        if len(self.level_seconds) <= levels.max():
+            self.level_seconds = np.pad(self.level_seconds, (0, int(levels.max()) + 1 - len(self.level_seconds)))
+        self.level_seconds += np.bincount(levels, weights=durations, minlength=len(self.level_seconds))
+
+        busy_levels = levels[moving] > 0
+        previous = np.concatenate(([self._running > 0], busy_levels[:-1]))
+        self.busy_periods += int(np.count_nonzero(busy_levels & ~previous))
+
+    def hourly(self, metered_credits: Optional[pd.Series] = None,
+               credits_per_hour: Optional[float] = None) -> pd.DataFrame:
+        """Busy seconds and concurrency per hour, with idle-but-billed time when metering is given.
+
+        metered_credits is WAREHOUSE_METERING_HISTORY compute credits indexed by hour start.
+        Billed seconds are credits / credits_per_hour * 3600 when the warehouse size is known,
+        otherwise any hour with credits counts as fully billed.
+        """
+        minutes = pd.DataFrame({'busy_seconds': self.busy, 'query_seconds': self.area, 'peak_concurrency': self.peak},
+                               index=pd.to_datetime(self.window_start + np.arange(len(self.busy)) * self.resolution,
+                                                    unit='s'))
+        hours = minutes.resample('h').agg({'busy_seconds': 'sum', 'query_seconds': 'sum', 'peak_concurrency': 'max'})
+        hours['avg_concurrency'] = hours['query_seconds'] / 3600.0
+        if metered_credits is None:
+            return hours
+
+        credits = metered_credits.reindex(hours.index, fill_value=0.0).astype(float)
+        if credits_per_hour:
+            billed = np.minimum(credits / credits_per_hour * 3600.0, 3600.0)
+        else:
+            billed = np.where(credits > 0, 3600.0, 0.0)
+        hours['metered_credits'] = credits
+        hours['billed_seconds'] = billed
+        hours['idle_billed_seconds'] = np.maximum(billed - hours['busy_seconds'], 0.0)
+        hours['idle_billed_credits'] = np.where(billed > 0, credits * hours['idle_billed_seconds'] / billed, 0.0)
+        return hours
+
+    def summary(self, hourly: Optional[pd.DataFrame] = None) -> Dict[str, Any]:
+        total = self.window_end - self.window_start
+        busy = float(self.busy.sum())
+        result = {
+            'window_start': pd.Timestamp(self.window_start, unit='s').isoformat(),
+            'window_end': pd.Timestamp(self.window_end, unit='s').isoformat(),
+            'interval_count': self.interval_count,
+            'busy_periods': self.busy_periods,
+            'busy_seconds': busy,
+            'idle_seconds': max(total - busy, 0.0),
+            'utilization_pct': round(busy * 100.0 / total, 2) if total > 0 else None,
+            'avg_concurrency_when_busy': round(float(self.area.sum()) / busy, 3) if busy else 0.0,
+            'peak_concurrency': int(self.peak.max()) if len(self.peak) else 0,
+            'seconds_at_concurrency': {int(level): round(float(seconds), 1)
+                                       for level, seconds in enumerate(self.level_seconds) if seconds > 0}
+        }
+        if hourly is not None and 'idle_billed_seconds' in hourly:
+            result['billed_seconds'] = float(hourly['billed_seconds'].sum())
+            result['idle_billed_seconds'] = float(hourly['idle_billed_seconds'].sum())
+            result['idle_billed_credits'] = round(float(hourly['idle_billed_credits'].sum()), 4)
+            result['metered_credits'] = round(float(hourly['metered_credits'].sum()), 4)
+        return result
+
+
+def epoch_seconds(values: Iterable) -> np.ndarray:
+    """Timestamps (naive values are taken as UTC) to float epoch seconds"""
+    return pd.to_datetime(pd.Series(values), utc=True).to_numpy(dtype='datetime64[ms]').astype(np.int64) / 1000.0
+
+
+def profile_batches(batches: Iterable[pd.DataFrame], window_start: float, window_end: float,
+                    resolution: int = RESOLUTION_SECONDS) -> Dict[str, UtilizationProfile]:
+    """Profiles per warehouse from chunks of (warehouse_name, start_time, end_time) rows
+    ordered by warehouse_name, start_time"""
+    profiles: Dict[str, UtilizationProfile] = {}
+    for batch in batches:
+        batch = batch.rename(columns=str.lower)
+        names = batch['warehouse_name'].to_numpy()
+        starts, ends = epoch_seconds(batch['start_time']), epoch_seconds(batch['end_time'])
+        bounds = np.flatnonzero(names[1:] != names[:-1]) + 1
+        for lo, hi in zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [len(names)]))):
+            if hi <= lo:
+                continue
+            profile = profiles.get(names[lo])
+            if profile is None:
+                profile = profiles[names[lo]] = UtilizationProfile(window_start, window_end, resolution)
+            profile.add(starts[lo:hi], ends[lo:hi])
+    for profile in profiles.values():
+        profile.finish()
+    return profiles
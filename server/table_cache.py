@@ -0,0 +1,970 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+import snowflake.connector
+
+from anchors import anchor_params, render
+from downsample import METHODS, downsample
+from metering import MeteringHistoryCache, series_points
+from metrics import instrument_connector, record_cache_lookup, record_dataframe_build, statement_scope
+from query_filters import Condition, apply_to_frame, equality_conditions, frame_schema, parse_filter, parse_sort
+from refresh_lock import RefreshInProgress, coordinator_from_env
+from replay import install_replay
+from response_cache import ResponseCache
+from self_cost import statement_params
+from serialization import dumps, frame_payload, frame_records
+from shared_cache import SharedTableCache
+from simulator import WarehouseConfig, Workload, default_scenarios, run_scenarios
+from table_schemas import frame_fields
+
+# The index2 table cache and the request handling behind its API, shared by the Flask app
+# (index2.py) and the asyncio one (asgi.py) without creating either
+logger = logging.getLogger(__name__)
+
+# Snowflake Configuration
+SNOWFLAKE_CONFIG = {
+    'user': os.getenv('SNOWFLAKE_USER', 'your_user'),
+    'password': os.getenv('SNOWFLAKE_PASSWORD', 'your_password'),
+    'account': os.getenv('SNOWFLAKE_ACCOUNT', 'your_account'),
+    'warehouse': os.getenv('SNOWFLAKE_WAREHOUSE', 'COMPUTE_WH'),
+    'database': os.getenv('SNOWFLAKE_DATABASE', 'SNOWFLAKE'),
+    'schema': os.getenv('SNOWFLAKE_SCHEMA', 'ACCOUNT_USAGE'),
+    'role': os.getenv('SNOWFLAKE_ROLE', 'ACCOUNTADMIN')
+}
+
+@dataclass
+class QueryConfig:
+    name: str
+    sql: str
+    description: str
+
+class SnowflakeConnector:
+    def __init__(self, config: Dict[str, str]):
+        self.config = config
+        self.connection = None
+    
+    def connect(self):
+        try:
+            self.connection = snowflake.connector.connect(**self.config)
+            logger.info("Successfully connected to Snowflake")
+            return True
+        except Exception as e:
+            logger.error(f"Failed to connect to Snowflake: {e}")
+            return False
+    
+    def execute_query(self, query: str, params: Dict = None) -> pd.DataFrame:
+        if not self.connection:
+            if not self.connect():
+                raise Exception("Cannot establish Snowflake connection")
+        
+        try:
+            cursor = self.connection.cursor()
+            cursor.execute(query, params or None, _statement_params=statement_params('index2', query))
+            
+            # Fetch column names
+            columns = [desc[0] for desc in cursor.description]
+            
+            # Fetch all rows
+            rows = cursor.fetchall()
+            
+            # Create DataFrame
+            build_started = time.perf_counter()
+            df = pd.DataFrame(rows, columns=columns)
+            record_dataframe_build('index2', time.perf_counter() - build_started)
+            
+            cursor.close()
+            return df
+            
+        except Exception as e:
+            logger.error(f"Query execution failed: {e}")
+            raise e
+    
+    def close(self):
+        if self.connection:
+            self.connection.close()
+
+# Initialize Snowflake connector
+sf_connector = instrument_connector(install_replay(SnowflakeConnector(SNOWFLAKE_CONFIG)), 'index2')
+
+# Hourly credits per warehouse for time-series charts, appended incrementally
+metering_cache = MeteringHistoryCache(lambda query, params=None: sf_connector.execute_query(query, params))
+
+# Per-warehouse query workloads for the what-if simulator, keyed by (warehouse, days). Each holds
+# several arrays per query, so only a few recent ones are kept and expired ones are dropped on use.
+WORKLOAD_TTL_SECONDS = 900
+WORKLOAD_CACHE_ENTRIES = int(os.getenv('FINOPS_WORKLOAD_CACHE_ENTRIES', '4'))
+workload_cache: "OrderedDict[tuple, tuple]" = OrderedDict()
+workload_lock = threading.Lock()
+
+# Query Definitions; executed with anchor_params(), so literal % is written %%
+QUERIES = {
+    'warehouses': QueryConfig(
+        name='Warehouse Analytics',
+        sql="""
+        WITH warehouse_metrics AS (
+            SELECT 
+                wm.WAREHOUSE_NAME,
+                wm.WAREHOUSE_ID,
+                wh.WAREHOUSE_SIZE,
+                wh.AUTO_SUSPEND,
+                wh.AUTO_RESUME,
+                wh.MIN_CLUSTER_COUNT,
+                wh.MAX_CLUSTER_COUNT,
+                wh.SCALING_POLICY,
+                wh.RESOURCE_MONITOR,
+                -- Credit Usage (Last 3 Days)
+                ROUND(SUM(wm.CREDITS_USED), 2) as TOTAL_CREDITS_USED,
+                ROUND(SUM(wm.CREDITS_USED_COMPUTE), 2) as CREDITS_USED_COMPUTE,
+                ROUND(SUM(wm.CREDITS_USED_CLOUD_SERVICES), 2) as CREDITS_USED_CLOUD_SERVICES,
+                
+                -- Query Performance Buckets
+                COUNT(CASE WHEN qh.TOTAL_ELAPSED_TIME <= 1000 THEN 1 END) as QUERIES_0_TO_1_SEC,
+                COUNT(CASE WHEN qh.TOTAL_ELAPSED_TIME > 1000 AND qh.TOTAL_ELAPSED_TIME <= 10000 THEN 1 END) as QUERIES_1_TO_10_SEC,
+                COUNT(CASE WHEN qh.TOTAL_ELAPSED_TIME > 10000 AND qh.TOTAL_ELAPSED_TIME <= 30000 THEN 1 END) as QUERIES_10_TO_30_SEC,
+                COUNT(CASE WHEN qh.TOTAL_ELAPSED_TIME > 30000 AND qh.TOTAL_ELAPSED_TIME <= 60000 THEN 1 END) as QUERIES_30_TO_60_SEC,
+                COUNT(CASE WHEN qh.TOTAL_ELAPSED_TIME > 60000 AND qh.TOTAL_ELAPSED_TIME <= 300000 THEN 1 END) as QUERIES_1_TO_5_MIN,
+                COUNT(CASE WHEN qh.TOTAL_ELAPSED_TIME > 300000 AND qh.TOTAL_ELAPSED_TIME <= 900000 THEN 1 END) as QUERIES_5_TO_15_MIN,
+                COUNT(CASE WHEN qh.TOTAL_ELAPSED_TIME > 900000 THEN 1 END) as QUERIES_15_MIN_PLUS,
+                
+                -- Bad Practice Categories
+                COUNT(CASE WHEN qh.BYTES_SPILLED_TO_LOCAL_STORAGE > 0 OR qh.BYTES_SPILLED_TO_REMOTE_STORAGE > 0 THEN 1 END) as SPILLED_QUERIES,
+                COUNT(CASE WHEN qh.EXECUTION_STATUS = 'FAIL' THEN 1 END) as FAILED_QUERIES,
+                COUNT(CASE WHEN qh.ROWS_PRODUCED = 0 AND qh.EXECUTION_STATUS = 'SUCCESS' THEN 1 END) as ZERO_RESULT_QUERIES,
+                COUNT(CASE WHEN qh.COMPILATION_TIME > 5000 THEN 1 END) as HIGH_COMPILE_TIME,
+                COUNT(CASE WHEN qh.TRANSACTION_BLOCKED_TIME > 0 THEN 1 END) as BLOCKED_TRANSACTION_QUERIES,
+                
+                -- Utilization Metrics
+                ROUND(AVG(CASE WHEN wl.AVG_RUNNING > 0 THEN (wl.AVG_RUNNING / GREATEST(wh.MAX_CLUSTER_COUNT, 1)) * 100 ELSE 0 END), 2) as AVG_UTILIZATION_PERCENT,
+                
+                -- Core Metrics
+                COUNT(qh.QUERY_ID) as TOTAL_QUERIES,
+                COUNT(DISTINCT qh.DATABASE_NAME) as UNIQUE_DATABASES_ACCESSED,
+                COUNT(DISTINCT qh.USER_NAME) as UNIQUE_USERS,
+                COUNT(DISTINCT DATE(qh.START_TIME)) as ACTIVE_DAYS_COUNT,
+                ROUND(AVG(qh.TOTAL_ELAPSED_TIME), 2) as AVG_EXECUTION_TIME_MS,
+                ROUND(SUM(qh.BYTES_SCANNED) / (1024*1024*1024), 2) as TOTAL_DATA_SCANNED_GB
+                
+            FROM SNOWFLAKE.ACCOUNT_USAGE.WAREHOUSE_METERING_HISTORY wm
+            LEFT JOIN SNOWFLAKE.ACCOUNT_USAGE.WAREHOUSES wh ON wm.WAREHOUSE_ID = wh.WAREHOUSE_ID
+            LEFT JOIN SNOWFLAKE.ACCOUNT_USAGE.QUERY_HISTORY qh ON wm.WAREHOUSE_ID = qh.WAREHOUSE_ID 
+                AND qh.START_TIME >= DATEADD(day, -3, %(anchor)s::TIMESTAMP_TZ)
+            LEFT JOIN SNOWFLAKE.ACCOUNT_USAGE.WAREHOUSE_LOAD_HISTORY wl ON wm.WAREHOUSE_ID = wl.WAREHOUSE_ID
+                AND wl.START_TIME >= DATEADD(day, -3, %(anchor)s::TIMESTAMP_TZ)
+            WHERE wm.START_TIME >= DATEADD(day, -3, %(anchor)s::TIMESTAMP_TZ)
+                AND wh.DELETED IS NULL
+            GROUP BY 1,2,3,4,5,6,7,8,9
+            ORDER BY TOTAL_CREDITS_USED DESC
+        """,
+        description='Comprehensive warehouse analytics with performance metrics and bad practices'
+    ),
+    
+    'users': QueryConfig(
+        name='User Analytics',
+        sql="""
+        WITH user_metrics AS (
+            SELECT 
+                u.NAME as USER_NAME,
+                u.USER_ID,
+                u.LOGIN_NAME,
+                u.EMAIL,
+                u.DEFAULT_WAREHOUSE,
+                u.DEFAULT_ROLE,
+                u.DISABLED,
+                u.LAST_SUCCESS_LOGIN,
+                u.TYPE as USER_TYPE,
+                
+                -- Credit Usage (Last 3 Days) - Aggregated from Query Level
+                ROUND(SUM(COALESCE(qh.CREDITS_USED_CLOUD_SERVICES, 0)), 2) as TOTAL_CREDITS_CONSUMED,
+                
+                -- Query Performance Buckets
+                COUNT(CASE WHEN qh.TOTAL_ELAPSED_TIME <= 1000 THEN 1 END) as QUERIES_0_TO_1_SEC,
+                COUNT(CASE WHEN qh.TOTAL_ELAPSED_TIME > 1000 AND qh.TOTAL_ELAPSED_TIME <= 10000 THEN 1 END) as QUERIES_1_TO_10_SEC,
+                COUNT(CASE WHEN qh.TOTAL_ELAPSED_TIME > 10000 AND qh.TOTAL_ELAPSED_TIME <= 30000 THEN 1 END) as QUERIES_10_TO_30_SEC,
+                COUNT(CASE WHEN qh.TOTAL_ELAPSED_TIME > 30000 AND qh.TOTAL_ELAPSED_TIME <= 60000 THEN 1 END) as QUERIES_30_TO_60_SEC,
+                COUNT(CASE WHEN qh.TOTAL_ELAPSED_TIME > 60000 AND qh.TOTAL_ELAPSED_TIME <= 300000 THEN 1 END) as QUERIES_1_TO_5_MIN,
+                COUNT(CASE WHEN qh.TOTAL_ELAPSED_TIME > 300000 AND qh.TOTAL_ELAPSED_TIME <= 900000 THEN 1 END) as QUERIES_5_TO_15_MIN,
+                COUNT(CASE WHEN qh.TOTAL_ELAPSED_TIME > 900000 THEN 1 END) as QUERIES_15_MIN_PLUS,
+                
+                -- Bad Practice Categories
+                COUNT(CASE WHEN UPPER(qh.QUERY_TEXT) LIKE '%%SELECT *%%' THEN 1 END) as SELECT_STAR_QUERIES,
+                COUNT(CASE WHEN qh.BYTES_SPILLED_TO_LOCAL_STORAGE > 0 OR qh.BYTES_SPILLED_TO_REMOTE_STORAGE > 0 THEN 1 END) as SPILLED_QUERIES,
+                COUNT(CASE WHEN qh.EXECUTION_STATUS = 'FAIL' THEN 1 END) as FAILED_QUERIES,
+                COUNT(CASE WHEN qh.ROWS_PRODUCED = 0 AND qh.EXECUTION_STATUS = 'SUCCESS' THEN 1 END) as ZERO_RESULT_QUERIES,
+                COUNT(CASE WHEN qh.COMPILATION_TIME > 5000 THEN 1 END) as HIGH_COMPILE_TIME,
+                COUNT(CASE WHEN qh.PARTITIONS_SCANNED = qh.PARTITIONS_TOTAL AND qh.PARTITIONS_TOTAL > 100 THEN 1 END) as UNPARTITIONED_SCANS,
+                COUNT(CASE WHEN qh.TRANSACTION_BLOCKED_TIME > 0 THEN 1 END) as BLOCKED_TRANSACTION_QUERIES,
+                
+                -- Core Metrics
+                COUNT(qh.QUERY_ID) as TOTAL_QUERIES,
+                COUNT(DISTINCT qh.WAREHOUSE_NAME) as UNIQUE_WAREHOUSES_USED,
+                COUNT(DISTINCT qh.DATABASE_NAME) as UNIQUE_DATABASES_ACCESSED,
+                COUNT(DISTINCT DATE(qh.START_TIME)) as ACTIVE_DAYS_COUNT,
+                ROUND(AVG(qh.TOTAL_ELAPSED_TIME), 2) as AVG_EXECUTION_TIME_MS,
+                ROUND(SUM(qh.BYTES_SCANNED) / (1024*1024*1024), 2) as TOTAL_DATA_SCANNED_GB,
+                
+                -- Repeated Queries Detection
+                COUNT(CASE WHEN repeat_check.QUERY_COUNT > 1 THEN 1 END) as REPEATED_QUERIES
+                
+            FROM SNOWFLAKE.ACCOUNT_USAGE.USERS u
+            LEFT JOIN SNOWFLAKE.ACCOUNT_USAGE.QUERY_HISTORY qh ON u.NAME = qh.USER_NAME 
+                AND qh.START_TIME >= DATEADD(day, -3, %(anchor)s::TIMESTAMP_TZ)
+            LEFT JOIN (
+                SELECT QUERY_HASH, USER_NAME, COUNT(*) as QUERY_COUNT
+                FROM SNOWFLAKE.ACCOUNT_USAGE.QUERY_HISTORY
+                WHERE START_TIME >= DATEADD(day, -3, %(anchor)s::TIMESTAMP_TZ)
+                    AND QUERY_HASH IS NOT NULL
+                GROUP BY QUERY_HASH, USER_NAME
+            ) repeat_check ON qh.QUERY_HASH = repeat_check.QUERY_HASH AND qh.USER_NAME = repeat_check.USER_NAME
+            WHERE u.DELETED_ON IS NULL
+            GROUP BY 1,2,3,4,5,6,7,8,9
+            ORDER BY TOTAL_QUERIES DESC
+        """,
+        description='User analytics with bad practices and performance metrics'
+    ),
+    
+    'queries': QueryConfig(
+        name='Query Analytics',
+        sql="""
+        SELECT 
+            qh.QUERY_ID,
+            qh.QUERY_TEXT,
+            qh.USER_NAME,
+            qh.ROLE_NAME,
+            qh.WAREHOUSE_NAME,
+            qh.WAREHOUSE_SIZE,
+            qh.DATABASE_NAME,
+            qh.SCHEMA_NAME,
+            qh.QUERY_TYPE,
+            qh.EXECUTION_STATUS,
+            qh.ERROR_CODE,
+            qh.ERROR_MESSAGE,
+            qh.START_TIME,
+            qh.END_TIME,
+            qh.TOTAL_ELAPSED_TIME,
+            qh.COMPILATION_TIME,
+            qh.EXECUTION_TIME,
+            qh.QUEUED_PROVISIONING_TIME,
+            qh.QUEUED_REPAIR_TIME,
+            qh.QUEUED_OVERLOAD_TIME,
+            qh.TRANSACTION_BLOCKED_TIME,
+            
+            -- Performance Metrics
+            ROUND(qh.BYTES_SCANNED / (1024*1024*1024), 4) as BYTES_SCANNED_GB,
+            qh.PERCENTAGE_SCANNED_FROM_CACHE,
+            ROUND(qh.BYTES_WRITTEN / (1024*1024*1024), 4) as BYTES_WRITTEN_GB,
+            qh.ROWS_PRODUCED,
+            qh.ROWS_INSERTED,
+            qh.ROWS_UPDATED,
+            qh.ROWS_DELETED,
+            qh.PARTITIONS_SCANNED,
+            qh.PARTITIONS_TOTAL,
+            
+            -- Spill Detection
+            ROUND(qh.BYTES_SPILLED_TO_LOCAL_STORAGE / (1024*1024*1024), 4) as BYTES_SPILLED_LOCAL_GB,
+            ROUND(qh.BYTES_SPILLED_TO_REMOTE_STORAGE / (1024*1024*1024), 4) as BYTES_SPILLED_REMOTE_GB,
+            
+            -- Credits
+            ROUND(COALESCE(qh.CREDITS_USED_CLOUD_SERVICES, 0), 4) as CREDITS_USED_CLOUD_SERVICES,
+            
+            -- Performance Categories
+            CASE 
+                WHEN qh.TOTAL_ELAPSED_TIME <= 1000 THEN '0-1 SEC'
+                WHEN qh.TOTAL_ELAPSED_TIME <= 10000 THEN '1-10 SEC'
+                WHEN qh.TOTAL_ELAPSED_TIME <= 30000 THEN '10-30 SEC'
+                WHEN qh.TOTAL_ELAPSED_TIME <= 60000 THEN '30-60 SEC'
+                WHEN qh.TOTAL_ELAPSED_TIME <= 300000 THEN '1-5 MIN'
+                WHEN qh.TOTAL_ELAPSED_TIME <= 900000 THEN '5-15 MIN'
+                ELSE '15+ MIN'
+            END as PERFORMANCE_BUCKET,
+            
+            -- Bad Practice Flags
+            CASE WHEN UPPER(qh.QUERY_TEXT) LIKE '%%SELECT *%%' THEN 1 ELSE 0 END as IS_SELECT_STAR,
+            CASE WHEN qh.BYTES_SPILLED_TO_LOCAL_STORAGE > 0 OR qh.BYTES_SPILLED_TO_REMOTE_STORAGE > 0 THEN 1 ELSE 0 END as HAS_SPILL,
+            CASE WHEN qh.PARTITIONS_SCANNED = qh.PARTITIONS_TOTAL AND qh.PARTITIONS_TOTAL > 100 THEN 1 ELSE 0 END as IS_FULL_TABLE_SCAN,
+            CASE WHEN qh.COMPILATION_TIME > 5000 THEN 1 ELSE 0 END as HAS_HIGH_COMPILE_TIME,
+            CASE WHEN qh.ROWS_PRODUCED = 0 AND qh.EXECUTION_STATUS = 'SUCCESS' THEN 1 ELSE 0 END as IS_ZERO_RESULT,
+            
+            qh.QUERY_HASH,
+            qh.QUERY_HASH_VERSION
+            
+        FROM SNOWFLAKE.ACCOUNT_USAGE.QUERY_HISTORY qh
+        WHERE qh.START_TIME >= DATEADD(day, -3, %(anchor)s::TIMESTAMP_TZ)
+        ORDER BY qh.START_TIME DESC
+        LIMIT 10000
+        """,
+        description='Detailed query analytics with performance categorization'
+    ),
+    
+    'query_details': QueryConfig(
+        name='Query Detail Analytics',
+        sql="""
+        WITH query_performance AS (
+            SELECT 
+                qh.QUERY_ID,
+                qh.QUERY_TEXT,
+                qh.USER_NAME,
+                qh.WAREHOUSE_NAME,
+                qh.DATABASE_NAME,
+                qh.SCHEMA_NAME,
+                qh.START_TIME,
+                qh.END_TIME,
+                qh.TOTAL_ELAPSED_TIME,
+                qh.EXECUTION_STATUS,
+                
+                -- Detailed Performance Breakdown
+                qh.COMPILATION_TIME,
+                qh.EXECUTION_TIME,
+                qh.QUEUED_PROVISIONING_TIME,
+                qh.QUEUED_REPAIR_TIME,
+                qh.QUEUED_OVERLOAD_TIME,
+                qh.TRANSACTION_BLOCKED_TIME,
+                qh.LIST_EXTERNAL_FILES_TIME,
+                
+                -- Data Movement
+                ROUND(qh.BYTES_SCANNED / (1024*1024*1024), 4) as BYTES_SCANNED_GB,
+                ROUND(qh.BYTES_WRITTEN / (1024*1024*1024), 4) as BYTES_WRITTEN_GB,
+                ROUND(qh.BYTES_SPILLED_TO_LOCAL_STORAGE / (1024*1024*1024), 4) as BYTES_SPILLED_LOCAL_GB,
+                ROUND(qh.BYTES_SPILLED_TO_REMOTE_STORAGE / (1024*1024*1024), 4) as BYTES_SPILLED_REMOTE_GB,
+                ROUND(qh.BYTES_SENT_OVER_THE_NETWORK / (1024*1024*1024), 4) as BYTES_NETWORK_GB,
+                
+                -- Row Operations
+                qh.ROWS_PRODUCED,
+                qh.ROWS_INSERTED,
+                qh.ROWS_UPDATED,
+                qh.ROWS_DELETED,
+                qh.ROWS_UNLOADED,
+                
+                -- Partition Information
+                qh.PARTITIONS_SCANNED,
+                qh.PARTITIONS_TOTAL,
+                CASE 
+                    WHEN qh.PARTITIONS_TOTAL > 0 
+                    THEN ROUND((qh.PARTITIONS_SCANNED::FLOAT / qh.PARTITIONS_TOTAL::FLOAT) * 100, 2)
+                    ELSE 0 
+                END as PARTITION_SCAN_PERCENTAGE,
+                
+                -- Cache Performance
+                qh.PERCENTAGE_SCANNED_FROM_CACHE,
+                
+                -- Credits and Cost
+                ROUND(COALESCE(qh.CREDITS_USED_CLOUD_SERVICES, 0), 6) as CREDITS_USED_CLOUD_SERVICES,
+                
+                -- Query Categorization
+                qh.QUERY_TYPE,
+                qh.QUERY_TAG,
+                
+                -- Error Information
+                qh.ERROR_CODE,
+                qh.ERROR_MESSAGE,
+                
+                -- Optimization Indicators
+                CASE 
+                    WHEN qh.BYTES_SPILLED_TO_LOCAL_STORAGE > 0 OR qh.BYTES_SPILLED_TO_REMOTE_STORAGE > 0 THEN 'MEMORY_SPILL'
+                    WHEN qh.PARTITIONS_SCANNED = qh.PARTITIONS_TOTAL AND qh.PARTITIONS_TOTAL > 100 THEN 'FULL_TABLE_SCAN'
+                    WHEN qh.COMPILATION_TIME > 5000 THEN 'HIGH_COMPILE_TIME'
+                    WHEN qh.PERCENTAGE_SCANNED_FROM_CACHE < 10 AND qh.BYTES_SCANNED > 1073741824 THEN 'POOR_CACHE_USAGE'
+                    WHEN qh.TRANSACTION_BLOCKED_TIME > 10000 THEN 'TRANSACTION_BLOCKED'
+                    ELSE 'NORMAL'
+                END as OPTIMIZATION_FLAG,
+                
+                -- Access Pattern
+                ah.DIRECT_OBJECTS_ACCESSED,
+                ah.BASE_OBJECTS_ACCESSED,
+                ah.OBJECTS_MODIFIED
+                
+            FROM SNOWFLAKE.ACCOUNT_USAGE.QUERY_HISTORY qh
+            LEFT JOIN SNOWFLAKE.ACCOUNT_USAGE.ACCESS_HISTORY ah ON qh.QUERY_ID = ah.QUERY_ID
+            WHERE qh.START_TIME >= DATEADD(day, -3, %(anchor)s::TIMESTAMP_TZ)
+        )
+        SELECT * FROM query_performance
+        ORDER BY START_TIME DESC
+        LIMIT 5000
+        """,
+        description='Deep dive query performance analysis with optimization recommendations'
+    ),
+    
+    'databases': QueryConfig(
+        name='Database Analytics',
+        sql="""
+        WITH database_metrics AS (
+            SELECT 
+                qh.DATABASE_NAME,
+                qh.DATABASE_ID,
+                
+                -- Query Activity
+                COUNT(qh.QUERY_ID) as TOTAL_QUERIES,
+                COUNT(DISTINCT qh.USER_NAME) as UNIQUE_USERS,
+                COUNT(DISTINCT qh.WAREHOUSE_NAME) as UNIQUE_WAREHOUSES_USED,
+                COUNT(DISTINCT qh.SCHEMA_NAME) as UNIQUE_SCHEMAS_ACCESSED,
+                COUNT(DISTINCT DATE(qh.START_TIME)) as ACTIVE_DAYS_COUNT,
+                
+                -- Performance Metrics
+                ROUND(AVG(qh.TOTAL_ELAPSED_TIME), 2) as AVG_EXECUTION_TIME_MS,
+                ROUND(SUM(qh.BYTES_SCANNED) / (1024*1024*1024), 2) as TOTAL_DATA_SCANNED_GB,
+                ROUND(SUM(COALESCE(qh.CREDITS_USED_CLOUD_SERVICES, 0)), 4) as TOTAL_CREDITS_CONSUMED,
+                
+                -- Query Type Distribution
+                COUNT(CASE WHEN qh.QUERY_TYPE = 'SELECT' THEN 1 END) as SELECT_QUERIES,
+                COUNT(CASE WHEN qh.QUERY_TYPE = 'INSERT' THEN 1 END) as INSERT_QUERIES,
+                COUNT(CASE WHEN qh.QUERY_TYPE = 'UPDATE' THEN 1 END) as UPDATE_QUERIES,
+                COUNT(CASE WHEN qh.QUERY_TYPE = 'DELETE' THEN 1 END) as DELETE_QUERIES,
+                COUNT(CASE WHEN qh.QUERY_TYPE = 'CREATE' THEN 1 END) as CREATE_QUERIES,
+                COUNT(CASE WHEN qh.QUERY_TYPE = 'DROP' THEN 1 END) as DROP_QUERIES,
+                
+                -- Performance Buckets
+                COUNT(CASE WHEN qh.TOTAL_ELAPSED_TIME <= 1000 THEN 1 END) as QUERIES_0_TO_1_SEC,
+                COUNT(CASE WHEN qh.TOTAL_ELAPSED_TIME > 1000 AND qh.TOTAL_ELAPSED_TIME <= 10000 THEN 1 END) as QUERIES_1_TO_10_SEC,
+                COUNT(CASE WHEN qh.TOTAL_ELAPSED_TIME > 10000 AND qh.TOTAL_ELAPSED_TIME <= 30000 THEN 1 END) as QUERIES_10_TO_30_SEC,
+                COUNT(CASE WHEN qh.TOTAL_ELAPSED_TIME > 30000 AND qh.TOTAL_ELAPSED_TIME <= 60000 THEN 1 END) as QUERIES_30_TO_60_SEC,
+                COUNT(CASE WHEN qh.TOTAL_ELAPSED_TIME > 60000 AND qh.TOTAL_ELAPSED_TIME <= 300000 THEN 1 END) as QUERIES_1_TO_5_MIN,
+                COUNT(CASE WHEN qh.TOTAL_ELAPSED_TIME > 300000 THEN 1 END) as QUERIES_5_MIN_PLUS,
+                
+                -- Bad Practices
+                COUNT(CASE WHEN UPPER(qh.QUERY_TEXT) LIKE '%%SELECT *%%' THEN 1 END) as SELECT_STAR_QUERIES,
+                COUNT(CASE WHEN qh.BYTES_SPILLED_TO_LOCAL_STORAGE > 0 OR qh.BYTES_SPILLED_TO_REMOTE_STORAGE > 0 THEN 1 END) as SPILLED_QUERIES,
+                COUNT(CASE WHEN qh.EXECUTION_STATUS = 'FAIL' THEN 1 END) as FAILED_QUERIES,
+                COUNT(CASE WHEN qh.ROWS_PRODUCED = 0 AND qh.EXECUTION_STATUS = 'SUCCESS' THEN 1 END) as ZERO_RESULT_QUERIES,
+                COUNT(CASE WHEN qh.PARTITIONS_SCANNED = qh.PARTITIONS_TOTAL AND qh.PARTITIONS_TOTAL > 100 THEN 1 END) as UNPARTITIONED_SCANS
+                
+            FROM SNOWFLAKE.ACCOUNT_USAGE.QUERY_HISTORY qh
+            WHERE qh.START_TIME >= DATEADD(day, -3, %(anchor)s::TIMESTAMP_TZ)
+                AND qh.DATABASE_NAME IS NOT NULL
+            GROUP BY qh.DATABASE_NAME, qh.DATABASE_ID
+        ),
+        database_storage AS (
+            SELECT 
+                ds.DATABASE_NAME,
+                ds.DATABASE_ID,
+                ROUND(AVG(ds.AVERAGE_DATABASE_BYTES) / (1024*1024*1024), 2) as AVG_STORAGE_GB,
+                ROUND(AVG(ds.AVERAGE_FAILSAFE_BYTES) / (1024*1024*1024), 2) as AVG_FAILSAFE_GB
+            FROM SNOWFLAKE.ACCOUNT_USAGE.DATABASE_STORAGE_USAGE_HISTORY ds
+            WHERE ds.USAGE_DATE >= DATEADD(day, -3, %(anchor)s::TIMESTAMP_TZ::DATE)
+            GROUP BY ds.DATABASE_NAME, ds.DATABASE_ID
+        )
+        SELECT 
+            dm.*,
+            COALESCE(ds.AVG_STORAGE_GB, 0) as AVG_STORAGE_GB,
+            COALESCE(ds.AVG_FAILSAFE_GB, 0) as AVG_FAILSAFE_GB
+        FROM database_metrics dm
+        LEFT JOIN database_storage ds ON dm.DATABASE_NAME = ds.DATABASE_NAME
+        ORDER BY dm.TOTAL_QUERIES DESC
+        """,
+        description='Database-level analytics with storage and query patterns'
+    ),
+    
+    'tables': QueryConfig(
+        name='Table Analytics',
+        sql="""
+        WITH table_metrics AS (
+            SELECT 
+                t.TABLE_NAME,
+                t.TABLE_SCHEMA,
+                t.TABLE_CATALOG as DATABASE_NAME,
+                t.TABLE_TYPE,
+                t.IS_TRANSIENT,
+                t.CLUSTERING_KEY,
+                t.ROW_COUNT,
+                ROUND(t.BYTES / (1024*1024*1024), 4) as SIZE_GB,
+                t.RETENTION_TIME,
+                t.AUTO_CLUSTERING_ON,
+                t.CREATED,
+                t.LAST_ALTERED,
+                t.LAST_DDL,
+                
+                -- Query Activity (from ACCESS_HISTORY)
+                COUNT(DISTINCT ah.QUERY_ID) as QUERIES_ACCESSING_TABLE,
+                COUNT(DISTINCT ah.USER_NAME) as UNIQUE_USERS_ACCESSING,
+                
+                -- Access Patterns
+                COUNT(CASE WHEN ah.DIRECT_OBJECTS_ACCESSED IS NOT NULL THEN 1 END) as DIRECT_ACCESS_COUNT,
+                COUNT(CASE WHEN ah.BASE_OBJECTS_ACCESSED IS NOT NULL THEN 1 END) as BASE_ACCESS_COUNT,
+                COUNT(CASE WHEN ah.OBJECTS_MODIFIED IS NOT NULL THEN 1 END) as MODIFICATION_COUNT,
+                
+                -- Performance Impact
+                AVG(qh.TOTAL_ELAPSED_TIME) as AVG_QUERY_TIME_MS,
+                SUM(qh.BYTES_SCANNED) / (1024*1024*1024) as TOTAL_SCANNED_GB,
+                AVG(qh.PERCENTAGE_SCANNED_FROM_CACHE) as AVG_CACHE_HIT_RATE
+                
+            FROM SNOWFLAKE.ACCOUNT_USAGE.TABLES t
+            LEFT JOIN SNOWFLAKE.ACCOUNT_USAGE.ACCESS_HISTORY ah ON 
+                UPPER(ah.BASE_OBJECTS_ACCESSED) LIKE '%%' || UPPER(t.TABLE_CATALOG) || '.' || UPPER(t.TABLE_SCHEMA) || '.' || UPPER(t.TABLE_NAME) || '%%'
+                AND ah.QUERY_START_TIME >= DATEADD(day, -3, %(anchor)s::TIMESTAMP_TZ)
+            LEFT JOIN SNOWFLAKE.ACCOUNT_USAGE.QUERY_HISTORY qh ON ah.QUERY_ID = qh.QUERY_ID
+            WHERE t.DELETED IS NULL
+                AND t.TABLE_TYPE IN ('BASE TABLE', 'VIEW')
+            GROUP BY 1,2,3,4,5,6,7,8,9,10,11,12,13
+        )
+        SELECT 
+            tm.*,
+            -- Utilization Categories
+            CASE 
+                WHEN tm.QUERIES_ACCESSING_TABLE = 0 THEN 'UNUSED'
+                WHEN tm.QUERIES_ACCESSING_TABLE <= 10 THEN 'LOW_USAGE'
+                WHEN tm.QUERIES_ACCESSING_TABLE <= 100 THEN 'MEDIUM_USAGE'
+                ELSE 'HIGH_USAGE'
+            END as USAGE_CATEGORY,
+            
+            -- Storage Efficiency
+            CASE 
+                WHEN tm.SIZE_GB = 0 THEN 'EMPTY'
+                WHEN tm.SIZE_GB < 0.1 THEN 'VERY_SMALL'
+                WHEN tm.SIZE_GB < 1 THEN 'SMALL'
+                WHEN tm.SIZE_GB < 10 THEN 'MEDIUM'
+                WHEN tm.SIZE_GB < 100 THEN 'LARGE'
+                ELSE 'VERY_LARGE'
+            END as SIZE_CATEGORY
+            
+        FROM table_metrics tm
+        ORDER BY tm.QUERIES_ACCESSING_TABLE DESC, tm.SIZE_GB DESC
+        LIMIT 1000
+        """,
+        description='Table-level analytics with access patterns and storage metrics'
+    )
+}
+
+# Data storage for tables
+# Per table: columns, row count, description and refresh time. The rows live only in
+# table_frames, on the shared Arrow mapping when it is enabled, and are serialized per request.
+table_data = {}
+table_frames = {}
+# QUERY_ID -> row position per table, rebuilt whenever a new version is installed
+query_locations = {}
+last_refresh = {}
+# Version of the shared cache each table in this worker was installed from
+local_versions = {}
+
+# Serialized /api/tables/<name> bodies; the in-memory cache is authoritative so no TTL is needed.
+# Versions are the refresh time, which workers adopting the same shared version agree on.
+response_cache = ResponseCache(ttl=0)
+
+# Arrow IPC files shared by all workers on the host; one worker refreshes, the others map the result
+shared_cache = SharedTableCache()
+
+# One Snowflake fetch per table at a time across workers
+refresh_coordinator = coordinator_from_env(sf_connector.execute_query)
+
+def install_table(table_name: str, df: pd.DataFrame, refreshed_at: datetime) -> Dict[str, Any]:
+    """Make a frame this worker's current version of a table"""
+    data = {
+        "columns": df.columns.tolist(),
+        "row_count": len(df),
+        "description": QUERIES[table_name].description,
+        "last_updated": refreshed_at.isoformat()
+    }
+    
+    # No per-worker copy of the rows: records, schemas and lookups are derived from the frame on use
+    table_data[table_name] = data
+    table_frames[table_name] = df
+    if 'QUERY_ID' in df.columns:
+        query_locations[table_name] = dict(zip(df['QUERY_ID'].tolist(), range(len(df))))
+    else:
+        query_locations.pop(table_name, None)
+    last_refresh[table_name] = refreshed_at
+    response_cache.bump(table_name, refreshed_at.isoformat())
+    return data
+
+def table_payload(table_name: str) -> Dict[str, Any]:
+    """A cached table as a response body, with its rows serialized from the frame for this request"""
+    return dict(table_data[table_name], data=frame_records(table_frames[table_name]))
+
+def query_positions(table_name: str, query_ids: List[str]) -> Dict[str, int]:
+    """Row positions of query_ids in a cached frame, through the table's QUERY_ID index"""
+    locations = query_locations.get(table_name, {})
+    return {query_id: locations[query_id] for query_id in query_ids if query_id in locations}
+
+def adopt_shared(table_name: str) -> bool:
+    """Switch to a newer version another worker published; True when the table changed"""
+    shared = shared_cache.get(table_name)
+    if shared is None or shared.version == local_versions.get(table_name):
+        return False
+    local_versions[table_name] = shared.version
+    install_table(table_name, shared.frame, datetime.fromisoformat(shared.meta['last_refresh']))
+    logger.info(f"Switched {table_name} to shared cache version {shared.version}")
+    return True
+
+def needs_refresh(table_name: str, force_refresh: bool = False) -> bool:
+    """True when a table is missing from the cache or older than the 1 hour TTL"""
+    if not force_refresh:
+        adopt_shared(table_name)
+    return (
+        force_refresh or 
+        table_name not in table_data or 
+        table_name not in last_refresh or
+        (datetime.now() - last_refresh[table_name]).total_seconds() > 3600  # 1 hour cache
+    )
+
+def store_table_data(table_name: str, df: pd.DataFrame) -> Dict[str, Any]:
+    """Convert a fetched DataFrame into the cached table payload and publish it to the other workers"""
+    refreshed_at = datetime.now()
+    if shared_cache.enabled:
+        try:
+            shared = shared_cache.publish(table_name, df, {'last_refresh': refreshed_at.isoformat()})
+            local_versions[table_name] = shared.version
+            # Serve from the mapping too, so the refreshing worker holds no private copy
+            df = shared.frame
+        except Exception as e:
+            logger.warning(f"Keeping {table_name} private to this worker, shared cache publish failed: {e}")
+    data = install_table(table_name, df, refreshed_at)
+    
+    logger.info(f"Successfully refreshed {table_name} with {len(df)} rows")
+    return data
+
+def refresh_table_data(table_name: str) -> Dict[str, Any]:
+    """Refresh data for a specific table"""
+    try:
+        if table_name not in QUERIES:
+            return {"error": f"Table {table_name} not found"}
+        
+        def fetch(lease):
+            query_config = QUERIES[table_name]
+            logger.info(f"Executing query for {table_name}")
+            
+            with statement_scope(table_name):
+                df = sf_connector.execute_query(query_config.sql, anchor_params())
+            
+            return store_table_data(table_name, df)
+        
+        # Refreshes other workers finish while this one waits are only visible through the shared cache
+        outcome = refresh_coordinator.run(f"index2.{table_name}", fetch, coalesce=shared_cache.enabled)
+        if outcome['status'] == 'coalesced':
+            adopt_shared(table_name)
+            return table_data[table_name]
+        return outcome['result']
+    
+    except RefreshInProgress as e:
+        if table_name in table_data:
+            logger.warning(f"Serving cached {table_name}: {e}")
+            return table_data[table_name]
+        return {"error": str(e), "refresh": e.status}
+    except Exception as e:
+        logger.error(f"Error refreshing {table_name}: {e}")
+        return {"error": str(e)}
+
+def get_table_data(table_name: str, force_refresh: bool = False) -> Dict[str, Any]:
+    """Get table data, refresh if needed"""
+    
+    # Check if we need to refresh
+    stale = needs_refresh(table_name, force_refresh)
+    record_cache_lookup('table_data', table_name, hit=not stale)
+    
+    if stale:
+        return refresh_table_data(table_name)
+    
+    return table_data[table_name]
+
+def snowflake_connection():
+    """Raw connection used by background refresh jobs"""
+    if not sf_connector.connection and not sf_connector.connect():
+        raise Exception("Cannot establish Snowflake connection")
+    return sf_connector.connection
+
+def refresh_all_job_steps(params: Dict) -> List:
+    """One SELECT per table for an asynchronous /api/refresh-all job; results land in the cache"""
+    return [
+        (name, render(config.sql, anchor_params()), lambda df, name=name: store_table_data(name, df))
+        for name, config in QUERIES.items()
+    ]
+
+# Dashboard landing page
+DASHBOARD_HTML = """
+<!DOCTYPE html>
+<html>
+<head>
+    <title>FinOps Analytics Dashboard</title>
+    <style>
+        body { font-family: Arial, sans-serif; margin: 20px; background: #f5f5f5; }
+        .container { max-width: 1200px; margin: 0 auto; }
+        .header { background: #2c3e50; color: white; padding: 20px; border-radius: 8px; margin-bottom: 20px; }
+        .card { background: white; padding: 20px; border-radius: 8px; margin-bottom: 20px; box-shadow: 0 2px 4px rgba(0,0,0,0.1); }
+        .table-grid { display: grid; grid-template-columns: repeat(auto-fit, minmax(300px, 1fr)); gap: 20px; }
+        .table-card { border-left: 4px solid #3498db; }
+        .table-card h3 { margin-top: 0; color: #2c3e50; }
+        .btn { background: #3498db; color: white; padding: 10px 20px; text-decoration: none; border-radius: 4px; display: inline-block; margin: 5px; }
+        .btn:hover { background: #2980b9; }
+        .status { padding: 5px 10px; border-radius: 4px; font-size: 12px; }
+        .status.success { background: #2ecc71; color: white; }
+        .status.error { background: #e74c3c; color: white; }
+        .metrics { display: grid; grid-template-columns: repeat(auto-fit, minmax(200px, 1fr)); gap: 15px; margin: 20px 0; }
+        .metric { background: #ecf0f1; padding: 15px; border-radius: 4px; text-align: center; }
+        .metric-value { font-size: 24px; font-weight: bold; color: #2c3e50; }
+        .metric-label { font-size: 12px; color: #7f8c8d; }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>🏢 FinOps Analytics Dashboard</h1>
+            <p>Snowflake Cost Optimization & Performance Analytics</p>
+        </div>
+        
+        <div class="card">
+            <h2>📊 Available Analytics Tables</h2>
+            <div class="table-grid">
+                <div class="card table-card">
+                    <h3>🏭 Warehouses</h3>
+                    <p>Comprehensive warehouse analytics with performance metrics, utilization, and bad practices detection.</p>
+                    <a href="/api/tables/warehouses" class="btn">View Data</a>
+                    <a href="/api/tables/warehouses/refresh" class="btn">Refresh</a>
+                </div>
+                
+                <div class="card table-card">
+                    <h3>👥 Users</h3>
+                    <p>User analytics with bad practices, credit consumption, and query patterns.</p>
+                    <a href="/api/tables/users" class="btn">View Data</a>
+                    <a href="/api/tables/users/refresh" class="btn">Refresh</a>
+                </div>
+                
+                <div class="card table-card">
+                    <h3>🔍 Queries</h3>
+                    <p>Detailed query analytics with performance categorization and optimization flags.</p>
+                    <a href="/api/tables/queries" class="btn">View Data</a>
+                    <a href="/api/tables/queries/refresh" class="btn">Refresh</a>
+                </div>
+                
+                <div class="card table-card">
+                    <h3>📋 Query Details</h3>
+                    <p>Deep dive query performance analysis with optimization recommendations.</p>
+                    <a href="/api/tables/query_details" class="btn">View Data</a>
+                    <a href="/api/tables/query_details/refresh" class="btn">Refresh</a>
+                </div>
+                
+                <div class="card table-card">
+                    <h3>🗄️ Databases</h3>
+                    <p>Database-level analytics with storage metrics and query patterns.</p>
+                    <a href="/api/tables/databases" class="btn">View Data</a>
+                    <a href="/api/tables/databases/refresh" class="btn">Refresh</a>
+                </div>
+                
+                <div class="card table-card">
+                    <h3>📊 Tables</h3>
+                    <p>Table-level analytics with access patterns and storage efficiency metrics.</p>
+                    <a href="/api/tables/tables" class="btn">View Data</a>
+                    <a href="/api/tables/tables/refresh" class="btn">Refresh</a>
+                </div>
+            </div>
+        </div>
+        
+        <div class="card">
+            <h2>🔄 Bulk Operations</h2>
+            <a href="/api/refresh-all" class="btn">Refresh All Tables</a>
+            <a href="/api/status" class="btn">System Status</a>
+        </div>
+        
+        <div class="card">
+            <h2>📖 API Endpoints</h2>
+            <ul>
+                <li><strong>GET /api/tables/{table_name}</strong> - Get table data</li>
+                <li><strong>GET /api/tables/{table_name}/refresh</strong> - Refresh specific table</li>
+                <li><strong>GET /api/refresh-all</strong> - Refresh all tables</li>
+                <li><strong>GET /api/status</strong> - System status</li>
+                <li><strong>GET /api/tables</strong> - List all available tables</li>
+            </ul>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+def warehouse_workload(warehouse_name: str, days: int) -> Workload:
+    """The warehouse's executed queries over the last `days`, as simulator arrays"""
+    key = (warehouse_name.upper(), days)
+    now = time.time()
+    with workload_lock:
+        for stale in [k for k, (loaded_at, _) in workload_cache.items() if now - loaded_at >= WORKLOAD_TTL_SECONDS]:
+            del workload_cache[stale]
+        cached = workload_cache.get(key)
+        if cached:
+            workload_cache.move_to_end(key)
+            return cached[1]
+    df = sf_connector.execute_query("""
+    SELECT
+        end_time,
+        execution_time,
+        queued_overload_time,
+        bytes_scanned,
+        bytes_spilled_to_local_storage,
+        bytes_spilled_to_remote_storage
+    FROM SNOWFLAKE.ACCOUNT_USAGE.QUERY_HISTORY
+    WHERE UPPER(warehouse_name) = %(warehouse)s
+        AND start_time >= DATEADD('day', -%(days)s, %(anchor)s::TIMESTAMP_TZ)
+        AND execution_time > 0
+    """, {'warehouse': warehouse_name.upper(), 'days': days, **anchor_params()})
+    workload = Workload.from_frame(df)
+    with workload_lock:
+        workload_cache[key] = (time.time(), workload)
+        workload_cache.move_to_end(key)
+        while len(workload_cache) > WORKLOAD_CACHE_ENTRIES:
+            workload_cache.popitem(last=False)
+    return workload
+
+def drill_down_rows(target_table: str, filters: Dict[str, str]) -> List[Dict[str, Any]]:
+    """Rows of a cached table matching drill-down context: column=value pairs plus an optional
+    filter= expression. Raises FilterError for an invalid filter."""
+    frame = table_frames[target_table]
+    schema = frame_schema(frame)
+    conditions = parse_filter(filters.get('filter'), schema)
+    conditions += equality_conditions(
+        {k: v for k, v in filters.items() if k != 'filter' and k.upper() in {c.upper() for c in schema}}, schema)
+    return frame_records(apply_to_frame(frame, conditions, [], schema))
+
+
+class TableRequest(NamedTuple):
+    """Validated ?layout=, ?fields=, ?filter= and ?sort= of a /api/tables/<name> request"""
+    layout: str
+    fields: Optional[List[str]]
+    conditions: List[Condition]
+    order: List[Tuple[str, bool]]
+    schema: Dict[str, str]
+
+def table_request(table_name: str, args) -> TableRequest:
+    """Parse request arguments against a cached table; raises ValueError for invalid ones"""
+    frame = table_frames[table_name]
+    layout = args.get('layout', 'records')
+    schema = frame_schema(frame)
+    # The cached frame's columns are the whitelist for ?fields=, ?filter= and ?sort=
+    options = TableRequest(layout, frame_fields(frame, args.get('fields')), parse_filter(args.get('filter'), schema),
+                           parse_sort(args.get('sort'), schema), schema)
+    frame_payload(frame.head(0), layout)
+    return options
+
+def table_body(table_name: str, options: TableRequest) -> bytes:
+    """Serialized /api/tables/<name> body for validated request options"""
+    if options.layout == 'records' and options.fields is None and not options.conditions and not options.order:
+        return dumps(table_payload(table_name))
+    frame = apply_to_frame(table_frames[table_name], options.conditions, options.order, options.schema)
+    if options.fields is not None:
+        frame = frame[options.fields]
+    return dumps(dict(table_data[table_name], data=frame_payload(frame, options.layout),
+                      columns=frame.columns.tolist(), row_count=len(frame)))
+
+def tables_payload() -> Dict[str, Any]:
+    """Every configured table with its cache state"""
+    tables = []
+    for name, config in QUERIES.items():
+        tables.append({
+            "name": name,
+            "description": config.description,
+            "last_refresh": last_refresh.get(name, None),
+            "cached": name in table_data,
+            "row_count": table_data[name]["row_count"] if name in table_data else 0
+        })
+    return {"tables": tables, "total_tables": len(tables)}
+
+def status_payload(connection_status: str) -> Dict[str, Any]:
+    return {
+        "system_status": "running",
+        "snowflake_connection": connection_status,
+        "cached_tables": len(table_data),
+        "available_tables": len(QUERIES),
+        "last_refresh_times": {
+            name: refresh_time.isoformat() if refresh_time else None
+            for name, refresh_time in last_refresh.items()
+        },
+        "memory_usage": {
+            "total_rows": sum(data["row_count"] for data in table_data.values()),
+            "table_counts": {name: data["row_count"] for name, data in table_data.items()}
+        },
+        "metering_cache": metering_cache.describe(),
+        "shared_cache": shared_cache.describe()
+    }
+
+def refresh_summary(results: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    return {
+        "message": "Bulk refresh completed",
+        "results": results,
+        "total_tables": len(QUERIES),
+        "successful": len([r for r in results.values() if r.get("status") == "success"]),
+        "failed": len([r for r in results.values() if r.get("status") == "error"])
+    }
+
+def query_detail(query_id: str) -> Optional[Dict[str, Any]]:
+    """Detail row for one query, looked up through the cached query_id index"""
+    position = query_positions('query_details', [query_id]).get(query_id)
+    if position is None:
+        return None
+    return frame_records(table_frames['query_details'].iloc[position:position + 1])[0]
+
+def batch_query_ids(body: Optional[Dict[str, Any]]) -> List[str]:
+    """Distinct query_ids of a /api/query-details:batch body, in request order"""
+    return list(dict.fromkeys(str(q) for q in (body or {}).get('query_ids', [])))
+
+def query_details_batch(query_ids: List[str]) -> Dict[str, Any]:
+    """Detail rows for many queries in one cache pass"""
+    locations = query_positions('query_details', query_ids)
+    positions = [locations[q] for q in query_ids if q in locations]
+    return {
+        "results": frame_records(table_frames['query_details'].iloc[positions]),
+        "missing": [q for q in query_ids if q not in locations],
+        "requested": len(query_ids)
+    }
+
+def timeseries_payload(warehouse_name: str, args) -> Tuple[Dict[str, Any], int]:
+    """Hourly warehouse credits downsampled to ?width= points, with the response status"""
+    try:
+        days = min(max(int(args.get('days', 90)), 1), metering_cache.days)
+        width = min(max(int(args.get('width', 600)), 10), 5000)
+        method = args.get('method', 'lttb')
+        metric = args.get('metric', 'credits_used')
+        if method not in METHODS:
+            return {"error": f"Unknown method '{method}'"}, 400
+        series = metering_cache.series(warehouse_name, days, metric)
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    except Exception as e:
+        logger.error(f"Error building timeseries for {warehouse_name}: {e}")
+        return {"error": str(e)}, 500
+
+    points = series_points(series)
+    x, y = downsample(points['x'], points['y'], width, method)
+    return {
+        "warehouse_name": warehouse_name,
+        "metric": metric,
+        "method": method,
+        "days": days,
+        "raw_points": len(series),
+        "timestamps": x,
+        "values": y,
+        "total": float(points['y'].sum())
+    }, 200
+
+def simulation_payload(warehouse_name: str, body: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """What-if scenarios for a warehouse of the cached warehouses table, with the response status"""
+    frame = table_frames['warehouses']
+    rows = frame[frame['WAREHOUSE_NAME'].str.upper() == warehouse_name.upper()]
+    if rows.empty:
+        return {"error": f"Warehouse '{warehouse_name}' not found"}, 404
+
+    try:
+        days = min(max(int(body.get('days', 30)), 1), metering_cache.days)
+        current = WarehouseConfig.from_row(rows.iloc[0].to_dict())
+        scenarios = body.get('scenarios') or default_scenarios(current)
+        if not isinstance(scenarios, list) or not all(isinstance(s, dict) for s in scenarios):
+            return {"error": "scenarios must be a list of objects"}, 400
+        for scenario in scenarios:
+            current.with_changes(scenario)
+    except (TypeError, ValueError) as e:
+        return {"error": str(e)}, 400
+
+    try:
+        workload = warehouse_workload(warehouse_name, days)
+        actual_credits = float(metering_cache.series(warehouse_name, days, 'credits_used_compute').sum())
+    except Exception as e:
+        logger.error(f"Error loading workload for {warehouse_name}: {e}")
+        return {"error": str(e)}, 500
+
+    started = time.perf_counter()
+    result = run_scenarios(workload, current, scenarios, actual_credits)
+    return {
+        "warehouse_name": warehouse_name,
+        "days": days,
+        "metered_compute_credits": actual_credits,
+        "simulation_seconds": round(time.perf_counter() - started, 3),
+        **result
+    }, 200
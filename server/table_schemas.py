@@ -0,0 +1,140 @@
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+# Column types of the FINOPS_* tables built by index.py. They are the whitelist
+# for ?fields= projections and decide how filter values are parsed.
+NUMBER = 'number'
+STRING = 'string'
+TIMESTAMP = 'timestamp'
+BOOLEAN = 'boolean'
+VARIANT = 'variant'
+
+
+def _schema(**groups: Iterable[str]) -> Dict[str, str]:
+    return {column: column_type for column_type, columns in groups.items() for column in columns}
+
+
+TABLE_SCHEMAS: Dict[str, Dict[str, str]] = {
+    'FINOPS_WAREHOUSE_METRICS': _schema(
+        number=['warehouse_id', 'total_queries', 'unique_users', 'total_credits', 'avg_credits_per_query',
+                'active_days', 'avg_execution_time_sec', 'total_gb_scanned', 'total_rows_produced',
+                'queries_0_to_1_sec', 'queries_1_to_10_sec', 'queries_10_to_30_sec', 'queries_30_to_60_sec',
+                'queries_1_to_5_min', 'queries_5_min_plus', 'select_star_on_large_tables',
+                'unpartitioned_scan_queries', 'cartesian_join_queries', 'zero_result_expensive_queries',
+                'failed_cancelled_queries', 'high_compile_time_queries', 'spilled_to_local_queries',
+                'spilled_to_remote_queries', 'missing_where_clause_queries', 'weekend_credits',
+                'off_hours_credits', 'avg_queue_wait_time_ms', 'high_queue_time_queries', 'zero_credit_queries'],
+        string=['warehouse_name', 'performance_recommendation', 'cost_recommendation'],
+        timestamp=['last_updated']),
+    'FINOPS_USER_WAREHOUSE_USAGE': _schema(
+        number=['user_warehouse_id', 'warehouse_id', 'total_queries', 'total_credits', 'avg_credits_per_query',
+                'total_gb_scanned', 'avg_execution_time_ms', 'active_days', 'percentage_of_warehouse_credits',
+                'percentage_of_warehouse_queries', 'select_star_queries', 'unpartitioned_scan_queries',
+                'spilled_queries', 'long_running_queries', 'zero_result_expensive_queries',
+                'high_compile_time_queries', 'failed_queries', 'missing_where_queries', 'weekend_credits',
+                'off_hours_credits', 'expensive_queries'],
+        string=['user_name', 'warehouse_name', 'user_display_name', 'user_email', 'cost_category',
+                'optimization_status'],
+        timestamp=['last_updated']),
+    'FINOPS_DATABASE_METRICS': _schema(
+        number=['database_id', 'total_storage_gb', 'failsafe_storage_gb', 'time_travel_storage_gb', 'table_count',
+                'schema_count', 'avg_table_size_gb', 'total_queries', 'unique_users', 'total_credits',
+                'select_star_on_large_tables', 'unpartitioned_scans_count', 'full_table_scan_queries',
+                'missing_join_conditions', 'long_running_queries', 'avg_gb_scanned_per_query'],
+        string=['database_name', 'storage_recommendation'],
+        timestamp=['last_updated']),
+    'FINOPS_TABLE_METRICS': _schema(
+        number=['table_id', 'storage_gb', 'time_travel_gb', 'failsafe_gb', 'row_count', 'query_count',
+                'full_table_scans_count', 'select_star_count', 'total_gb_scanned', 'avg_execution_time_ms',
+                'unique_users_accessing'],
+        string=['database_name', 'schema_name', 'table_name', 'table_comment', 'optimization_recommendation'],
+        timestamp=['last_updated']),
+    'FINOPS_SERVERLESS_METRICS': _schema(
+        number=['service_id', 'executions_count', 'total_credits', 'files_processed_count', 'rows_processed',
+                'avg_credits_per_execution', 'error_count', 'error_rate_pct'],
+        string=['service_type', 'service_name', 'optimization_recommendation'],
+        timestamp=['last_updated']),
+    'FINOPS_ROLES_METRICS': _schema(
+        number=['role_id', 'unique_users', 'total_queries', 'total_credits', 'warehouses_used', 'databases_accessed',
+                'avg_execution_time_ms', 'total_grants', 'usage_grants', 'select_grants', 'insert_grants',
+                'delete_grants', 'create_grants'],
+        string=['role_name', 'security_recommendation'],
+        timestamp=['last_updated']),
+    'FINOPS_QUERY_HISTORY': _schema(
+        number=['warehouse_id', 'execution_time_ms', 'compilation_time_ms', 'queue_time_ms', 'gb_scanned',
+                'rows_produced', 'rows_inserted', 'rows_updated', 'rows_deleted', 'credits_used_cloud_services',
+                'credits_used_compute', 'total_credits_used', 'partitions_scanned', 'partitions_total',
+                'gb_spilled_local', 'gb_spilled_remote', 'user_warehouse_id', 'database_id', 'role_id'],
+        string=['query_id', 'query_text', 'query_text_preview', 'user_name', 'role_name', 'warehouse_name',
+                'database_name', 'schema_name', 'execution_status', 'error_code', 'error_message',
+                'performance_bucket', 'cost_category', 'time_category', 'query_type'],
+        timestamp=['start_time', 'end_time', 'last_updated'],
+        boolean=['is_select_star_large', 'is_unpartitioned_scan', 'is_cartesian_join', 'is_zero_result_expensive',
+                 'is_failed', 'is_high_compile_time', 'is_spilled_local', 'is_spilled_remote', 'is_long_running',
+                 'is_high_queue_time', 'is_missing_where_clause']),
+    'FINOPS_QUERY_DETAILS': _schema(
+        number=['execution_time_ms', 'compilation_time_ms', 'bytes_scanned', 'rows_produced', 'total_credits',
+                'partitions_scanned', 'partitions_total', 'bytes_spilled_to_local_storage',
+                'bytes_spilled_to_remote_storage', 'estimated_cost_usd', 'cost_per_gb_scanned', 'rows_per_second',
+                'rows_per_gb_scanned', 'partition_scan_percentage'],
+        string=['query_id', 'query_text', 'warehouse_name', 'user_name', 'cost_impact', 'performance_impact'],
+        variant=['optimization_recommendations'],
+        timestamp=['start_time', 'last_updated']),
+    'FINOPS_QUERY_ATTRIBUTION': _schema(
+        number=['overlap_seconds', 'attributed_credits_compute', 'attributed_credits_cloud_services',
+                'attributed_credits'],
+        string=['warehouse_name', 'query_id', 'user_name', 'role_name'],
+        timestamp=['hour_start', 'last_updated']),
+    'FINOPS_USER_ATTRIBUTION': _schema(
+        number=['query_count', 'overlap_seconds', 'attributed_credits_compute', 'attributed_credits_cloud_services',
+                'attributed_credits'],
+        string=['warehouse_name', 'user_name'],
+        timestamp=['hour_start', 'last_updated']),
+    'FINOPS_ROLE_ATTRIBUTION': _schema(
+        number=['query_count', 'overlap_seconds', 'attributed_credits_compute', 'attributed_credits_cloud_services',
+                'attributed_credits'],
+        string=['warehouse_name', 'role_name'],
+        timestamp=['hour_start', 'last_updated']),
+}
+
+
+class FieldError(ValueError):
+    """A requested column is not exposed by the table"""
+
+
+def table_columns(table_name: str) -> Dict[str, str]:
+    if table_name not in TABLE_SCHEMAS:
+        raise FieldError(f"Unknown table '{table_name}'")
+    return TABLE_SCHEMAS[table_name]
+
+
+def parse_fields(fields: Optional[str], allowed: Iterable[str]) -> Optional[List[str]]:
+    """Validate a comma separated ?fields= value; None means every column"""
+    if not fields:
+        return None
+    allowed = {name.lower(): name for name in allowed}
+    requested = []
+    for name in fields.split(','):
+        name = name.strip().lower()
+        if not name:
+            continue
+        if name not in allowed:
+            raise FieldError(f"Unknown field '{name}', expected any of {', '.join(sorted(allowed))}")
+        if allowed[name] not in requested:
+            requested.append(allowed[name])
+    return requested or None
+
+
+def table_fields(table_name: str, fields: Optional[str]) -> Optional[List[str]]:
+    """?fields= for a FINOPS_* table, checked against its schema"""
+    return parse_fields(fields, table_columns(table_name))
+
+
+def select_list(columns: Optional[List[str]]) -> str:
+    return ', '.join(columns) if columns else '*'
+
+
+def frame_fields(df: pd.DataFrame, fields: Optional[str]) -> Optional[List[str]]:
+    """?fields= for a cached DataFrame; column names keep the frame's (upper) case"""
+    return parse_fields(fields, df.columns)
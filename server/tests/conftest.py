@@ -0,0 +1,31 @@
+import os
+import sys
+import types
+
+import pytest
+
+# The server modules are imported as top-level modules, as the apps do when run from server/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def snowflake_connector(monkeypatch):
+    """snowflake.connector, stubbed for the duration of a test where the connector is not installed"""
+    try:
+        import snowflake.connector.pandas_tools  # noqa: F401
+        return sys.modules['snowflake.connector']
+    except ImportError:
+        pass
+
+    def unavailable(*args, **kwargs):
+        raise RuntimeError("snowflake-connector-python is not installed")
+
+    package = types.ModuleType('snowflake')
+    connector = types.ModuleType('snowflake.connector')
+    pandas_tools = types.ModuleType('snowflake.connector.pandas_tools')
+    connector.connect = unavailable
+    pandas_tools.write_pandas = unavailable
+    package.connector, connector.pandas_tools = connector, pandas_tools
+    for module in (package, connector, pandas_tools):
+        monkeypatch.setitem(sys.modules, module.__name__, module)
+    return connector
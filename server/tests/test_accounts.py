@@ -0,0 +1,120 @@
+import json
+
+import pytest
+
+
+@pytest.fixture
+def accounts(snowflake_connector):
+    import accounts
+    return accounts
+
+
+class FakeConnection:
+    """Answers SELECT * FROM <table> from a dict of table -> (columns, rows)"""
+
+    def __init__(self, tables, failing=()):
+        self.tables, self.failing = tables, failing
+        self.closed = False
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, query, params=None, _statement_params=None):
+        table = query.split()[-1]
+        if table in self.connection.failing:
+            raise RuntimeError(f"{table} does not exist")
+        self.columns, self.rows = self.connection.tables[table]
+
+    def fetchall(self):
+        return self.rows
+
+    @property
+    def description(self):
+        return [(name,) for name in self.columns]
+
+    def close(self):
+        pass
+
+
+WAREHOUSES = ['WAREHOUSE_NAME', 'TOTAL_CREDITS']
+USERS = ['USER_NAME', 'WAREHOUSE_NAME', 'TOTAL_CREDITS']
+TABLES = ('FINOPS_WAREHOUSE_METRICS', 'FINOPS_USER_WAREHOUSE_USAGE')
+
+
+def test_profiles_resolve_env_references(accounts, monkeypatch, tmp_path):
+    monkeypatch.setenv('PROD_PASSWORD', 'secret')
+    path = tmp_path / 'accounts.json'
+    path.write_text(json.dumps([{'name': 'prod', 'account': 'org-prod', 'password_env': 'PROD_PASSWORD',
+                                 'pool_size': 2}]))
+    [profile] = accounts.load_profiles({}, str(path))
+    assert profile.config == {'account': 'org-prod', 'password': 'secret'} and profile.pool_size == 2
+
+    path.write_text(json.dumps([{'account': 'a'}, {'name': 'a'}]))
+    with pytest.raises(ValueError):
+        accounts.load_profiles({}, str(path))
+
+    monkeypatch.delenv('FINOPS_ACCOUNTS', raising=False)
+    [default] = accounts.load_profiles({'account': 'single'}, None)
+    assert default.name == 'single'
+
+
+def test_pool_reuses_connections_and_replaces_failed_ones(accounts):
+    opened = []
+
+    def connect(**config):
+        opened.append(FakeConnection({}))
+        return opened[-1]
+
+    pool = accounts.ConnectionPool(accounts.AccountProfile('prod', {}, pool_size=2), connect=connect)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as again:
+        assert again is first
+    with pytest.raises(RuntimeError):
+        with pool.connection():
+            raise RuntimeError("session expired")
+    assert first.closed and pool.stats() == {'open': 0, 'idle': 0, 'waiting': 0}
+    with pool.connection() as replacement:
+        assert replacement is not first
+    assert len(opened) == 2
+
+
+def test_fleet_merges_accounts_and_keeps_failures_per_account(accounts):
+    data = {
+        'prod': {'FINOPS_WAREHOUSE_METRICS': (WAREHOUSES, [('ETL', 10.0), ('BI', 4.0)]),
+                 'FINOPS_USER_WAREHOUSE_USAGE': (USERS, [('ann', 'ETL', 6.0), ('ann', 'BI', 3.0)])},
+        'dev': {'FINOPS_WAREHOUSE_METRICS': (WAREHOUSES, [('DEV', 2.0)]),
+                'FINOPS_USER_WAREHOUSE_USAGE': (USERS, [('bob', 'DEV', 2.0)])},
+    }
+    failing = {'prod': set(), 'dev': set()}
+    fleet = accounts.AccountFleet([accounts.AccountProfile('prod', {}), accounts.AccountProfile('dev', {})])
+    for name, session in fleet.sessions.items():
+        session.pool.connect = lambda name=name, **config: FakeConnection(data[name], failing[name])
+
+    results = fleet.refresh(tables=TABLES)
+    assert results['prod']['error'] is None and results['dev']['error'] is None
+
+    merged = fleet.merged('FINOPS_WAREHOUSE_METRICS')
+    assert list(merged.columns) == ['account_name', 'warehouse_name', 'total_credits']
+    assert sorted(zip(merged['account_name'], merged['warehouse_name'])) == \
+        [('dev', 'DEV'), ('prod', 'BI'), ('prod', 'ETL')]
+
+    summary = fleet.org_summary()
+    assert summary['total_credits_used'] == 16.0 and summary['top_account'] == 'prod'
+    assert summary['top_users'][0] == {'user': 'prod/ann', 'total_credits': 9.0}
+
+    # A failing account keeps its last good tables and reports the error; the others refresh
+    failing['dev'].update(TABLES)
+    results = fleet.refresh(tables=TABLES)
+    assert 'does not exist' in results['dev']['error'] and results['prod']['error'] is None
+    assert fleet.org_summary()['accounts_loaded'] == 2
+    with pytest.raises(KeyError):
+        fleet.refresh(accounts=['staging'])
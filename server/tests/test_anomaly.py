@@ -0,0 +1,71 @@
+import pandas as pd
+import pytest
+
+from anomaly import MIN_HISTORY, RESCORE_HOURS, AnomalyDetector
+
+HOURS = pd.date_range('2026-01-05', periods=MIN_HISTORY + 6, freq='h')
+
+
+def metering(credits, name='WH'):
+    return {'warehouse': pd.DataFrame({'hour_start': HOURS[:len(credits)], 'name': name, 'credits': credits})}
+
+
+@pytest.fixture
+def detector(tmp_path):
+    return AnomalyDetector('test', state_path=str(tmp_path / 'test.npz'))
+
+
+def test_only_hours_behind_the_rescore_window_settle(detector):
+    detector.observe(metering([1.0] * len(HOURS)))
+    baselines = detector.baselines['warehouse']
+    assert baselines.last_hour == HOURS[-1 - RESCORE_HOURS]
+    assert baselines.count[baselines.index['WH']] == len(HOURS) - RESCORE_HOURS
+
+    # Observing the same hours again re-scores the tail without folding it in twice
+    detector.observe(metering([1.0] * len(HOURS)))
+    assert baselines.count[baselines.index['WH']] == len(HOURS) - RESCORE_HOURS
+    assert detector.last_run['hours_scored'] == RESCORE_HOURS
+
+
+def test_spike_in_unsettled_hour_is_replaced_by_its_correction(detector):
+    spiked = [1.0] * (len(HOURS) - 1) + [10.0]
+    [anomaly] = detector.observe(metering(spiked))
+    assert anomaly['hour_start'] == HOURS[-1].isoformat()
+    assert anomaly['severity'] == 'critical' and anomaly['baseline_credits'] == 1.0
+    assert detector.last_run['new_anomalies'] == 1
+
+    # Still spiked on the next run: reported again, but it keeps when it was first seen
+    [again] = detector.observe(metering(spiked))
+    assert again['detected_at'] == anomaly['detected_at']
+    assert detector.last_run['new_anomalies'] == 0
+    assert len(detector.recent()) == 1
+
+    # Late metering revises the hour down; the earlier verdict is withdrawn
+    assert detector.observe(metering([1.0] * len(HOURS))) == []
+    assert detector.recent() == []
+
+
+def test_settled_spike_is_kept_once_it_leaves_the_window(detector):
+    spiked = [1.0] * (len(HOURS) - RESCORE_HOURS - 1) + [10.0]
+    detector.observe(metering(spiked))
+    assert len(detector.recent()) == 1
+
+    # Later hours push the spike out of the window; it is no longer re-scored or withdrawn
+    detector.observe(metering(spiked + [1.0] * RESCORE_HOURS))
+    assert [a['hour_start'] for a in detector.recent()] == [HOURS[len(spiked) - 1].isoformat()]
+
+
+def test_small_excess_and_short_history_are_not_reported(detector):
+    # Far above a flat baseline in z terms, but under MIN_EXCESS_CREDITS
+    assert detector.observe(metering([0.1] * (len(HOURS) - 1) + [0.5])) == []
+
+    other = AnomalyDetector('short', state_path=detector.state_path.replace('test', 'short'))
+    assert other.observe(metering([1.0] * (MIN_HISTORY - 1) + [10.0])) == []
+
+
+def test_workers_continue_from_the_shared_state(detector):
+    detector.observe(metering([1.0] * (len(HOURS) - 1) + [10.0]))
+    other = AnomalyDetector('test', state_path=detector.state_path)
+    assert other.baselines['warehouse'].last_hour == detector.baselines['warehouse'].last_hour
+    assert [a['name'] for a in other.recent(scope='warehouse', min_severity='high')] == ['WH']
+    assert other.recent(scope='user') == []
@@ -0,0 +1,134 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def attribution(snowflake_connector):
+    import attribution
+    return attribution
+
+
+def queries(*rows):
+    return pd.DataFrame(rows, columns=['query_id', 'warehouse_name', 'user_name', 'role_name', 'end_time',
+                                       'execution_time'])
+
+
+def metering(*rows):
+    return pd.DataFrame(rows, columns=['warehouse_name', 'start_time', 'credits_used_compute',
+                                       'credits_used_cloud_services'])
+
+
+def test_hour_credits_split_by_overlap(attribution):
+    per_query = attribution.attribute_hours(
+        queries(
+            # 10:45-11:15 spans two hours; the other runs 10:00-10:15 on the same warehouse
+            ('q1', 'wh', 'ann', 'analyst', '2026-01-01 11:15:00', 30 * 60 * 1000),
+            ('q2', 'WH', 'bob', 'loader', '2026-01-01 10:15:00', 15 * 60 * 1000),
+        ),
+        metering(('WH', '2026-01-01 10:00:00', 3.0, 0.3), ('WH', '2026-01-01 11:00:00', 1.0, 0.0)))
+
+    rows = {(r.query_id, r.hour_start.hour): r for r in per_query.itertuples()}
+    assert set(rows) == {('q1', 10), ('q1', 11), ('q2', 10)}
+    # Hour 10: q1 ran 15 minutes and q2 15 minutes, so each takes half
+    assert rows[('q1', 10)].overlap_seconds == 900
+    assert rows[('q1', 10)].attributed_credits_compute == pytest.approx(1.5)
+    assert rows[('q2', 10)].attributed_credits == pytest.approx(1.65)
+    # Hour 11: q1 alone
+    assert rows[('q1', 11)].attributed_credits == pytest.approx(1.0)
+    assert per_query['attributed_credits'].sum() == pytest.approx(4.3)
+    # Names come from the metering rows
+    assert set(per_query['warehouse_name']) == {'WH'}
+
+
+def test_unmetered_and_idle_hours_attribute_nothing(attribution):
+    per_query = attribution.attribute_hours(
+        queries(
+            ('q1', 'OTHER', 'ann', 'analyst', '2026-01-01 10:30:00', 60 * 1000),
+            # Ends exactly on the hour boundary: nothing of it belongs to hour 11
+            ('q2', 'WH', 'bob', 'loader', '2026-01-01 11:00:00', 60 * 1000),
+        ),
+        metering(('WH', '2026-01-01 10:00:00', 2.0, 0.0), ('WH', '2026-01-01 12:00:00', 5.0, 0.0)))
+    assert per_query[['query_id', 'attributed_credits']].values.tolist() == [['q2', 2.0]]
+
+
+def test_rollup_counts_distinct_queries(attribution):
+    per_query = attribution.attribute_hours(
+        queries(
+            ('q1', 'WH', 'ann', 'analyst', '2026-01-01 11:15:00', 30 * 60 * 1000),
+            ('q2', 'WH', 'ann', 'loader', '2026-01-01 10:15:00', 15 * 60 * 1000),
+        ),
+        metering(('WH', '2026-01-01 10:00:00', 3.0, 0.0), ('WH', '2026-01-01 11:00:00', 1.0, 0.0)))
+    users = attribution.rollup(per_query, 'user_name').sort_values('hour_start')
+    assert users['query_count'].tolist() == [2, 1]
+    assert users['attributed_credits'].tolist() == pytest.approx([3.0, 1.0])
+
+
+class Connection:
+    def __init__(self, fail_on=None):
+        self.statements = []
+        self.fail_on = fail_on
+        self.closed = False
+
+    def cursor(self):
+        return Cursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+class Cursor:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, statement, params=None):
+        if self.connection.fail_on and statement.startswith(self.connection.fail_on):
+            raise RuntimeError('statement failed')
+        self.connection.statements.append(statement.split(' WHERE ')[0])
+
+    def close(self):
+        pass
+
+
+def publish(attribution, monkeypatch, connection):
+    loads = []
+    monkeypatch.setattr(attribution, 'write_pandas',
+                        lambda conn, frame, table, **kwargs: loads.append((conn, table, len(frame))))
+    shared = []
+    attributor = attribution.CreditAttributor(lambda query, params=None: shared.append(query), lambda: connection)
+    frame = pd.DataFrame({'hour_start': [datetime(2026, 1, 1, 10)], 'warehouse_name': ['WH'],
+                          'attributed_credits': [1.0]})
+    attributor._publish({'query': frame, 'user': frame.iloc[:0], 'role': frame}, datetime(2026, 1, 1))
+    return loads, shared
+
+
+def test_publish_runs_on_its_own_connection(attribution, monkeypatch):
+    connection = Connection()
+    loads, shared = publish(attribution, monkeypatch, connection)
+
+    assert shared == []
+    assert [(conn is connection, table) for conn, table, _ in loads] == [
+        (True, 'FINOPS_QUERY_ATTRIBUTION__LOAD'), (True, 'FINOPS_ROLE_ATTRIBUTION__LOAD')]
+    statements = connection.statements
+    assert statements[statements.index('BEGIN'):] == [
+        'BEGIN',
+        'DELETE FROM FINOPS_QUERY_ATTRIBUTION',
+        'INSERT INTO FINOPS_QUERY_ATTRIBUTION (HOUR_START, WAREHOUSE_NAME, ATTRIBUTED_CREDITS) '
+        'SELECT HOUR_START, WAREHOUSE_NAME, ATTRIBUTED_CREDITS FROM FINOPS_QUERY_ATTRIBUTION__LOAD',
+        # Hours with nothing attributed are still cleared
+        'DELETE FROM FINOPS_USER_ATTRIBUTION',
+        'DELETE FROM FINOPS_ROLE_ATTRIBUTION',
+        'INSERT INTO FINOPS_ROLE_ATTRIBUTION (HOUR_START, WAREHOUSE_NAME, ATTRIBUTED_CREDITS) '
+        'SELECT HOUR_START, WAREHOUSE_NAME, ATTRIBUTED_CREDITS FROM FINOPS_ROLE_ATTRIBUTION__LOAD',
+        'COMMIT'
+    ]
+    assert connection.closed
+
+
+def test_failed_publish_rolls_back_and_closes(attribution, monkeypatch):
+    connection = Connection(fail_on='INSERT INTO FINOPS_ROLE')
+    with pytest.raises(RuntimeError):
+        publish(attribution, monkeypatch, connection)
+    assert connection.statements[-1] == 'ROLLBACK' and 'COMMIT' not in connection.statements
+    assert connection.closed
@@ -0,0 +1,84 @@
+import numpy as np
+
+from bloom import BloomFilter, KnownIdFilter
+
+
+def test_bloom_has_no_false_negatives_and_few_false_positives():
+    bloom = BloomFilter(10000, error_rate=0.01)
+    known = [f"01b{i:09d}" for i in range(10000)]
+    bloom.add_many(known)
+    assert bloom.contains_many(known).all()
+    unknown = [f"02c{i:09d}" for i in range(10000)]
+    assert bloom.contains_many(unknown).mean() < 0.03
+    assert bloom.contains_many([]).shape == (0,)
+
+
+class Source:
+    def __init__(self, ids):
+        self.ids, self.version, self.loads = list(ids), 1, 0
+
+    def load_ids(self):
+        self.loads += 1
+        return self.ids
+
+
+def test_partition_and_negative_cache():
+    source = Source(['a', 'b'])
+    known = KnownIdFilter(source.load_ids)
+    assert known.partition(['a', 'zzz', 'b']) == (['a', 'b'], ['zzz'])
+    known.record_missing(['b'])
+    assert known.partition(['a', 'b']) == (['a'], ['b'])
+    assert known.partition([]) == ([], [])
+    assert source.loads == 1
+
+
+def test_negative_cache_is_bounded():
+    known = KnownIdFilter(lambda: [], negative_cache_size=2)
+    known.record_missing(['a', 'b', 'c'])
+    assert list(known.negative) == ['b', 'c']
+
+
+def test_reloads_when_source_version_changes():
+    source = Source(['a'])
+    known = KnownIdFilter(source.load_ids, load_version=lambda: source.version, check_seconds=0)
+    assert known.partition(['new']) == ([], ['new'])
+    known.record_missing(['new'])
+
+    # Rebuilt elsewhere: a new version is picked up and the negative cache dropped
+    source.ids.append('new')
+    source.version = 2
+    assert known.partition(['new']) == (['new'], [])
+    assert source.loads == 2
+
+    # An unchanged version does not reload
+    known.partition(['a'])
+    assert source.loads == 2
+
+
+def test_reloads_after_ttl_and_invalidate():
+    source = Source(['a'])
+    known = KnownIdFilter(source.load_ids, ttl_seconds=0)
+    known.partition(['a'])
+    known.partition(['a'])
+    assert source.loads == 2
+
+    source = Source(['a'])
+    known = KnownIdFilter(source.load_ids)
+    known.partition(['a'])
+    known.invalidate()
+    known.partition(['a'])
+    assert source.loads == 2
+
+
+def test_version_check_failure_keeps_filter():
+    source = Source(['a'])
+
+    def broken():
+        raise RuntimeError('no connection')
+
+    known = KnownIdFilter(source.load_ids, check_seconds=0)
+    known.partition(['a'])
+    known.load_version = broken
+    assert known.partition(['a']) == (['a'], [])
+    assert source.loads == 1
+    assert isinstance(known.bloom.bits, np.ndarray)
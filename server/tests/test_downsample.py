@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+
+from downsample import downsample, lttb, minmax
+
+
+def test_lttb_keeps_endpoints_and_spike():
+    x = np.arange(1000)
+    y = np.zeros(1000)
+    y[437] = 100.0
+    keep = lttb(x, y, 50)
+    assert len(keep) == 50
+    assert keep[0] == 0 and keep[-1] == 999
+    assert 437 in keep
+    assert (np.diff(keep) > 0).all()
+
+
+def test_lttb_short_series_unchanged():
+    assert lttb(np.arange(10), np.arange(10), 20).tolist() == list(range(10))
+    assert lttb(np.arange(10), np.arange(10), 2).tolist() == list(range(10))
+
+
+def test_minmax_keeps_extremes_of_each_bucket():
+    y = np.array([5, 1, 9, 3, 7, 2, 8, 0], dtype=float)
+    keep = minmax(np.arange(8), y, 2)
+    # Buckets [0..3] and [4..7]: min and max of each, in x order
+    assert keep.tolist() == [1, 2, 6, 7]
+
+
+def test_downsample_methods():
+    x = np.arange(10000, dtype=float)
+    y = np.sin(x / 100)
+    for method in ('lttb', 'minmax'):
+        xs, ys = downsample(x, y, 200, method)
+        assert len(xs) <= 200
+        assert y.max() == pytest.approx(ys.max(), abs=1e-3)
+    with pytest.raises(ValueError):
+        downsample(x, y, 200, 'mean')
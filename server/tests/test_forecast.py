@@ -0,0 +1,66 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from forecast import (MIN_HISTORY_DAYS, MODELS, SEASON, forecast_matrix, forecast_scope, holt_winters, linear_trend,
+                      seasonal_naive)
+
+WEEK = np.array([10.0, 12, 11, 13, 12, 2, 1])
+
+
+def test_seasonal_naive_repeats_last_week():
+    history = np.tile(WEEK, 4)[None, :]
+    assert seasonal_naive(history, 10)[0].tolist() == np.tile(WEEK, 2)[:10].tolist()
+
+
+def test_linear_trend_extends_a_line():
+    history = (3.0 + 0.5 * np.arange(40))[None, :]
+    np.testing.assert_allclose(linear_trend(history, 3)[0], [23.0, 23.5, 24.0])
+
+
+def test_holt_winters_follows_weekly_pattern():
+    history = np.tile(WEEK, 8)[None, :]
+    np.testing.assert_allclose(holt_winters(history, SEASON)[0], WEEK, atol=0.5)
+
+
+def test_forecast_matrix_picks_model_per_row():
+    days = np.arange(8 * SEASON, dtype=float)
+    history = np.stack([np.tile(WEEK, 8), 5.0 + 2.0 * days])
+    forecast, chosen, mae = forecast_matrix(history, SEASON)
+    assert forecast.shape == (2, SEASON)
+    # Weekly spend repeats; steady growth is a line
+    assert MODELS[chosen[0]] in ('seasonal_naive', 'holt_winters')
+    assert MODELS[chosen[1]] == 'linear_trend'
+    assert mae[1] == pytest.approx(0.0, abs=1e-9)
+    np.testing.assert_allclose(forecast[1], 5.0 + 2.0 * np.arange(8 * SEASON, 9 * SEASON))
+    # Never projects negative spend
+    falling = (100.0 - 5.0 * days)[None, :]
+    assert (forecast_matrix(falling, 30)[0] >= 0).all()
+
+
+def test_forecast_scope_projects_month_end():
+    today = datetime(2026, 3, 16, 9, 30)
+    days = pd.date_range('2026-01-01', '2026-03-15')
+    daily = pd.DataFrame({'DAY': days.date, 'NAME': 'WH', 'CREDITS': 4.0})
+    # A name that only spent once; missing days count as zero spend
+    daily = pd.concat([daily, pd.DataFrame({'DAY': [days[-1].date()], 'NAME': ['ADHOC'], 'CREDITS': [1.0]})])
+    calls = []
+
+    def execute_query(query, params):
+        calls.append(params)
+        return daily.copy()
+
+    result = forecast_scope(execute_query, 'warehouse', days=30, today=today)
+    assert calls == [{'since': '2026-02-14 00:00:00 +00:00', 'until': '2026-03-16 00:00:00 +00:00'}]
+    assert result['history_days'] == 30
+    forecasts = result['forecasts'].set_index('name')
+    assert forecasts.loc['WH', 'month_to_date'] == pytest.approx(15 * 4.0)
+    assert forecasts.loc['WH', 'projected_month_total'] == pytest.approx(31 * 4.0)
+    assert forecasts.loc['ADHOC', 'month_to_date'] == 1.0
+    assert list(forecasts.index) == ['WH', 'ADHOC']
+    # Short windows are widened to what the backtest needs
+    assert forecast_scope(execute_query, 'warehouse', days=7, today=today)['history_days'] == MIN_HISTORY_DAYS
+    with pytest.raises(ValueError):
+        forecast_scope(execute_query, 'database')
@@ -0,0 +1,115 @@
+import time
+
+import pytest
+
+pytest.importorskip('flask')
+
+from jobs import ACTIVE_STATES, JobManager
+
+
+class FakeConnection:
+    """Records statements; async queries finish after `polls` status checks, or fail with `error`"""
+
+    def __init__(self, polls=0, error=None):
+        self.polls, self.error = polls, error
+        self.statements, self.cursors = [], []
+        self.rows = [('WH', 1.5)]
+
+    def cursor(self):
+        self.cursors.append(FakeCursor(self))
+        return self.cursors[-1]
+
+    def get_query_status_throw_if_error(self, query_id):
+        if self.error:
+            raise RuntimeError(self.error)
+        self.polls -= 1
+        return 'RUNNING' if self.polls >= 0 else 'SUCCESS'
+
+    def is_still_running(self, status):
+        return status == 'RUNNING'
+
+
+class FakeCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.closed = False
+        self.description = [('WAREHOUSE_NAME',), ('CREDITS',)]
+
+    def execute(self, sql, params=None, **kwargs):
+        self.connection.statements.append(sql)
+
+    def execute_async(self, sql, _statement_params=None):
+        self.connection.statements.append(sql)
+        self.sfqid = f"q{len(self.connection.statements)}"
+
+    def get_results_from_sfqid(self, query_id):
+        pass
+
+    def fetchall(self):
+        return self.connection.rows
+
+    def close(self):
+        self.closed = True
+
+
+def manager_for(connection, tmp_path, steps):
+    manager = JobManager(lambda: connection, component='test', state_path=str(tmp_path / 'jobs.json'),
+                         poll_interval=0.01)
+    manager.register_kind('refresh', lambda params: steps)
+    return manager
+
+
+def finished(manager, job_id, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while manager.describe(job_id)['status'] in ACTIVE_STATES:
+        assert time.monotonic() < deadline, "job did not finish"
+        time.sleep(0.01)
+    return manager.describe(job_id)
+
+
+def test_select_steps_deliver_rows(tmp_path):
+    connection = FakeConnection(polls=2)
+    received = []
+    manager = manager_for(connection, tmp_path, [('warehouses', 'SELECT * FROM W', received.append)])
+    job = finished(manager, manager.submit('refresh')['job_id'])
+    assert job['status'] == 'succeeded' and job['steps'][0]['rows'] == 1
+    assert received[0]['CREDITS'].tolist() == [1.5]
+    assert connection.statements == ['SELECT * FROM W'] and connection.cursors[0].closed
+
+
+def test_procedure_steps_are_tagged_for_the_whole_session(tmp_path):
+    connection = FakeConnection()
+    manager = manager_for(connection, tmp_path, [('warehouses', 'CALL REFRESH_WAREHOUSE_METRICS()', None)])
+    assert finished(manager, manager.submit('refresh')['job_id'])['status'] == 'succeeded'
+    tag, call, unset = connection.statements
+    assert tag.startswith("ALTER SESSION SET QUERY_TAG = '") and call == 'CALL REFRESH_WAREHOUSE_METRICS()'
+    assert unset == 'ALTER SESSION UNSET QUERY_TAG'
+
+
+def test_failed_step_closes_its_cursor_and_unsets_the_tag(tmp_path):
+    connection = FakeConnection(error='Warehouse suspended')
+    manager = manager_for(connection, tmp_path, [('warehouses', 'CALL REFRESH_WAREHOUSE_METRICS()', None),
+                                                 ('users', 'CALL REFRESH_USER_METRICS()', None)])
+    job = finished(manager, manager.submit('refresh')['job_id'])
+    assert job['status'] == 'failed' and job['error'] == 'Warehouse suspended'
+    assert [step['status'] for step in job['steps']] == ['failed', 'pending']
+    assert connection.statements[-1] == 'ALTER SESSION UNSET QUERY_TAG'
+    assert all(cursor.closed for cursor in connection.cursors)
+
+
+def test_cancel_stops_the_query_and_closes_its_cursor(tmp_path):
+    connection = FakeConnection(polls=10 ** 6)
+    manager = manager_for(connection, tmp_path, [('warehouses', 'SELECT * FROM W', None),
+                                                 ('users', 'SELECT * FROM U', None)])
+    job_id = manager.submit('refresh')['job_id']
+    deadline = time.monotonic() + 5
+    while manager.describe(job_id)['steps'][0]['status'] != 'running':
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    manager.cancel(job_id)
+    job = finished(manager, job_id)
+    assert job['status'] == 'cancelled'
+    assert [step['status'] for step in job['steps']] == ['cancelled', 'skipped']
+    assert 'SELECT SYSTEM$CANCEL_QUERY(%s)' in connection.statements
+    assert all(cursor.closed for cursor in connection.cursors)
@@ -0,0 +1,111 @@
+import pytest
+
+from materialize import (FULL_REFRESH_LAG, Definition, check_definition, definitions, dynamic_table_ddl, lag_seconds,
+                         lag_string, task_ddl)
+
+SELECT = """SELECT
+    warehouse_name,
+    SUM(credits_used) as credits
+FROM SNOWFLAKE.ACCOUNT_USAGE.WAREHOUSE_METERING_HISTORY
+WHERE start_time >= DATEADD('day', -30, '2026-01-01 00:00:00 +00:00'::TIMESTAMP_TZ)
+GROUP BY warehouse_name"""
+
+
+def definition(**changes):
+    fields = dict(table='FINOPS_WAREHOUSE_COSTS', select=SELECT, cluster_by=None, lag='15 minutes')
+    fields.update(changes)
+    return Definition(**fields)
+
+
+def test_lag_round_trip():
+    assert lag_string(3600) == '1 hour'
+    assert lag_string(900) == '15 minutes'
+    assert lag_seconds('2 hours') == 7200
+    with pytest.raises(ValueError):
+        lag_seconds('soon')
+
+
+def test_dynamic_table_ddl():
+    (ddl,) = dynamic_table_ddl(definition(cluster_by='warehouse_name'), warehouse='FINOPS_WH', refresh_mode='AUTO')
+    assert ddl.startswith('CREATE OR REPLACE DYNAMIC TABLE FINOPS_WAREHOUSE_COSTS')
+    assert "TARGET_LAG = '15 minutes'" in ddl
+    assert 'REFRESH_MODE = AUTO' in ddl
+    assert 'WAREHOUSE = FINOPS_WH' in ddl
+    assert 'CLUSTER BY (warehouse_name)' in ddl
+    assert ddl.endswith(SELECT)
+
+
+def test_task_ddl_stages_and_swaps():
+    create, resume = task_ddl(definition(lag='1 hour'), warehouse='FINOPS_WH')
+    assert create.startswith('CREATE OR REPLACE TASK FINOPS_WAREHOUSE_COSTS__REFRESH')
+    assert "SCHEDULE = '60 MINUTE'" in create
+    body = create[create.index('$$'):]
+    assert 'CREATE OR REPLACE TABLE FINOPS_WAREHOUSE_COSTS__STAGING AS' in body
+    # The live table is only ever replaced by the swap, after the staging build
+    assert body.index('__STAGING AS') < body.index('SWAP WITH FINOPS_WAREHOUSE_COSTS__STAGING')
+    assert resume == 'ALTER TASK FINOPS_WAREHOUSE_COSTS__REFRESH RESUME'
+
+
+def test_task_ddl_calls_procedure():
+    create, _ = task_ddl(definition(procedure='CALL REFRESH_WAREHOUSE_COSTS()'))
+    assert create.rstrip().endswith('CALL REFRESH_WAREHOUSE_COSTS()')
+    assert 'EXECUTE IMMEDIATE' not in create
+
+
+def test_check_definition_accepts_fixed_definition():
+    for mode in ('dynamic', 'tasks'):
+        assert check_definition(definition(), mode, 'AUTO') == {'errors': [], 'warnings': []}
+
+
+def test_check_definition_nondeterministic_functions():
+    clock = definition(select=SELECT.replace("'2026-01-01 00:00:00 +00:00'::TIMESTAMP_TZ", 'CURRENT_TIMESTAMP()'))
+    assert check_definition(clock, 'dynamic', 'AUTO')['warnings'] == [
+        'CURRENT_TIMESTAMP makes every refresh a full refresh']
+    assert check_definition(clock, 'dynamic', 'INCREMENTAL')['errors'] == [
+        'INCREMENTAL refresh is not possible with CURRENT_TIMESTAMP']
+    # Asked for explicitly, a full refresh is not worth a warning
+    assert check_definition(clock, 'dynamic', 'FULL') == {'errors': [], 'warnings': []}
+    # Inside a string literal it is only text
+    quoted = definition(select="SELECT 'CURRENT_TIMESTAMP' as label")
+    assert check_definition(quoted, 'dynamic', 'INCREMENTAL')['errors'] == []
+
+
+@pytest.mark.parametrize('changes, error', [
+    ({'lag': '30 seconds'}, "target lag 30 seconds is below Snowflake's one minute minimum"),
+    ({'select': SELECT + ')'}, 'unbalanced parentheses'),
+    ({'select': SELECT + '; DROP TABLE X'}, 'more than one statement'),
+    ({'select': 'WITH x AS (SELECT %(anchor)s) SELECT * FROM x'}, 'unresolved bind parameter'),
+    ({'select': 'DELETE FROM X'}, 'definition does not start with SELECT or WITH'),
+])
+def test_check_definition_errors(changes, error):
+    assert error in check_definition(definition(**changes), 'dynamic', 'AUTO')['errors']
+
+
+def test_check_definition_rejects_dollar_quotes_in_tasks():
+    dollar = definition(select="SELECT $$text$$ as label")
+    assert check_definition(dollar, 'tasks')['errors'] == ['definition contains $$ and cannot be embedded in a task body']
+    assert check_definition(dollar, 'dynamic', 'AUTO')['errors'] == []
+
+
+@pytest.fixture
+def builders(snowflake_connector, monkeypatch, tmp_path):
+    # Importing server.py starts its job manager, which keeps state under the working directory
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('FINOPS_SHARED_CACHE_DIR', '')
+
+
+@pytest.mark.parametrize('source, tables', [('index', 8), ('server', 3)])
+def test_definitions_from_the_real_builders(builders, source, tables):
+    generated = definitions(source, days=30, target_lag='')
+    assert len(generated) == tables and len({d.table for d in generated}) == tables
+    for d in generated:
+        assert d.table.startswith('FINOPS_')
+        assert (d.procedure is not None) == (source == 'server')
+        # Every refresh recomputes the window, so nothing lags by less than the full-refresh floor
+        assert lag_seconds(d.lag) >= lag_seconds(FULL_REFRESH_LAG)
+        for mode in ('dynamic', 'tasks'):
+            assert check_definition(d, mode, 'FULL') == {'errors': [], 'warnings': []}, (d.table, mode)
+
+
+def test_explicit_target_lag_applies_to_every_table(builders):
+    assert {d.lag for d in definitions('index', target_lag='15 minutes')} == {'15 minutes'}
@@ -0,0 +1,71 @@
+import pandas as pd
+import pytest
+from flask import Flask
+
+from metrics import (QUERY_ERRORS, QUERY_ROWS, QUERY_SECONDS, MetricsRegistry, instrument_app, instrument_connector,
+                     statement_label, statement_scope)
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    latency = registry.histogram('test_seconds', 'Latency', buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.7, 5):
+        latency.observe(value, component='index')
+    assert registry.render().splitlines() == [
+        '# HELP test_seconds Latency',
+        '# TYPE test_seconds histogram',
+        'test_seconds_bucket{component="index",le="0.1"} 1',
+        'test_seconds_bucket{component="index",le="1"} 3',
+        'test_seconds_bucket{component="index",le="+Inf"} 4',
+        'test_seconds_sum{component="index"} 6.25',
+        'test_seconds_count{component="index"} 4',
+    ]
+
+
+def test_counter_labels_are_escaped_and_registered_once():
+    registry = MetricsRegistry()
+    counter = registry.counter('test_total', 'Things')
+    assert registry.counter('test_total', 'Things') is counter
+    counter.inc(2, table='say "hi"\n')
+    counter.inc(table='say "hi"\n')
+    assert 'test_total{table="say \\"hi\\"\\n"} 3' in registry.render()
+
+
+def test_statement_label():
+    assert statement_label('CREATE OR REPLACE TABLE finops_warehouse_costs AS SELECT 1') == 'FINOPS_WAREHOUSE_COSTS'
+    assert statement_label('CALL REFRESH_USER_METRICS()') == 'REFRESH_USER_METRICS'
+    assert statement_label('  select 1') == 'SELECT'
+    assert statement_label('') == 'EMPTY'
+    with statement_scope('warehouses'):
+        assert statement_label('SELECT * FROM FINOPS_X') == 'warehouses'
+    assert statement_label('SELECT * FROM FINOPS_X') == 'FINOPS_X'
+
+
+class Connector:
+    def execute_query(self, query, params=None):
+        if 'fail' in query:
+            raise RuntimeError(query)
+        return pd.DataFrame({'a': range(3)})
+
+
+def test_instrument_connector_counts_rows_errors_and_latency():
+    connector = instrument_connector(Connector(), 'test-metrics')
+    connector.execute_query('SELECT * FROM FINOPS_METRICS_TEST')
+    with pytest.raises(RuntimeError):
+        connector.execute_query('SELECT fail FROM FINOPS_METRICS_TEST')
+    labels = dict(component='test-metrics', statement='FINOPS_METRICS_TEST')
+    assert QUERY_ROWS.value(**labels) == 3
+    assert QUERY_ERRORS.value(**labels) == 1
+    assert QUERY_SECONDS.value(**labels)[2] == 2
+
+
+def test_instrument_app_times_routes_and_serves_metrics():
+    app = Flask(__name__)
+    instrument_app(app, 'test-app')
+    app.add_url_rule('/api/things/<name>', 'thing', lambda name: {'name': name})
+    client = app.test_client()
+    assert client.get('/api/things/a').status_code == 200
+    body = client.get('/metrics').get_data(as_text=True)
+    assert ('finops_http_request_duration_seconds_count{component="test-app",endpoint="/api/things/<name>",'
+            'method="GET",status="200"} 1') in body
+    assert 'finops_http_response_bytes_total{component="test-app",endpoint="/api/things/<name>"}' in body
@@ -0,0 +1,62 @@
+import os
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('flask')
+
+from offload import OffloadPool, render_csv, summary_metrics
+
+
+def crash(frames):
+    """Kills the worker the way an OOM kill would"""
+    os._exit(1)
+
+
+def worker_pid(frames):
+    return os.getpid()
+
+
+@pytest.fixture
+def pool():
+    pool = OffloadPool(max_workers=1, min_rows=0)
+    yield pool
+    pool.shutdown()
+
+
+def test_small_frames_run_inline():
+    pool = OffloadPool(max_workers=1, min_rows=10)
+    assert pool.run(worker_pid, {'df': pd.DataFrame({'A': range(9)})}) == os.getpid()
+    status = pool.status()
+    assert status['inline'] == 1 and not status['started']
+
+
+def test_large_frames_run_in_a_worker(pool):
+    df = pd.DataFrame({'NAME': ['a', 'b'], 'CREDITS': [1.5, 2.0]})
+    assert pool.run(worker_pid, {'df': df}) != os.getpid()
+    assert pool.run(render_csv, {'df': df}) == b'NAME,CREDITS\na,1.5\nb,2.0\n'
+    assert pool.status()['completed'] == 2
+
+
+def test_summary_matches_inline_run(pool):
+    frames = {
+        'warehouses': pd.DataFrame({'warehouse_name': ['WH1', 'WH2'], 'total_credits': [3.0, 1.5]}),
+        'users': pd.DataFrame({'user_name': ['A'], 'total_credits': [4.5]}),
+        'databases': pd.DataFrame({'database_name': ['DB'], 'total_storage_gb': [12.0]}),
+        'serverless': pd.DataFrame({'service_id': [1, 2, 2]}),
+    }
+    assert pool.run(summary_metrics, frames) == summary_metrics(frames)
+
+
+def test_broken_pool_is_replaced(pool):
+    df = pd.DataFrame({'A': [1]})
+    with pytest.raises(BrokenProcessPool):
+        pool.run(crash, {'df': df})
+    status = pool.status()
+    # The task was retried once on a fresh pool before giving up
+    assert status['restarts'] == 2 and status['failed'] == 1 and not status['started']
+
+    # Later tasks get a new pool instead of the broken one
+    assert pool.run(render_csv, {'df': df}) == b'A\n1\n'
+    assert pool.status()['started']
@@ -0,0 +1,88 @@
+import pandas as pd
+import pytest
+
+from query_filters import (Condition, FilterError, apply_to_frame, equality_conditions, frame_schema, order_by_sql,
+                           parse_filter, parse_sort, where_sql)
+from table_schemas import BOOLEAN, NUMBER, STRING, TIMESTAMP
+
+SCHEMA = {'WAREHOUSE_NAME': STRING, 'TOTAL_CREDITS': NUMBER, 'START_TIME': TIMESTAMP, 'IS_ACTIVE': BOOLEAN}
+
+
+def test_parse_filter():
+    conditions = parse_filter('total_credits>10; warehouse_name=in:A,B;start_time=between:2026-01-01,2026-01-31;'
+                              'is_active=true;warehouse_name!=in:C', SCHEMA)
+    assert conditions == [
+        Condition('TOTAL_CREDITS', '>', [10]),
+        Condition('WAREHOUSE_NAME', 'in', ['A', 'B']),
+        Condition('START_TIME', 'between', [pd.Timestamp('2026-01-01'), pd.Timestamp('2026-01-31')]),
+        Condition('IS_ACTIVE', '=', [True]),
+        Condition('WAREHOUSE_NAME', 'not_in', ['C']),
+    ]
+    assert parse_filter('total_credits>=1.5', SCHEMA)[0].values == [1.5]
+    assert parse_filter(None, SCHEMA) == [] and parse_filter('', SCHEMA) == []
+
+
+@pytest.mark.parametrize('expression, message', [
+    ('credits>1', "Unknown filter column 'credits'"),
+    ('total_credits>ten', "Invalid number value 'ten' for TOTAL_CREDITS"),
+    ('is_active>true', 'Column IS_ACTIVE only supports = and !='),
+    ('is_active=yes', "Invalid boolean value 'yes' for IS_ACTIVE"),
+    ('start_time=between:2026-01-01', 'between needs exactly two values for START_TIME'),
+    ('warehouse_name=in:', 'Empty IN list for WAREHOUSE_NAME'),
+    ('warehouse_name', "Cannot parse filter 'warehouse_name'"),
+])
+def test_parse_filter_errors(expression, message):
+    with pytest.raises(FilterError, match=message):
+        parse_filter(expression, SCHEMA)
+
+
+def test_parse_sort_and_sql():
+    order = parse_sort('-total_credits,warehouse_name', SCHEMA)
+    assert order == [('TOTAL_CREDITS', False), ('WAREHOUSE_NAME', True)]
+    assert order_by_sql(order) == 'TOTAL_CREDITS DESC, WAREHOUSE_NAME ASC'
+    with pytest.raises(FilterError):
+        parse_sort('credits', SCHEMA)
+
+
+def test_where_sql_binds_every_value():
+    params = {'anchor': 'x'}
+    sql = where_sql(parse_filter('total_credits>10;warehouse_name=in:A,B;start_time=between:2026-01-01,2026-01-02',
+                                 SCHEMA), params)
+    assert sql == ('TOTAL_CREDITS > %(f1)s AND WAREHOUSE_NAME IN (%(f2)s, %(f3)s) '
+                   'AND START_TIME BETWEEN %(f4)s AND %(f5)s')
+    assert params['f1'] == 10 and params['f3'] == 'B'
+    # Timestamps are bound as datetimes, which the connector can bind
+    assert type(params['f4']).__name__ == 'datetime'
+
+
+def test_equality_conditions_type_string_values():
+    assert equality_conditions({'total_credits': '3'}, SCHEMA) == [Condition('TOTAL_CREDITS', '=', [3])]
+    assert equality_conditions({'anything': 'x'}) == [Condition('anything', '=', ['x'])]
+    with pytest.raises(FilterError):
+        equality_conditions({'anything': 'x'}, SCHEMA)
+
+
+def cached_frame():
+    return pd.DataFrame({
+        'WAREHOUSE_NAME': ['A', 'B', 'C', None],
+        'TOTAL_CREDITS': [5.0, 20.0, 12.0, 30.0],
+        'START_TIME': pd.to_datetime(['2026-01-01', '2026-01-05', '2026-02-01', '2026-01-10']),
+        'IS_ACTIVE': [True, False, True, True],
+    })
+
+
+def test_frame_schema():
+    assert frame_schema(cached_frame()) == SCHEMA
+
+
+def test_apply_to_frame_matches_sql_semantics():
+    df = cached_frame()
+    result = apply_to_frame(df, parse_filter('total_credits>10;start_time<2026-01-31', SCHEMA),
+                            parse_sort('-total_credits', SCHEMA), SCHEMA)
+    # The NULL warehouse row matches on credits and time
+    assert result['TOTAL_CREDITS'].tolist() == [30.0, 20.0]
+    # NULLs never match, not even != or NOT IN
+    assert apply_to_frame(df, parse_filter('warehouse_name!=A', SCHEMA), [], SCHEMA)['WAREHOUSE_NAME'].tolist() == [
+        'B', 'C']
+    assert len(apply_to_frame(df, parse_filter('warehouse_name!=in:A,B', SCHEMA), [], SCHEMA)) == 1
+    assert apply_to_frame(df, parse_filter('is_active=false', SCHEMA), [], SCHEMA)['WAREHOUSE_NAME'].tolist() == ['B']
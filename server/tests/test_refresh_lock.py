@@ -0,0 +1,93 @@
+import pytest
+
+from refresh_lock import FileLeaseBackend, LeaseLost, RefreshCoordinator, RefreshInProgress
+
+
+@pytest.fixture
+def backend(tmp_path):
+    return FileLeaseBackend(str(tmp_path))
+
+
+def test_file_lease_is_exclusive_until_it_expires(backend):
+    first = backend.try_acquire('FINOPS_X', 'host:1', ttl=60)
+    assert first.token == 1
+    assert backend.try_acquire('FINOPS_X', 'host:2', ttl=60) is None
+    # Other resources are independent
+    assert backend.try_acquire('FINOPS_Y', 'host:2', ttl=60).token == 1
+
+    backend.renew(first, ttl=-1)
+    second = backend.try_acquire('FINOPS_X', 'host:2', ttl=60)
+    assert second.token == 2
+    # The lapsed holder can neither renew nor release the newer lease
+    assert backend.renew(first, ttl=60) is False
+    backend.release(first, completed=True)
+    assert backend.current('FINOPS_X')['holder'] == 'host:2'
+    assert 'completed_at' not in backend.current('FINOPS_X')
+
+
+def test_file_lease_release(backend):
+    lease = backend.try_acquire('FINOPS_X', 'host:1', ttl=60)
+    backend.release(lease, completed=True)
+    record = backend.current('FINOPS_X')
+    assert record['holder'] is None and record['completed_at'] >= lease.acquired_at
+    assert backend.try_acquire('FINOPS_X', 'host:2', ttl=60).token == 2
+
+
+def test_coordinator_fences_superseded_lease(backend):
+    coordinator = RefreshCoordinator(backend, holder='host:1', lease_seconds=60)
+    other = RefreshCoordinator(backend, holder='host:2', lease_seconds=60, wait_seconds=0)
+    with coordinator.lease('FINOPS_X') as lease:
+        coordinator.ensure_held(lease)
+        with pytest.raises(RefreshInProgress) as busy:
+            other.acquire('FINOPS_X', wait=False)
+        assert busy.value.status['holder'] == 'host:1'
+
+        # The lease lapses and another worker takes over
+        backend.renew(lease, ttl=-1)
+        other.release(other.acquire('FINOPS_X', wait=False), completed=False)
+        with pytest.raises(LeaseLost):
+            coordinator.ensure_held(lease)
+
+
+def test_run_records_outcome_and_coalesces(backend):
+    coordinator = RefreshCoordinator(backend, holder='host:1', lease_seconds=60)
+    assert coordinator.run('FINOPS_X', lambda lease: lease.token)['result'] == 1
+    assert coordinator.status('FINOPS_X')['last_run_in_this_worker']['status'] == 'completed'
+
+    with pytest.raises(ValueError):
+        coordinator.run('FINOPS_X', lambda lease: (_ for _ in ()).throw(ValueError('boom')))
+    assert coordinator.status('FINOPS_X')['last_run_in_this_worker']['error'] == 'boom'
+
+
+
+class FinishedWhileWaiting(FileLeaseBackend):
+    """Another worker completes a refresh of the resource just before this caller gets the lease"""
+
+    def try_acquire(self, resource, holder, ttl):
+        if not self.current(resource).get('completed_at'):
+            self.release(super().try_acquire(resource, 'host:2', ttl), completed=True)
+        return super().try_acquire(resource, holder, ttl)
+
+
+def test_run_coalesces_refresh_completed_while_waiting(tmp_path):
+    coordinator = RefreshCoordinator(FinishedWhileWaiting(str(tmp_path)), holder='host:1', lease_seconds=60)
+    calls = []
+    assert coordinator.run('FINOPS_X', calls.append)['status'] == 'coalesced'
+    assert calls == []
+    # Callers that must run regardless (e.g. a forced rebuild) opt out
+    assert coordinator.run('FINOPS_X', calls.append, coalesce=False)['status'] == 'completed'
+    assert len(calls) == 1
+
+
+def test_forked_workers_lease_under_their_own_holder(backend, monkeypatch):
+    # Built before the fork, as with gunicorn --preload
+    coordinator = RefreshCoordinator(backend, lease_seconds=60, wait_seconds=0)
+    coordinator.acquire('FINOPS_X')
+    parent = coordinator.holder
+
+    monkeypatch.setattr('refresh_lock.os.getpid', lambda: 99999)
+    assert coordinator.holder != parent and coordinator.holder.endswith(':99999')
+    # The child starts without the parent's leases and cannot take over the parent's lease
+    with pytest.raises(RefreshInProgress):
+        coordinator.acquire('FINOPS_X')
+    assert coordinator.acquire('FINOPS_Y').holder.endswith(':99999')
@@ -0,0 +1,67 @@
+from datetime import datetime
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from anchors import anchor_literal, anchor_params
+from replay import QueryRecorder, ReplayMiss, ReplayUnsupported, query_key
+
+JAN = datetime(2026, 1, 5, 9, 30)
+FEB = datetime(2026, 2, 9, 14, 0)
+
+
+def test_query_key_ignores_formatting_and_time_anchors():
+    assert query_key("SELECT 1 -- probe\n  FROM t;") == query_key("SELECT 1 FROM t")
+    assert query_key(f"SELECT * FROM t WHERE ts < {anchor_literal(JAN)}") == \
+        query_key(f"SELECT * FROM t WHERE ts < {anchor_literal(FEB)}")
+    assert query_key("SELECT %(anchor)s", anchor_params(JAN)) == query_key("SELECT %(anchor)s", anchor_params(FEB))
+    assert query_key("SELECT %(n)s", {'n': 1}) != query_key("SELECT %(n)s", {'n': 2})
+
+
+def test_recorded_results_replay_without_the_connector(tmp_path):
+    calls = []
+
+    def execute_query(query, params=None):
+        calls.append(query)
+        return pd.DataFrame({'WAREHOUSE_NAME': ['WH'], 'CREDITS': [params['n'] * 1.5]})
+
+    recording = QueryRecorder('record', str(tmp_path)).wrap(execute_query)
+    recording("SELECT %(n)s", {'n': 2})
+    [entry] = QueryRecorder('record', str(tmp_path)).load_manifest()
+    assert entry['rows'] == 1 and entry['params'] == {'n': 2}
+
+    replaying = QueryRecorder('replay', str(tmp_path)).wrap(execute_query)
+    assert replaying("SELECT  %(n)s;", {'n': 2})['CREDITS'].tolist() == [3.0]
+    assert len(calls) == 1
+    with pytest.raises(ReplayMiss):
+        replaying("SELECT %(n)s", {'n': 3})
+
+
+def test_batches_are_recorded_whole_and_resliced(tmp_path):
+    def iter_query_batches(query, params=None, batch_size=100000):
+        yield pd.DataFrame({'N': [1, 2]})
+        yield pd.DataFrame({'N': [3]})
+
+    recorded = list(QueryRecorder('record', str(tmp_path)).wrap_batches(iter_query_batches)("SELECT N"))
+    assert [len(batch) for batch in recorded] == [2, 1]
+
+    replayed = QueryRecorder('replay', str(tmp_path)).wrap_batches(iter_query_batches)("SELECT N", batch_size=1)
+    assert [batch['N'].tolist() for batch in replayed] == [[1], [2], [3]]
+
+
+def test_procedures_are_refused_in_replay(tmp_path):
+    class Connector:
+        def execute_query(self, query, params=None):
+            return pd.DataFrame()
+
+        def execute_procedure(self, name):
+            return 'called'
+
+    connector = QueryRecorder('replay', str(tmp_path)).install(Connector())
+    with pytest.raises(ReplayUnsupported):
+        connector.execute_procedure('REFRESH_FINOPS_TABLES')
+    assert QueryRecorder('record', str(tmp_path)).install(Connector()).execute_procedure('P') == 'called'
+    with pytest.raises(ValueError):
+        QueryRecorder('rewind', str(tmp_path))
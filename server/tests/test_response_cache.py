@@ -0,0 +1,92 @@
+import gzip
+
+import pytest
+from flask import Flask
+
+from response_cache import ResponseCache, negotiate_encoding, request_variant
+
+app = Flask(__name__)
+
+
+def respond(cache, version, headers=None, body=b'{"rows":[]}', path='/api/tables/warehouses'):
+    calls = []
+
+    def build():
+        calls.append(1)
+        return body
+
+    with app.test_request_context(path, headers=headers or {}):
+        response = cache.respond(request_variant(), version, build)
+    return response, len(calls)
+
+
+def test_revalidation_answers_304_without_building():
+    cache = ResponseCache(ttl=0)
+    cache.bump('warehouses', '2026-01-01T10:00:00.123456')
+    first, built = respond(cache, cache.version('warehouses'))
+    assert first.status_code == 200 and built == 1
+    etag = first.headers['ETag']
+    assert etag.startswith('"') and etag.endswith('"')
+
+    again, built = respond(ResponseCache(ttl=0), cache.version('warehouses'), {'If-None-Match': etag})
+    assert again.status_code == 304 and built == 0
+    assert again.headers['ETag'] == etag
+
+
+def test_workers_agree_on_explicit_versions_only():
+    # Two workers that adopted the same refresh hand out the same ETag ...
+    worker_a, worker_b = ResponseCache(ttl=0), ResponseCache(ttl=0)
+    worker_a.bump('warehouses', '2026-01-01T10:00:00.123456')
+    worker_b.bump('warehouses', '2026-01-01T10:00:00.123456')
+    assert respond(worker_a, worker_a.version('warehouses'))[0].headers['ETag'] == \
+        respond(worker_b, worker_b.version('warehouses'))[0].headers['ETag']
+
+    # ... and a different refresh never revalidates an old one
+    etag = respond(worker_a, worker_a.version('warehouses'))[0].headers['ETag']
+    worker_b.bump('warehouses', '2026-01-01T11:00:00.000001')
+    response, built = respond(worker_b, worker_b.version('warehouses'), {'If-None-Match': etag})
+    assert response.status_code == 200 and built == 1
+
+
+def test_counter_versions_roll_over_with_the_ttl(monkeypatch):
+    cache = ResponseCache(ttl=300)
+    monkeypatch.setattr('response_cache.time.time', lambda: 1000.0)
+    version = cache.version('FINOPS_X', 'FINOPS_A')
+    assert version == 'FINOPS_A:0|FINOPS_X:0|t3'
+    cache.bump('FINOPS_X')
+    assert cache.version('FINOPS_X') == 'FINOPS_X:1|t3'
+    monkeypatch.setattr('response_cache.time.time', lambda: 1200.0)
+    assert cache.version('FINOPS_X') == 'FINOPS_X:1|t4'
+
+
+def test_body_is_built_once_per_version_and_variant():
+    cache = ResponseCache(ttl=0)
+    assert respond(cache, 'v1')[1] == 1
+    assert respond(cache, 'v1')[1] == 0
+    assert respond(cache, 'v1', path='/api/tables/warehouses?layout=columns')[1] == 1
+    assert respond(cache, 'v2')[1] == 1
+
+
+def test_compressed_variants_have_their_own_etag():
+    cache = ResponseCache(ttl=0)
+    body = b'{"rows":[' + b'1,' * 2000 + b'1]}'
+    plain, _ = respond(cache, 'v1', body=body)
+    zipped, _ = respond(cache, 'v1', {'Accept-Encoding': 'gzip'}, body=body)
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(zipped.get_data()) == body
+    assert zipped.headers['ETag'] != plain.headers['ETag']
+    assert zipped.headers['Vary'] == 'Accept-Encoding'
+    # A gzip ETag still revalidates when the client sends it back
+    assert respond(cache, 'v1', {'Accept-Encoding': 'gzip', 'If-None-Match': zipped.headers['ETag']},
+                   body=body)[0].status_code == 304
+
+
+@pytest.mark.parametrize('header, size, expected', [
+    ('gzip, deflate', 5000, 'gzip'),
+    ('gzip;q=0', 5000, 'identity'),
+    ('gzip', 10, 'identity'),
+    ('', 5000, 'identity'),
+])
+def test_negotiate_encoding(header, size, expected, monkeypatch):
+    monkeypatch.setattr('response_cache._ENCODERS', {'gzip': gzip.compress})
+    assert negotiate_encoding(header, size) == expected
@@ -0,0 +1,101 @@
+import time
+
+import pandas as pd
+
+from scheduler import HOUR, TableScheduler, register_scheduler_routes, sql_sources
+
+
+class Watermarks:
+    """Stands in for the ACCOUNT_USAGE watermark query"""
+
+    def __init__(self, **sources):
+        self.sources = sources
+        self.queries = []
+
+    def __call__(self, query, params=None):
+        self.queries.append((query, params))
+        return pd.DataFrame({'SOURCE': list(self.sources), 'WATERMARK': list(self.sources.values())})
+
+
+def run_due(scheduler, name):
+    scheduler.run_now(name)
+    scheduler.tick()
+    return scheduler.history[-1]
+
+
+def test_sql_sources_only_watermarked_views():
+    sql = """SELECT * FROM SNOWFLAKE.ACCOUNT_USAGE.QUERY_HISTORY q
+             JOIN snowflake.account_usage.users u ON q.user_name = u.name
+             JOIN SNOWFLAKE.ACCOUNT_USAGE.QUERY_HISTORY q2 ON q.query_id = q2.query_id"""
+    assert sql_sources(sql) == ['QUERY_HISTORY']
+
+
+def test_skips_until_a_source_advances():
+    watermarks = Watermarks(QUERY_HISTORY=pd.Timestamp('2026-01-01 10:00:00', tz='UTC'))
+    scheduler = TableScheduler(watermarks, 'test')
+    runs = []
+    scheduler.add('FINOPS_X', HOUR, lambda: runs.append(1), sources=['QUERY_HISTORY'])
+
+    assert run_due(scheduler, 'FINOPS_X')['status'] == 'completed'
+    record = run_due(scheduler, 'FINOPS_X')
+    assert record['status'] == 'skipped' and record['reason'] == 'no new rows in QUERY_HISTORY'
+    assert len(runs) == 1
+    # The next watermark query only looks back from the stored watermark, bound as UTC
+    assert watermarks.queries[-1][1] == {'since': '2026-01-01 10:00:00 +00:00'}
+
+    watermarks.sources['QUERY_HISTORY'] = pd.Timestamp('2026-01-01 11:00:00', tz='UTC')
+    assert run_due(scheduler, 'FINOPS_X')['status'] == 'completed'
+    assert len(runs) == 2
+    # Skips do not replace the last real run
+    assert scheduler.schedule()[0]['last_run']['status'] == 'completed'
+
+
+def test_failed_run_is_retried_on_unchanged_sources():
+    watermarks = Watermarks(QUERY_HISTORY=pd.Timestamp('2026-01-01 10:00:00', tz='UTC'))
+    scheduler = TableScheduler(watermarks, 'test')
+    outcomes = [RuntimeError('warehouse suspended'), None]
+
+    def run():
+        outcome = outcomes.pop(0)
+        if outcome:
+            raise outcome
+
+    scheduler.add('FINOPS_X', HOUR, run, sources=['QUERY_HISTORY'])
+    assert run_due(scheduler, 'FINOPS_X')['error'] == 'warehouse suspended'
+    assert run_due(scheduler, 'FINOPS_X')['status'] == 'completed'
+
+
+def test_tables_without_sources_always_run():
+    scheduler = TableScheduler(Watermarks(), 'test')
+    runs = []
+    scheduler.add('attribution', HOUR, lambda: runs.append(1))
+    run_due(scheduler, 'attribution')
+    run_due(scheduler, 'attribution')
+    assert len(runs) == 2
+
+
+def test_due_order_by_priority_then_views():
+    scheduler = TableScheduler(Watermarks(), 'test')
+    order = []
+    for name, priority in (('a', 0), ('b', 0), ('c', 1)):
+        scheduler.add(name, HOUR, lambda name=name: order.append(name), priority=priority)
+        scheduler.entries[name].next_run = 0
+    scheduler.record_view('b')
+    scheduler.tick()
+    assert order == ['c', 'b', 'a']
+    # Each run is pushed back by its cadence, give or take the jitter
+    assert all(entry.next_run > time.time() + 0.8 * HOUR for entry in scheduler.entries.values())
+
+
+def test_history_route_rejects_a_bad_limit():
+    from flask import Flask
+
+    app = Flask(__name__)
+    scheduler = TableScheduler(Watermarks(), 'test')
+    scheduler.add('FINOPS_X', HOUR, lambda: None)
+    register_scheduler_routes(app, scheduler)
+    run_due(scheduler, 'FINOPS_X')
+
+    client = app.test_client()
+    assert client.get('/api/scheduler/history?limit=ten').status_code == 400
+    assert len(client.get('/api/scheduler/history?limit=1').get_json()['runs']) == 1
@@ -0,0 +1,55 @@
+import datetime as dt
+import json
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from serialization import dumps, frame_payload, frame_records
+
+
+def frame():
+    return pd.DataFrame({
+        'WAREHOUSE_NAME': ['A', None],
+        'CREDITS': [Decimal('1.50'), Decimal('2')],
+        'RATIO': [0.5, np.nan],
+        'START_TIME': pd.to_datetime(['2026-01-01 10:00:00', None]),
+        'ROWS': np.array([3, 4], dtype=np.int64),
+    })
+
+
+def test_frame_records_serialize_to_json_values():
+    # Missing values come out as null, whichever JSON encoder is installed
+    assert json.loads(dumps(frame_records(frame()))) == [
+        {'WAREHOUSE_NAME': 'A', 'CREDITS': 1.5, 'RATIO': 0.5, 'START_TIME': '2026-01-01T10:00:00.000000', 'ROWS': 3},
+        {'WAREHOUSE_NAME': None, 'CREDITS': 2.0, 'RATIO': None, 'START_TIME': None, 'ROWS': 4},
+    ]
+
+
+def test_timezone_aware_timestamps_are_utc():
+    df = pd.DataFrame({'T': pd.to_datetime(['2026-01-01 10:00:00']).tz_localize('America/Los_Angeles')})
+    assert frame_records(df) == [{'T': '2026-01-01T18:00:00.000000'}]
+
+
+def test_columns_layout():
+    payload = frame_payload(frame()[['WAREHOUSE_NAME', 'ROWS']], 'columns')
+    assert payload['columns'] == ['WAREHOUSE_NAME', 'ROWS']
+    assert json.loads(dumps(payload['data'])) == [['A', 3], [None, 4]]
+    with pytest.raises(ValueError):
+        frame_payload(frame(), 'rows')
+
+
+def test_dumps_handles_snowflake_types():
+    body = json.loads(dumps({
+        'decimal': Decimal('1.25'),
+        'date': dt.date(2026, 1, 2),
+        'timestamp': pd.Timestamp('2026-01-02 03:04:05'),
+        'nat': pd.NaT,
+        'numpy': np.float32(0.5),
+        'array': np.arange(3),
+        'inf': float('inf'),
+        'bytes': b'\x01\xff',
+    }))
+    assert body == {'decimal': 1.25, 'date': '2026-01-02', 'timestamp': '2026-01-02T03:04:05', 'nat': None,
+                    'numpy': 0.5, 'array': [0, 1, 2], 'inf': None, 'bytes': '01ff'}
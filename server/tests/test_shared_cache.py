@@ -0,0 +1,47 @@
+from decimal import Decimal
+
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from shared_cache import SharedTableCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SharedTableCache(str(tmp_path), keep_versions=2)
+
+
+def test_publish_maps_current_version_for_every_reader(cache, tmp_path):
+    df = pd.DataFrame({'QUERY_ID': ['a', 'b'], 'CREDITS': [1.5, 2.5]})
+    first = cache.publish('query_details', df, {'last_refresh': '2026-01-01T00:00:00'})
+    assert first.version == 1 and first.meta['last_refresh'] == '2026-01-01T00:00:00'
+
+    # Another worker's cache over the same directory sees the same version
+    other = SharedTableCache(str(tmp_path))
+    assert other.get('query_details').version == 1
+    assert other.get('query_details').frame['CREDITS'].tolist() == [1.5, 2.5]
+
+    cache.publish('query_details', df.head(1), {})
+    cache.publish('query_details', df, {})
+    assert other.get('query_details').version == 3
+    # Only the kept versions remain on disk
+    files = sorted(path.name for path in tmp_path.glob('query_details.v*.arrow'))
+    assert files == ['query_details.v2.arrow', 'query_details.v3.arrow']
+
+
+def test_decimal_columns_are_published_as_float64(cache):
+    df = pd.DataFrame({
+        'WAREHOUSE_NAME': ['WH', 'WH', 'WH'],
+        'CREDITS_USED': [Decimal('1.250000'), None, Decimal('3.5')]
+    })
+    frame = cache.publish('warehouses', df, {}).frame
+    assert frame['CREDITS_USED'].dtype == 'float64'
+    assert frame['CREDITS_USED'].iloc[0] == 1.25 and pd.isna(frame['CREDITS_USED'].iloc[1])
+    # The caller's frame is left as fetched
+    assert df['CREDITS_USED'].dtype == object
+
+
+def test_disabled_cache_returns_nothing(tmp_path):
+    assert SharedTableCache('').get('warehouses') is None
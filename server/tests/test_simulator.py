@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from simulator import (MIN_BILLED_SECONDS, NEVER_SUSPEND, WarehouseConfig, Workload, default_scenarios,
+                       run_scenarios, scaled_execution, simulate)
+
+
+def workload(arrival, execution, bytes_scanned=None):
+    arrival = np.asarray(arrival, dtype=float)
+    size = len(arrival)
+    return Workload(
+        arrival=arrival,
+        execution=np.asarray(execution, dtype=float),
+        bytes_scanned=np.zeros(size) if bytes_scanned is None else np.asarray(bytes_scanned, dtype=float),
+        spilled_local=np.zeros(size, dtype=bool),
+        spilled_remote=np.zeros(size, dtype=bool),
+        observed_queue=np.zeros(size)
+    )
+
+
+def test_from_row_maps_zero_and_null_auto_suspend_to_never_suspend():
+    base = {'warehouse_name': 'WH', 'warehouse_size': 'X-Small', 'min_cluster_count': None}
+    assert WarehouseConfig.from_row({**base, 'auto_suspend': 0}).auto_suspend == NEVER_SUSPEND
+    assert WarehouseConfig.from_row({**base, 'auto_suspend': None}).auto_suspend == NEVER_SUSPEND
+    assert WarehouseConfig.from_row({**base, 'auto_suspend': float('nan')}).auto_suspend == NEVER_SUSPEND
+    config = WarehouseConfig.from_row({**base, 'auto_suspend': 300})
+    assert (config.warehouse_size, config.auto_suspend, config.min_cluster_count) == ('XSMALL', 300, 1)
+
+
+def test_sessions_bill_their_idle_tail_and_minimum():
+    config = WarehouseConfig('XSMALL', auto_suspend=60)
+    # Two queries 30s apart share a session; the third, an hour later, resumes again
+    result = simulate(workload([0, 40, 3640], [10, 10, 5]), config, config)
+    assert result['resumes'] == 2
+    assert result['cluster_hours'] * 3600 == pytest.approx((50 + 60) + (5 + 60))
+    assert result['credits'] == pytest.approx(result['cluster_hours'] * 1)
+
+    short = simulate(workload([0], [1]), config, WarehouseConfig('XSMALL', auto_suspend=1))
+    assert short['cluster_hours'] * 3600 == MIN_BILLED_SECONDS
+
+
+def test_never_suspend_bills_the_whole_span():
+    config = WarehouseConfig('SMALL', auto_suspend=NEVER_SUSPEND)
+    result = simulate(workload([0, 40, 3640], [10, 10, 5]), config, config)
+    assert result['resumes'] == 1
+    assert result['cluster_hours'] * 3600 == pytest.approx(3645)
+    assert result['credits'] == pytest.approx(3645 / 3600 * 2)
+
+
+def test_queueing_beyond_cluster_capacity():
+    config = WarehouseConfig('XSMALL', auto_suspend=60)
+    # Ten concurrent queries on one 8-slot cluster: two wait for the full 100s
+    crowded = workload(np.zeros(10), np.full(10, 100))
+    assert simulate(crowded, config, config)['queue_seconds'] == pytest.approx(200)
+    wider = config.with_changes({'max_cluster_count': 2})
+    assert simulate(crowded, config, wider)['queue_seconds'] == 0
+
+
+def test_scaled_execution_depends_on_scan_size():
+    small, large = WarehouseConfig('XSMALL', 60), WarehouseConfig('SMALL', 60)
+    scaled = scaled_execution(workload([0, 0], [100, 100], bytes_scanned=[0, 2 * 1024 ** 3]), small, large)
+    assert scaled.tolist() == pytest.approx([100 * (0.4 / 2 + 0.6), 100 * (0.85 / 2 + 0.15)])
+
+
+def test_run_scenarios_calibrates_to_metered_credits():
+    config = WarehouseConfig('MEDIUM', auto_suspend=600)
+    work = workload([0, 1000], [60, 60])
+    baseline = simulate(work, config, config)['credits']
+    result = run_scenarios(work, config, default_scenarios(config), actual_credits=baseline * 2)
+
+    assert [s['name'] for s in result['scenarios']] == [
+        'size_down', 'size_up', 'auto_suspend_60', 'auto_suspend_600', 'extra_cluster']
+    by_name = {s['name']: s for s in result['scenarios']}
+    assert by_name['auto_suspend_600']['credits_delta'] == 0
+    assert by_name['auto_suspend_60']['credits_delta'] < 0
+    assert by_name['auto_suspend_60']['estimated_credits'] == pytest.approx(
+        simulate(work, config, config.with_changes({'auto_suspend': 60}))['credits'] * 2, abs=1e-4)
+
+
+def test_workload_from_frame_starts_at_first_arrival():
+    df = pd.DataFrame({
+        'END_TIME': pd.to_datetime(['2026-01-01 00:01:00', '2026-01-01 00:02:00']),
+        'EXECUTION_TIME': [30_000, 10_000],
+        'QUEUED_OVERLOAD_TIME': [None, 5_000],
+        'BYTES_SCANNED': [1, None],
+        'BYTES_SPILLED_TO_LOCAL_STORAGE': [0, 10],
+        'BYTES_SPILLED_TO_REMOTE_STORAGE': [None, 0]
+    })
+    work = Workload.from_frame(df)
+    assert work.arrival.tolist() == [0.0, 75.0]
+    assert work.observed_queue.tolist() == [0.0, 5.0]
+    assert work.spilled_local.tolist() == [False, True]
@@ -0,0 +1,58 @@
+import pytest
+
+from swaps import rollback_statement, run_fenced, staged_statements
+
+BUILDER = """
+CREATE OR REPLACE TABLE FINOPS_WAREHOUSE_COSTS CLUSTER BY (warehouse_name) AS
+SELECT * FROM FINOPS_WAREHOUSE_COSTS_RAW
+"""
+
+
+def test_staged_statements_build_aside_then_swap():
+    statements = staged_statements('FINOPS_WAREHOUSE_COSTS', BUILDER)
+    # Only the CREATE target is renamed, not tables that merely share the prefix
+    assert statements[0].strip().splitlines() == [
+        'CREATE OR REPLACE TABLE FINOPS_WAREHOUSE_COSTS__STAGING CLUSTER BY (warehouse_name) AS',
+        'SELECT * FROM FINOPS_WAREHOUSE_COSTS_RAW',
+    ]
+    assert statements[1:] == [
+        'CREATE TABLE IF NOT EXISTS FINOPS_WAREHOUSE_COSTS LIKE FINOPS_WAREHOUSE_COSTS__STAGING',
+        'ALTER TABLE FINOPS_WAREHOUSE_COSTS SWAP WITH FINOPS_WAREHOUSE_COSTS__STAGING',
+        'DROP TABLE IF EXISTS FINOPS_WAREHOUSE_COSTS__PREVIOUS',
+        'ALTER TABLE FINOPS_WAREHOUSE_COSTS__STAGING RENAME TO FINOPS_WAREHOUSE_COSTS__PREVIOUS',
+    ]
+    assert rollback_statement('FINOPS_WAREHOUSE_COSTS') == (
+        'ALTER TABLE FINOPS_WAREHOUSE_COSTS SWAP WITH FINOPS_WAREHOUSE_COSTS__PREVIOUS')
+
+
+def test_staged_statements_lowercase_builder():
+    statements = staged_statements('FINOPS_X', 'create or replace table FINOPS_X as select 1')
+    assert statements[0] == 'create or replace table FINOPS_X__STAGING as select 1'
+
+
+def test_staged_statements_rejects_builder_for_another_table():
+    with pytest.raises(ValueError):
+        staged_statements('FINOPS_X', 'CREATE OR REPLACE TABLE FINOPS_XY AS SELECT 1')
+
+
+class Coordinator:
+    def __init__(self, lost_after):
+        self.lost_after, self.checks = lost_after, 0
+
+    def ensure_held(self, lease):
+        self.checks += 1
+        if self.checks > self.lost_after:
+            raise RuntimeError('superseded')
+
+
+def test_run_fenced_checks_the_lease_before_every_later_statement():
+    executed = []
+    run_fenced(Coordinator(lost_after=10), 'lease', ['build', 'swap', 'rename'], executed.append)
+    assert executed == ['build', 'swap', 'rename']
+
+    executed = []
+    coordinator = Coordinator(lost_after=0)
+    with pytest.raises(RuntimeError):
+        run_fenced(coordinator, 'lease', ['build', 'swap', 'rename'], executed.append)
+    # The build ran under the lease; the swap never ran over a newer holder
+    assert executed == ['build'] and coordinator.checks == 1
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+from sweepline import UtilizationProfile, concurrency_segments, merge_intervals, profile_batches
+
+
+def test_concurrency_segments_back_to_back_do_not_overlap():
+    times, levels, durations = concurrency_segments(np.array([0.0, 10.0, 5.0]), np.array([10.0, 20.0, 15.0]))
+    assert times.tolist() == [0, 5, 10, 10, 15, 20]
+    assert levels.tolist() == [1, 2, 1, 2, 1]
+    assert durations.tolist() == [5, 5, 0, 5, 5]
+
+
+def test_merge_intervals_with_gap():
+    starts, ends = np.array([30.0, 0.0, 12.0]), np.array([40.0, 10.0, 20.0])
+    assert [a.tolist() for a in merge_intervals(starts, ends)] == [[0, 12, 30], [10, 20, 40]]
+    assert [a.tolist() for a in merge_intervals(starts, ends, gap=2)] == [[0, 30], [20, 40]]
+
+
+def test_profile_totals():
+    # Two overlapping queries in the first minute, one in the third
+    profile = UtilizationProfile(0, 180)
+    profile.add(np.array([0.0, 30.0, 120.0]), np.array([45.0, 60.0, 150.0]))
+    summary = profile.finish().summary()
+    assert summary['busy_seconds'] == 90
+    assert summary['idle_seconds'] == 90
+    assert summary['busy_periods'] == 2
+    assert summary['peak_concurrency'] == 2
+    assert summary['seconds_at_concurrency'] == {1: 75.0, 2: 15.0}
+    assert profile.busy.tolist() == [60, 0, 30]
+    assert profile.peak.tolist() == [2, 0, 1]
+
+
+def test_chunked_matches_single_pass():
+    rng = np.random.default_rng(7)
+    starts = np.sort(rng.uniform(0, 7200, 500))
+    ends = starts + rng.exponential(120, 500)
+    whole = UtilizationProfile(0, 7200)
+    whole.add(starts, ends)
+    whole.finish()
+    chunked = UtilizationProfile(0, 7200)
+    for lo in range(0, 500, 37):
+        chunked.add(starts[lo:lo + 37], ends[lo:lo + 37])
+    chunked.finish()
+    np.testing.assert_allclose(chunked.busy, whole.busy)
+    np.testing.assert_allclose(chunked.area, whole.area)
+    assert chunked.peak.tolist() == whole.peak.tolist()
+    assert chunked.busy_periods == whole.busy_periods
+
+
+def test_hourly_idle_billed_credits():
+    profile = UtilizationProfile(0, 7200)
+    profile.add(np.array([0.0]), np.array([900.0]))
+    profile.finish()
+    credits = pd.Series([1.0, 1.0], index=pd.to_datetime([0, 3600], unit='s'))
+    hours = profile.hourly(credits)
+    assert hours['busy_seconds'].tolist() == [900, 0]
+    assert hours['idle_billed_seconds'].tolist() == [2700, 3600]
+    assert hours['idle_billed_credits'].tolist() == [0.75, 1.0]
+    # With a known size only the billed part of the hour counts
+    assert profile.hourly(credits, credits_per_hour=2.0)['billed_seconds'].tolist() == [1800, 1800]
+
+
+def test_profile_batches_splits_warehouses_across_batches():
+    rows = pd.DataFrame({
+        'WAREHOUSE_NAME': ['A', 'A', 'B', 'B'],
+        'START_TIME': pd.to_datetime([0, 60, 0, 30], unit='s'),
+        'END_TIME': pd.to_datetime([30, 90, 60, 90], unit='s'),
+    })
+    profiles = profile_batches([rows.iloc[:3], rows.iloc[3:]], 0, 120)
+    assert sorted(profiles) == ['A', 'B']
+    assert profiles['A'].summary()['busy_seconds'] == 60
+    assert profiles['B'].summary()['busy_seconds'] == 90
+    assert profiles['B'].summary()['peak_concurrency'] == 2